@@ -0,0 +1,296 @@
+"""
+棋盘难度分析
+按批计算3BV、空白区域 (opening) 数、孤立数字格数和孤立数字格连成的岛数, 用于给大量棋盘分级和筛选
+连通分量用向量化的并查集 (按最小下标合并 + 路径压缩) 一次标记整批棋盘, 不逐格做洪水填充
+
+指标:
+    openings         空白区域数 (周围没有地雷的格子的8连通分量)
+    isolated         不与任何空白格相邻的数字格数, 每个都要单独点开
+    bbbv             3BV = openings + isolated
+    islands          孤立数字格的8连通分量数
+    largest_opening  最大空白区域的空白格数
+
+输入可以是种子范围 (与 Board(..., seed=种子, first_click='unsafe') 的布局相同)、无猜棋盘缓存文件 (WxHxM.bin)
+或录像归档 (.msr, 只统计保存了地雷布局的录像), 在进程池中分块处理, 汇总为各指标的直方图
+
+用法示例:
+    python analyze.py --difficulty hard --seeds 0:1000000 --json stats.json
+    python analyze.py cache/noguess/30x16x99.bin replays/replays.msr --csv boards.csv
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from collections import Counter
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from board import count_neighbors, generate_mine_mask
+from config import Difficulty
+from replay import ReplayArchive
+from simulate import SimConfig, config_from_difficulty, parse_custom
+
+METRICS = ('bbbv', 'openings', 'isolated', 'islands', 'largest_opening')
+# 每个任务处理的棋盘数
+CHUNK_SIZE = 4096
+# 无猜缓存文件名中的尺寸和雷数
+CACHE_NAME = re.compile(r'(\d+)x(\d+)x(\d+)\.bin$')
+
+
+def label_components(mask: np.ndarray) -> np.ndarray:
+    """标记 (批, 高, 宽) 掩码中每个格子所在的8连通分量
+    返回平坦数组, 掩码内的格子为所在分量中最小的平坦下标 (即分量的根), 掩码外为-1"""
+    batch, height, width = mask.shape
+    # 下标放得下时用 int32, 查找时搬运的数据减半
+    dtype = np.int32 if mask.size < 2 ** 31 else np.int64
+    index = np.arange(mask.size, dtype=dtype).reshape(mask.shape)
+    # 行内连续的一段格子先直接指向段首, 之后只需合并上下两行之间的段
+    starts = mask.copy()
+    starts[..., 1:] &= ~mask[..., :-1]
+    run = np.maximum.accumulate(np.where(starts, index, 0), axis=-1)
+    sources, targets = [], []
+    # 与下一行的正下、右下、左下三个方向相连
+    for dx in (-1, 0, 1):
+        a_cols = slice(max(0, -dx), width - max(0, dx))
+        b_cols = slice(max(0, dx), width - max(0, -dx))
+        both = mask[:, :-1, a_cols] & mask[:, 1:, b_cols]
+        sources.append(run[:, :-1, a_cols][both])
+        targets.append(run[:, 1:, b_cols][both])
+    a, b = np.concatenate(sources), np.concatenate(targets)
+    parent = run.reshape(-1).copy()
+    while a.size:
+        root_a, root_b = _find(parent, a), _find(parent, b)
+        # 路径压缩: 边的两端直接指向根, 下一轮查找更快
+        parent[a] = root_a
+        parent[b] = root_b
+        # 两端已在同一分量的边以后也不会再分开, 直接丢弃
+        differ = root_a != root_b
+        a, b, root_a, root_b = a[differ], b[differ], root_a[differ], root_b[differ]
+        # 把两个根都挂到较小的根上, 下标只减不增, 不会成环
+        low = np.minimum(root_a, root_b)
+        np.minimum.at(parent, root_a, low)
+        np.minimum.at(parent, root_b, low)
+    cells = np.flatnonzero(mask)
+    labels = np.full(mask.size, -1, dtype=dtype)
+    labels[cells] = _find(parent, cells)
+    return labels
+
+
+def _find(parent: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+    """沿父指针找到每个节点的根"""
+    roots = parent[nodes]
+    while True:
+        up = parent[roots]
+        if np.array_equal(up, roots):
+            return roots
+        roots = up
+
+
+def _count_roots(labels: np.ndarray, batch: int) -> np.ndarray:
+    """每个棋盘的分量数"""
+    return (labels == np.arange(labels.size)).reshape(batch, -1).sum(axis=1)
+
+
+def analyze_batch(mines: np.ndarray) -> Dict[str, np.ndarray]:
+    """分析 (批, 高, 宽) 的布尔地雷掩码, 返回各指标的数组"""
+    batch = mines.shape[0]
+    counts = count_neighbors(mines)
+    zero = ~mines & (counts == 0)
+    isolated = ~mines & (counts > 0) & (count_neighbors(zero) == 0)
+    zero_labels = label_components(zero)
+    openings = _count_roots(zero_labels, batch)
+    isolated_count = isolated.reshape(batch, -1).sum(axis=1)
+    sizes = np.bincount(zero_labels[zero_labels >= 0], minlength=zero_labels.size)
+    return {
+        'bbbv': openings + isolated_count,
+        'openings': openings,
+        'isolated': isolated_count,
+        'islands': _count_roots(label_components(isolated), batch),
+        'largest_opening': sizes.reshape(batch, -1).max(axis=1)
+    }
+
+
+def analyze_board(mines, width: int, height: int) -> Dict[str, int]:
+    """分析单个棋盘, mines 为每格一个字节 (0/1) 的布局"""
+    mask = np.frombuffer(bytes(mines), dtype=np.uint8).astype(bool).reshape(1, height, width)
+    return {key: int(value[0]) for key, value in analyze_batch(mask).items()}
+
+'''分析任务: 一段种子或文件中的一段记录'''
+class Task(NamedTuple):
+    name: str
+    width: int
+    height: int
+    num_mines: int
+    # 'seeds' 时 [start, stop) 为种子范围; 'cache' 时为记录序号范围; 'replays' 时 path 中的全部录像
+    kind: str
+    path: Optional[str]
+    start: int
+    stop: int
+
+
+def _load_masks(task: Task) -> Iterator[Tuple[str, int, int, int, np.ndarray, np.ndarray]]:
+    """读取任务中的棋盘, 按尺寸分组产生 (名称, 宽, 高, 雷数, 编号, 地雷掩码)"""
+    shape = (task.height, task.width)
+    if task.kind == 'seeds':
+        ids = np.arange(task.start, task.stop)
+        masks = np.stack([generate_mine_mask(task.width, task.height, task.num_mines, np.random.default_rng(seed))
+                          for seed in ids.tolist()])
+        yield task.name, task.width, task.height, task.num_mines, ids, masks
+    elif task.kind == 'cache':
+        record_size = 4 + (task.width * task.height + 7) // 8
+        records = np.fromfile(task.path, dtype=np.uint8, count=(task.stop - task.start) * record_size,
+                              offset=task.start * record_size).reshape(-1, record_size)
+        masks = np.unpackbits(records[:, 4:], axis=1, count=task.width * task.height).astype(bool)
+        yield (task.name, task.width, task.height, task.num_mines, np.arange(task.start, task.stop),
+               masks.reshape(-1, *shape))
+    else:
+        groups: Dict[Tuple[int, int, int], Tuple[List[int], List[np.ndarray]]] = {}
+        with ReplayArchive(task.path) as archive:
+            for i, replay in enumerate(archive):
+                if replay.mines is None:
+                    continue
+                ids, masks = groups.setdefault((replay.width, replay.height, replay.num_mines), ([], []))
+                ids.append(i)
+                masks.append(np.frombuffer(replay.mines, dtype=np.uint8).astype(bool)
+                             .reshape(replay.height, replay.width))
+        for (width, height, num_mines), (ids, masks) in groups.items():
+            yield f'{width}x{height}:{num_mines}', width, height, num_mines, np.array(ids), np.stack(masks)
+
+
+def _run_task(task: Task) -> list:
+    """进程池任务: 返回 [(名称, 宽, 高, 雷数, 编号, 指标)]"""
+    return [(name, width, height, num_mines, ids, analyze_batch(masks))
+            for name, width, height, num_mines, ids, masks in _load_masks(task)]
+
+
+def seed_tasks(config: SimConfig, start: int, stop: int, chunk_size: int = CHUNK_SIZE) -> List[Task]:
+    """把种子范围切成任务"""
+    return [Task(config.name, config.width, config.height, config.num_mines, 'seeds', None,
+                 s, min(s + chunk_size, stop)) for s in range(start, stop, chunk_size)]
+
+
+def file_tasks(path: str, chunk_size: int = CHUNK_SIZE) -> List[Task]:
+    """把棋盘文件切成任务: 无猜缓存按记录分块, 录像归档整体作为一个任务"""
+    if path.endswith('.msr'):
+        return [Task(os.path.basename(path), 0, 0, 0, 'replays', path, 0, 0)]
+    match = CACHE_NAME.search(os.path.basename(path))
+    if match is None:
+        raise ValueError(f"无法识别的棋盘文件 (应为 WxHxM.bin 或 .msr): {path}")
+    width, height, num_mines = (int(v) for v in match.groups())
+    records = os.path.getsize(path) // (4 + (width * height + 7) // 8)
+    name = f'{width}x{height}:{num_mines}'
+    return [Task(name, width, height, num_mines, 'cache', path, s, min(s + chunk_size, records))
+            for s in range(0, records, chunk_size)]
+
+
+def analyze(tasks: List[Task], workers: Optional[int] = None) -> Iterator[tuple]:
+    """处理任务, 结果按完成顺序流式返回"""
+    if workers == 1:
+        for task in tasks:
+            yield from _run_task(task)
+        return
+    with Pool(workers) as pool:
+        for results in pool.imap_unordered(_run_task, tasks):
+            yield from results
+
+'''直方图汇总'''
+class Histograms:
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, name: str, width: int, height: int, num_mines: int, metrics: Dict[str, np.ndarray]):
+        """加入一批棋盘的指标"""
+        group = self.groups.get(name)
+        if group is None:
+            group = self.groups[name] = {
+                'width': width,
+                'height': height,
+                'num_mines': num_mines,
+                'boards': 0,
+                'histograms': {key: Counter() for key in METRICS}
+            }
+        group['boards'] += len(metrics['bbbv'])
+        for key in METRICS:
+            values, counts = np.unique(metrics[key], return_counts=True)
+            group['histograms'][key].update(dict(zip(values.tolist(), counts.tolist())))
+
+    def to_dict(self) -> dict:
+        """转换为可写入JSON的汇总"""
+        summary = {}
+        for name, group in self.groups.items():
+            entry = {key: group[key] for key in ('width', 'height', 'num_mines', 'boards')}
+            for key in METRICS:
+                histogram = group['histograms'][key]
+                total = sum(histogram.values())
+                entry[f'mean_{key}'] = sum(k * v for k, v in histogram.items()) / total if total else 0.0
+            for key in METRICS:
+                histogram = group['histograms'][key]
+                entry[f'{key}_histogram'] = {str(k): histogram[k] for k in sorted(histogram)}
+            summary[name] = entry
+        return summary
+
+
+def _parse_range(spec: str) -> Tuple[int, int]:
+    """解析 START:STOP 形式的种子范围"""
+    try:
+        start, stop = (int(v) for v in spec.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"种子范围格式应为 START:STOP: {spec}")
+    return start, stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量分析棋盘的3BV、空白区域和孤立数字格')
+    parser.add_argument('files', nargs='*', help='无猜缓存文件 (WxHxM.bin) 或录像归档 (.msr)')
+    parser.add_argument('--difficulty', action='append', choices=[d.value for d in Difficulty],
+                        help='按种子生成棋盘的难度预设, 可重复')
+    parser.add_argument('--custom', action='append', type=parse_custom, default=[],
+                        help='按种子生成棋盘的自定义配置 WxH:M, 可重复')
+    parser.add_argument('--seeds', type=_parse_range, default=(0, 10000), help='种子范围 START:STOP')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='进程数')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='每个任务的棋盘数')
+    parser.add_argument('--csv', help='逐个棋盘的指标输出的CSV文件')
+    parser.add_argument('--json', help='汇总直方图输出的JSON文件')
+    args = parser.parse_args(argv)
+
+    configs = [config_from_difficulty(Difficulty(d)) for d in args.difficulty or []] + args.custom
+    if not configs and not args.files:
+        configs = [config_from_difficulty(Difficulty.MEDIUM)]
+    tasks = [task for config in configs for task in seed_tasks(config, *args.seeds, args.chunk_size)]
+    try:
+        for path in args.files:
+            tasks.extend(file_tasks(path, args.chunk_size))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    histograms = Histograms()
+    csv_file = open(args.csv, 'w', newline='') if args.csv else None
+    try:
+        writer = csv.writer(csv_file) if csv_file else None
+        if writer:
+            writer.writerow(('config', 'id') + METRICS)
+        for name, width, height, num_mines, ids, metrics in analyze(tasks, args.workers):
+            histograms.add(name, width, height, num_mines, metrics)
+            if writer:
+                columns = [metrics[key].tolist() for key in METRICS]
+                writer.writerows((name, i, *row) for i, *row in zip(ids.tolist(), *columns))
+    finally:
+        if csv_file:
+            csv_file.close()
+
+    result = histograms.to_dict()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
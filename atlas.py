@@ -0,0 +1,80 @@
+"""
+贴图图集
+把多张小贴图按尺寸分行打包进一张大图, 用预先算好的子区域批量绘制 (Surface.blits)
+打包好的图集按 (尺寸, 素材文件指纹) 以未压缩的BMP缓存在磁盘上, 再次启动时一次载入, 无需逐张读取并缩放素材
+"""
+
+import hashlib
+import os
+from typing import Dict, List, Optional, Sequence
+
+import pygame
+
+# 默认缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'atlas')
+
+
+def _fingerprint(paths: Dict[str, str], sizes: Sequence[int]) -> str:
+    """由贴图名、素材文件的大小和修改时间以及各行尺寸生成缓存指纹"""
+    digest = hashlib.sha1(repr(list(sizes)).encode())
+    for key, path in paths.items():
+        stat = os.stat(path)
+        digest.update(f'{key}:{stat.st_size}:{stat.st_mtime_ns};'.encode())
+    return digest.hexdigest()[:16]
+
+
+def _layout(keys: Sequence[str], sizes: Sequence[int]) -> List[Dict[str, pygame.Rect]]:
+    """每个尺寸占一行, 行内按贴图名的顺序排列"""
+    rects = []
+    top = 0
+    for size in sizes:
+        rects.append({key: pygame.Rect(i * size, top, size, size) for i, key in enumerate(keys)})
+        top += size
+    return rects
+
+'''贴图图集'''
+class TileAtlas:
+    def __init__(self, surface: pygame.Surface, rects: List[Dict[str, pygame.Rect]]):
+        self.surface = surface
+        # 每一行 (尺寸) 中各贴图所在的子区域
+        self.rects = rects
+
+    @classmethod
+    def load(cls, name: str, paths: Dict[str, str], sizes: Sequence[int], alpha: bool = False,
+             cache_dir: Optional[str] = CACHE_DIR) -> 'TileAtlas':
+        """载入图集, 缓存不存在或素材有变化时重新缩放打包并写入缓存; 需要先创建显示窗口"""
+        sizes = list(sizes)
+        rects = _layout(list(paths), sizes)
+        cache_path = None
+        if cache_dir is not None:
+            cache_path = os.path.join(cache_dir, f'{name}_{_fingerprint(paths, sizes)}.bmp')
+            if os.path.exists(cache_path):
+                try:
+                    surface = pygame.image.load(cache_path)
+                    return cls(surface.convert_alpha() if alpha else surface.convert(), rects)
+                except pygame.error:
+                    pass
+
+        width = len(paths) * max(sizes)
+        height = sum(sizes)
+        surface = pygame.Surface((width, height), pygame.SRCALPHA if alpha else 0)
+        for key, path in paths.items():
+            image = pygame.image.load(path)
+            image = image.convert_alpha() if alpha else image.convert()
+            for row in rects:
+                rect = row[key]
+                surface.blit(pygame.transform.smoothscale(image, rect.size), rect)
+        surface = surface.convert_alpha() if alpha else surface.convert()
+
+        if cache_path is not None:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                pygame.image.save(surface, cache_path)
+            except (OSError, pygame.error) as e:
+                # 缓存只是加速启动, 写不进去不影响游戏
+                print(f"无法写入图集缓存 {cache_path}: {e}")
+        return cls(surface, rects)
+
+    def subsurfaces(self, row: int = 0) -> Dict[str, pygame.Surface]:
+        """一行贴图的子表面, 与图集共享像素, 可以当作独立的图片使用"""
+        return {key: self.surface.subsurface(rect) for key, rect in self.rects[row].items()}
@@ -0,0 +1,327 @@
+"""
+基准测试
+覆盖棋盘生成、首次打开、最坏情况的洪水填充、快速打开、计数属性、求解器和无显示渲染等热点路径
+按难度预设和大尺寸自定义配置分别计时, 结果保存为JSON, 并可与保存的基线比较以发现性能退步
+
+用法示例:
+    python benchmark.py --save-baseline
+    python benchmark.py --compare --threshold 0.2
+    python benchmark.py --only flood_fill,render_full --custom 2000x2000:400000 --output bench.json
+"""
+
+import os
+# 渲染基准使用SDL的虚拟显示驱动, 必须在导入pygame之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from board import Board, FIRST_CLICK_CELL, FIRST_CLICK_UNSAFE, FLAGGED, HIDDEN, OPENED
+from config import Difficulty
+from simulate import SimConfig, config_from_difficulty, parse_custom
+from solver import Solver
+
+# 默认的基线文件
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+# 默认附加的大尺寸配置
+LARGE_CONFIGS = ['200x200:6000', '1000x1000:150000']
+# 求解器只在不超过该格子数的棋盘上测试
+SOLVER_MAX_CELLS = 200 * 200
+# 单次计时至少持续的时间, 太快的用例会在一次计时内重复多遍
+MIN_SAMPLE_SECONDS = 0.002
+SEED = 20240601
+
+'''基准用例'''
+class Case(NamedTuple):
+    name: str
+    description: str
+    # setup(config) 返回每次计时前准备好的状态, run(state) 为被计时的部分
+    setup: Callable
+    run: Callable
+    # 用例是否在每次计时前都要重新准备 (run 会修改状态)
+    fresh: bool = True
+    max_cells: Optional[int] = None
+
+
+def _setup_generate(config: SimConfig):
+    return config
+
+
+def _run_generate(config: SimConfig):
+    Board(config.width, config.height, config.num_mines, seed=SEED, first_click=FIRST_CLICK_UNSAFE)
+
+
+def _setup_first_open(config: SimConfig):
+    return Board(config.width, config.height, config.num_mines, seed=SEED, first_click=FIRST_CLICK_CELL)
+
+
+def _run_first_open(board: Board):
+    # 首次打开包含延迟放置地雷和展开空白区域
+    board.open(board.width // 2, board.height // 2)
+
+
+def _setup_flood_fill(config: SimConfig):
+    # 没有地雷时一次打开整个棋盘, 是洪水填充的最坏情况
+    return Board(config.width, config.height, 0, seed=SEED, first_click=FIRST_CLICK_UNSAFE)
+
+
+def _run_flood_fill(board: Board):
+    board.open(0, 0)
+
+
+def _setup_chord(config: SimConfig):
+    """选出一批互不相邻的数字格, 把它们打开并在周围的雷上插旗, 之后依次快速打开"""
+    board = Board(config.width, config.height, config.num_mines, seed=SEED, first_click=FIRST_CLICK_UNSAFE)
+    board.start()
+    rng = np.random.default_rng(SEED)
+    mines = np.frombuffer(board.mines, dtype=np.uint8)
+    counts = np.frombuffer(board.counts, dtype=np.uint8)
+    candidates = rng.permutation(np.flatnonzero((counts > 0) & (mines == 0)))
+    used = bytearray(board.size)
+    cells = []
+    for idx in candidates[:4096].tolist():
+        area = [idx, *board.neighbors(idx)]
+        if any(used[n] for n in area):
+            continue
+        for n in area:
+            used[n] = 1
+        board.status[idx] = OPENED
+        for n in board.neighbors(idx):
+            if board.mines[n]:
+                board.status[n] = FLAGGED
+                board.flags_count += 1
+        cells.append(board.coords(idx))
+        if len(cells) >= 256:
+            break
+    return board, cells
+
+
+def _run_chord(state):
+    board, cells = state
+    for x, y in cells:
+        board.chord(x, y)
+
+
+def _setup_counters(config: SimConfig):
+    board = Board(config.width, config.height, config.num_mines, seed=SEED, first_click=FIRST_CLICK_UNSAFE)
+    board.open(*board.coords(int(np.flatnonzero(np.frombuffer(board.mines, dtype=np.uint8) == 0)[0])))
+    return board
+
+
+def _run_counters(board: Board):
+    for _ in range(10000):
+        board.is_won
+        board.opened_count
+        board.flags_count
+        board.is_playing
+
+
+def _setup_solver(config: SimConfig):
+    """只用确定推理推进到第一次需要猜测的局面"""
+    board = Board(config.width, config.height, config.num_mines, seed=SEED, first_click=FIRST_CLICK_CELL)
+    board.open(config.width // 2, config.height // 2)
+    solver = Solver()
+    while board.is_playing:
+        safe = [idx for idx in solver.solve(board).safe if board.status[idx] == HIDDEN]
+        if not safe:
+            break
+        for idx in safe:
+            board.open(*board.coords(idx))
+    return board
+
+
+def _run_solver(board: Board):
+    # 新建求解器, 不使用上一次的分量缓存
+    Solver().solve(board)
+
+
+_display = None
+
+
+def _display_state():
+    """创建虚拟显示窗口和贴图图集 (只创建一次)"""
+    global _display
+    if _display is None:
+        import pygame
+        import main
+        pygame.init()
+        screen = pygame.display.set_mode(main.SCREENSIZE)
+        _, tiles = main.GameManager._load_images()
+        _display = (screen, tiles)
+    return _display
+
+
+def _setup_render_full(config: SimConfig):
+    import main
+    screen, tiles = _display_state()
+    board = Board(config.width, config.height, config.num_mines, seed=SEED, first_click=FIRST_CLICK_CELL)
+    board.open(0, 0)
+    minesweeper_map = main.MinesweeperMap(tiles, board=board)
+    return screen, minesweeper_map
+
+
+def _run_render_full(state):
+    screen, minesweeper_map = state
+    minesweeper_map.full_redraw = True
+    minesweeper_map.draw(screen)
+
+
+def _setup_render_dirty(config: SimConfig):
+    screen, minesweeper_map = _setup_render_full(config)
+    minesweeper_map.draw(screen)
+    board = minesweeper_map.board
+    # 在显示区域内插一批旗子, 只重绘这些格子
+    x0, y0, x1, y1 = minesweeper_map.viewport.visible_range()
+    for y in range(y0, y1, 2):
+        for x in range(x0, x1, 3):
+            if board.status[board.index(x, y)] == HIDDEN:
+                board.cycle_mark(x, y)
+    return screen, minesweeper_map
+
+
+def _run_render_dirty(state):
+    screen, minesweeper_map = state
+    minesweeper_map.draw(screen)
+
+
+'''全部用例'''
+CASES: Dict[str, Case] = {case.name: case for case in [
+    Case('generate', '生成棋盘 (随机布雷 + 计算周围地雷数)', _setup_generate, _run_generate, fresh=False),
+    Case('first_open', '首次打开 (延迟布雷 + 展开)', _setup_first_open, _run_first_open),
+    Case('flood_fill', '无雷棋盘上一次打开全部格子', _setup_flood_fill, _run_flood_fill),
+    Case('chord', '依次快速打开最多256个数字格的周围', _setup_chord, _run_chord),
+    Case('counters', '读取 is_won 等计数属性 10000 次', _setup_counters, _run_counters, fresh=False),
+    Case('solver', '求解第一次需要猜测的局面', _setup_solver, _run_solver, fresh=False,
+         max_cells=SOLVER_MAX_CELLS),
+    Case('render_full', '整屏重绘显示区域', _setup_render_full, _run_render_full, fresh=False),
+    Case('render_dirty', '只重绘变化的格子', _setup_render_dirty, _run_render_dirty),
+]}
+
+
+def measure(case: Case, config: SimConfig, repeat: int) -> dict:
+    """对一个用例计时 repeat 次, 不需要重新准备的快速用例在一次计时内重复多遍"""
+    state = case.setup(config)
+    # 先不计时地运行一次预热, 同时估计单次耗时
+    start = time.perf_counter()
+    case.run(state)
+    elapsed = time.perf_counter() - start
+    number = 1
+    if not case.fresh:
+        number = max(1, int(MIN_SAMPLE_SECONDS / elapsed)) if elapsed > 0 else 1000
+    samples = []
+    for _ in range(repeat):
+        if case.fresh:
+            state = case.setup(config)
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            case.run(state)
+        samples.append((time.perf_counter_ns() - start) / number / 1e6)
+    return {
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.fmean(samples),
+        'repeat': repeat,
+        'number': number
+    }
+
+
+def run_benchmarks(configs: List[SimConfig], names: List[str], repeat: int,
+                   progress: Optional[Callable[[str], None]] = None) -> dict:
+    """运行选定的用例, 返回可写入JSON的结果"""
+    results = {}
+    for name in names:
+        case = CASES[name]
+        results[name] = {}
+        for config in configs:
+            if case.max_cells is not None and config.width * config.height > case.max_cells:
+                continue
+            results[name][config.name] = measure(case, config, repeat)
+            if progress:
+                progress(f"{name:<13} {config.name:<18} median {results[name][config.name]['median_ms']:10.3f} ms")
+    return {'meta': environment(), 'results': results}
+
+
+def environment() -> dict:
+    """记录运行环境, 便于判断结果是否可比"""
+    import pygame
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'time': time.strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """与基线比较中位数, 返回变慢超过阈值的项目"""
+    regressions = []
+    for name, configs in results['results'].items():
+        for config, current in configs.items():
+            base = baseline.get('results', {}).get(name, {}).get(config)
+            if base is None or not base['median_ms']:
+                continue
+            ratio = current['median_ms'] / base['median_ms']
+            mark = '  <-- 变慢' if ratio > 1 + threshold else ''
+            print(f"{name:<13} {config:<18} {base['median_ms']:10.3f} -> {current['median_ms']:10.3f} ms "
+                  f"({ratio:5.2f}x){mark}")
+            if mark:
+                regressions.append(f'{name}/{config}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='扫雷热点路径基准测试')
+    parser.add_argument('--only', help='只运行指定用例, 逗号分隔: ' + ','.join(CASES))
+    parser.add_argument('--difficulty', action='append', choices=[d.value for d in Difficulty],
+                        help='难度预设, 可重复 (默认全部)')
+    parser.add_argument('--custom', action='append', type=parse_custom,
+                        help=f'自定义配置 WxH:M, 可重复 (默认 {" ".join(LARGE_CONFIGS)})')
+    parser.add_argument('--repeat', type=int, default=15, help='每个用例的计时次数')
+    parser.add_argument('--output', help='结果输出的JSON文件')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='基线文件')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--compare', action='store_true', help='与基线比较, 有退步时返回非零')
+    parser.add_argument('--threshold', type=float, default=0.2, help='判定为退步的变慢比例')
+    args = parser.parse_args(argv)
+
+    names = args.only.split(',') if args.only else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"未知用例: {', '.join(unknown)}")
+    difficulties = args.difficulty or [d.value for d in Difficulty]
+    customs = args.custom if args.custom is not None else [parse_custom(spec) for spec in LARGE_CONFIGS]
+    configs = [config_from_difficulty(Difficulty(d)) for d in difficulties] + customs
+
+    results = run_benchmarks(configs, names, args.repeat, progress=print)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'基线已保存到 {args.baseline}')
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            parser.error(f'基线文件不存在: {args.baseline}')
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} 项变慢超过 {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
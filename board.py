@@ -0,0 +1,646 @@
+"""
+扫雷棋盘引擎
+纯逻辑实现, 不依赖pygame, 可在无显示环境下模拟对局
+格子按 y * width + x 的一维下标存放在平坦数组中
+"""
+
+import copy
+from array import array
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from config import GameState, MineStatus
+
+# 状态码常量, 避免在热点路径上访问枚举
+HIDDEN = MineStatus.HIDDEN.value
+OPENED = MineStatus.OPENED.value
+FLAGGED = MineStatus.FLAGGED.value
+QUESTIONED = MineStatus.QUESTIONED.value
+MINE_EXPLODED = MineStatus.MINE_EXPLODED.value
+WRONG_FLAG = MineStatus.WRONG_FLAG.value
+MARKS = (FLAGGED, QUESTIONED)
+
+OPENED_BYTE = bytes([OPENED])
+
+# 首次点击的保护方式: 不保护 / 点击的格子不是雷 / 点击的格子及周围8格都不是雷
+FIRST_CLICK_UNSAFE = 'unsafe'
+FIRST_CLICK_CELL = 'cell'
+FIRST_CLICK_AREA = 'area'
+
+# 按棋盘尺寸缓存的邻接表数量
+NEIGHBOR_TABLE_CACHE = 8
+# 不超过该格子数的棋盘共享缓存的邻接表; 更大的棋盘各自按需构建, 不常驻内存
+NEIGHBOR_TABLE_SHARED_CELLS = 512 * 512
+
+# 洪水填充展开超过该数量的空白段后, 改为整盘向量化求连通区域 (逐段展开的解释器开销与段数成正比)
+FLOOD_FILL_VECTOR_RUNS = 2048
+
+# Zobrist 哈希: 每个格子的可见代码 = 状态码 * ZOBRIST_STRIDE + 数字 (已打开的地雷为9), 隐藏格为0
+ZOBRIST_STRIDE = 16
+ZOBRIST_MINE = 9
+ZOBRIST_MASK = (1 << 64) - 1
+# 变化的格子不超过该数量时逐个计算哈希, 避免 numpy 的调用开销
+ZOBRIST_SCALAR_LIMIT = 32
+
+'''右键标记的循环顺序'''
+MARK_TRANSITIONS = {
+    HIDDEN: FLAGGED,
+    FLAGGED: QUESTIONED,
+    QUESTIONED: HIDDEN
+}
+
+
+def generate_mine_mask(width: int, height: int, num_mines: int, rng: np.random.Generator,
+                       exclude: Optional[Iterable[int]] = None) -> np.ndarray:
+    """随机生成 (height, width) 的布尔地雷掩码, exclude 中的下标不放雷"""
+    size = width * height
+    excluded = np.unique(np.fromiter(exclude, dtype=np.int64)) if exclude is not None else ()
+    if num_mines > size - len(excluded):
+        raise ValueError(f"可放置地雷的格子不足: {size - len(excluded)} < {num_mines}")
+    positions = rng.choice(size - len(excluded), num_mines, replace=False)
+    if len(excluded):
+        # 在去掉排除格后的序号上抽样; 第 k 个排除格 (从0数) 在这些序号中的位置是 excluded[k] - k,
+        # 不小于它的序号都要后移一位, 一次二分查找算出每个序号后移的总数
+        positions += np.searchsorted(excluded - np.arange(len(excluded)), positions, side='right')
+    mask = np.zeros(size, dtype=bool)
+    mask[positions] = True
+    return mask.reshape(height, width)
+
+
+def count_neighbors(mask: np.ndarray) -> np.ndarray:
+    """用8个方向的平移求和计算每个格子周围的地雷数量; 按最后两维计算, 前面的维度可以是一批棋盘"""
+    *batch, height, width = mask.shape
+    padded = np.zeros((*batch, height + 2, width + 2), dtype=np.uint8)
+    padded[..., 1:-1, 1:-1] = mask
+    counts = np.zeros(mask.shape, dtype=np.uint8)
+    for dy in (0, 1, 2):
+        for dx in (0, 1, 2):
+            if dy == 1 and dx == 1:
+                continue
+            counts += padded[..., dy:dy + height, dx:dx + width]
+    return counts
+
+
+'''邻接表 (CSR格式): 第 idx 个格子的邻居为 indices[offsets[idx]:offsets[idx + 1]]'''
+class NeighborTable(NamedTuple):
+    offsets: array
+    indices: array
+
+
+def neighbor_table(width: int, height: int) -> NeighborTable:
+    """指定尺寸棋盘的邻接表, 同尺寸的小棋盘共享同一份; 每个格子的邻居按行优先排列"""
+    if width * height <= NEIGHBOR_TABLE_SHARED_CELLS:
+        return _shared_neighbor_table(width, height)
+    return _build_neighbor_table(width, height)
+
+
+@lru_cache(maxsize=NEIGHBOR_TABLE_CACHE)
+def _shared_neighbor_table(width: int, height: int) -> NeighborTable:
+    return _build_neighbor_table(width, height)
+
+
+def _build_neighbor_table(width: int, height: int) -> NeighborTable:
+    padded = np.full((height + 2, width + 2), -1, dtype=np.int32)
+    padded[1:-1, 1:-1] = np.arange(width * height, dtype=np.int32).reshape(height, width)
+    # 每个格子周围3x3窗口 (去掉中心) 展开成8列, 越界的位置为-1
+    windows = np.stack([padded[dy:dy + height, dx:dx + width] for dy in (0, 1, 2) for dx in (0, 1, 2)
+                        if dy != 1 or dx != 1], axis=-1).reshape(-1, 8)
+    valid = windows >= 0
+    offsets = np.zeros(width * height + 1, dtype=np.int32)
+    np.cumsum(valid.sum(axis=1), out=offsets[1:])
+    # array 的切片比逐个读取 numpy 元素快, 又比列表省内存
+    table = NeighborTable(array('i'), array('i'))
+    table.offsets.frombytes(offsets.tobytes())
+    table.indices.frombytes(windows[valid].tobytes())
+    return table
+
+
+def zobrist_key(idx: int, code: int) -> int:
+    """用 splitmix64 把 (下标, 可见代码) 混合成64位键, 隐藏格的键为0"""
+    if not code:
+        return 0
+    z = (idx * 256 + code + 0x9E3779B97F4A7C15) & ZOBRIST_MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & ZOBRIST_MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & ZOBRIST_MASK
+    return z ^ (z >> 31)
+
+
+def zobrist_keys(cells: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    """zobrist_key 的批量版本"""
+    z = cells.astype(np.uint64) * np.uint64(256) + codes.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    z[codes == 0] = 0
+    return z
+
+'''棋盘快照, 由 Board.snapshot 生成'''
+class BoardSnapshot(NamedTuple):
+    # 所属的修改日志及快照时的长度
+    journal: list
+    position: int
+    game_state: GameState
+    opened_count: int
+    flags_count: int
+    mines_placed: bool
+    # 地雷尚未放置时随机数发生器的状态, 恢复后放置结果相同
+    rng_state: Optional[dict]
+
+
+'''棋盘类'''
+class Board:
+    def __init__(self, width: int, height: int, num_mines: int, seed: Optional[int] = None,
+                 mines: Optional[bytes] = None, first_click: str = FIRST_CLICK_CELL):
+        if width <= 0 or height <= 0:
+            raise ValueError(f"棋盘尺寸无效: {width}x{height}")
+        if not 0 <= num_mines < width * height:
+            raise ValueError(f"地雷数量无效: {num_mines}")
+        self.width = width
+        self.height = height
+        self.num_mines = num_mines
+        self.size = width * height
+        # 未指定种子时随机生成一个, 以便复现棋盘
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.first_click = first_click
+        self.game_state = GameState.NOT_STARTED
+        # 地雷是否已经放置; 首次点击保护时推迟到第一次打开格子
+        self.mines_placed = False
+        # 每个格子是否为地雷 (0/1)
+        self.mines = bytearray(self.size)
+        # 每个格子周围的地雷数量
+        self.counts = bytearray(self.size)
+        # 每个格子的状态码 (MineStatus.value)
+        self.status = bytearray(self.size)
+        # 自上次 pop_changes 以来状态发生变化的格子, 供渲染层局部重绘
+        self.changes = []
+        # 增量维护的计数, 每次状态转换时更新
+        self.opened_count = 0
+        self.flags_count = 0
+
+        self._rng = np.random.default_rng(self.seed)
+        # 邻接表在第一次查询邻居时才构建, 只用向量化操作的大棋盘不必付出构建的时间和内存
+        self._neighbor_offsets = None
+        self._neighbor_indices = None
+        # 周围没有地雷的非雷格子 (0/1), 洪水填充按它扫描
+        self._zero = bytes(self.size)
+        # 修改日志 [(格子下标, 修改前的状态码)], 有快照时才记录
+        self._journal = None
+        # 可见状态的 Zobrist 哈希, 第一次读取后增量维护
+        self._zobrist = None
+        if mines is not None:
+            # 使用给定的地雷布局 (如无猜生成器或录像)
+            if len(mines) != self.size or bytes(mines).count(1) != num_mines:
+                raise ValueError("地雷布局与棋盘尺寸或地雷数量不符")
+            self._bury(np.flatnonzero(np.frombuffer(bytes(mines), dtype=np.uint8)))
+        elif first_click == FIRST_CLICK_UNSAFE:
+            self.place_mines()
+
+    def place_mines(self, safe_cell: Optional[int] = None):
+        """随机放置地雷, safe_cell (及保护范围内的格子) 不放雷"""
+        exclude = []
+        if safe_cell is not None:
+            exclude = [safe_cell]
+            if self.first_click == FIRST_CLICK_AREA:
+                # 直接按坐标取周围一圈, 不为一次查询构建整盘的邻接表
+                x, y = self.coords(safe_cell)
+                area = [row * self.width + col for row in range(max(y - 1, 0), min(y + 2, self.height))
+                        for col in range(max(x - 1, 0), min(x + 2, self.width))]
+                # 格子不够时退化为只保护点击的格子
+                if self.size - len(area) >= self.num_mines:
+                    exclude = area
+        mask = generate_mine_mask(self.width, self.height, self.num_mines, self._rng, exclude=exclude)
+        self._bury(np.flatnonzero(mask))
+
+    def _bury(self, positions: np.ndarray):
+        """埋下地雷, 只在地雷周围累加计数, 再生成空白格掩码"""
+        width, height = self.width, self.height
+        mines = np.frombuffer(self.mines, dtype=np.uint8)
+        counts = np.frombuffer(self.counts, dtype=np.uint8)
+        mines[positions] = 1
+        if positions.size * 8 > self.size:
+            # 地雷稠密时整盘平移求和比逐个地雷累加更快
+            counts[:] = count_neighbors(mines.view(bool).reshape(height, width)).reshape(-1)
+            self._zero = ((counts == 0) & (mines == 0)).tobytes()
+            self.mines_placed = True
+            return
+        ys, xs = np.divmod(positions, width)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                if dy == 0 and dx == 0:
+                    continue
+                ny, nx = ys + dy, xs + dx
+                valid = (ny >= 0) & (ny < height) & (nx >= 0) & (nx < width)
+                # 同一方向上的目标格互不重复, 可以直接按下标累加
+                counts[ny[valid] * width + nx[valid]] += 1
+        self._zero = ((counts == 0) & (mines == 0)).tobytes()
+        self.mines_placed = True
+
+    def index(self, x: int, y: int) -> int:
+        """坐标转一维下标"""
+        return y * self.width + x
+
+    def coords(self, idx: int):
+        """一维下标转坐标 (x, y)"""
+        y, x = divmod(idx, self.width)
+        return x, y
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        """坐标是否在棋盘内"""
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def neighbors(self, idx: int) -> Sequence[int]:
+        """获取周围格子的下标 (邻接表的切片)"""
+        offsets = self._neighbor_offsets
+        if offsets is None:
+            offsets, self._neighbor_indices = neighbor_table(self.width, self.height)
+            self._neighbor_offsets = offsets
+        return self._neighbor_indices[offsets[idx]:offsets[idx + 1]]
+
+    def status_at(self, x: int, y: int) -> MineStatus:
+        """获取格子状态"""
+        return MineStatus(self.status[y * self.width + x])
+
+    def is_mine(self, x: int, y: int) -> bool:
+        """格子是否为地雷"""
+        return bool(self.mines[y * self.width + x])
+
+    def count_at(self, x: int, y: int) -> int:
+        """格子周围的地雷数量"""
+        return self.counts[y * self.width + x]
+
+    def start(self):
+        """首次操作时开始游戏"""
+        if self.game_state == GameState.NOT_STARTED:
+            self.game_state = GameState.PLAYING
+
+    @property
+    def is_playing(self) -> bool:
+        """是否正在游戏中"""
+        return self.game_state == GameState.PLAYING
+
+    @property
+    def is_finished(self) -> bool:
+        """游戏是否已结束"""
+        return self.game_state in (GameState.GAME_OVER, GameState.GAME_WON)
+
+    def open(self, x: int, y: int) -> List[int]:
+        """打开格子, 返回新打开的格子下标; 触雷时游戏结束"""
+        self.start()
+        if self.game_state != GameState.PLAYING:
+            return []
+        idx = y * self.width + x
+        if self.status[idx] != HIDDEN:
+            return []
+        if not self.mines_placed:
+            self.place_mines(safe_cell=idx)
+        if self.mines[idx]:
+            self._explode(idx)
+            return [idx]
+        opened = self._flood_fill(idx)
+        self._touched(opened, HIDDEN)
+        self.changes.extend(opened)
+        self.opened_count += len(opened)
+        self._check_won()
+        return opened
+
+    def _flood_fill(self, idx: int) -> List[int]:
+        """扫描线洪水填充: 按行整段打开空白区域, 返回新打开的格子下标"""
+        status, zero = self.status, self._zero
+        if status[idx] != HIDDEN or self.mines[idx]:
+            return []
+        if not zero[idx]:
+            status[idx] = OPENED
+            return [idx]
+
+        width, size = self.width, self.size
+        # 棋盘上没有旗子和问号时 (最常见), 跳过逐段检查标记
+        marks = FLAGGED in status or QUESTIONED in status
+        opened = []
+        expanded = set()
+        stack = [idx]
+        while stack:
+            seed = stack.pop()
+            if marks and status[seed] in MARKS:
+                continue
+            row = seed - seed % width
+            row_end = row + width
+            # 当前行包含种子的连续空白段 [left, right)
+            left = zero.rfind(0, row, seed) + 1 or row
+            right = zero.find(0, seed, row_end)
+            if right < 0:
+                right = row_end
+            if marks and self._has_marks(left, right):
+                left, right = self._narrow_run(seed, left, right)
+            if left in expanded:
+                continue
+            expanded.add(left)
+            if len(expanded) > FLOOD_FILL_VECTOR_RUNS:
+                return self._fill_region(idx, opened)
+
+            # 空白段及其左右各一格, 在上中下三行都要打开
+            start = left - 1 if left > row else left
+            end = right + 1 if right < row_end else right
+            for seg_start in (start - width, start, start + width):
+                if seg_start < 0 or seg_start >= size:
+                    continue
+                seg_end = seg_start + end - start
+                # 已经全部打开的段 (通常是来时的那一行) 既没有新种子也不用打开
+                hidden = status.count(HIDDEN, seg_start, seg_end)
+                if not hidden:
+                    continue
+                if seg_start != start:
+                    self._collect_seeds(seg_start, seg_end, marks and self._has_marks(seg_start, seg_end), stack)
+                self._open_segment(seg_start, seg_end, hidden, opened)
+        return opened
+
+    def _fill_region(self, idx: int, opened: List[int]) -> List[int]:
+        """向量化填充: 把空白格按行切成段, 用并查集合并上下 (含斜向) 相邻的段, 求出 idx 所在的区域,
+        再打开区域及其周围一圈的隐藏格子; opened 为扫描线已经打开的格子, 其中的空白格仍然可以通行"""
+        width, height = self.width, self.height
+        # 每行末尾补一列不可通行的格子, 段不会跨行, 段的左右各扩一格也不会落到相邻行
+        stride = width + 1
+        status = np.frombuffer(self.status, dtype=np.uint8)
+        zero = np.frombuffer(self._zero, dtype=bool)
+        passable = zero & (status == HIDDEN)
+        done = np.array(opened, dtype=np.int64)
+        passable[done] = zero[done]
+        grid = np.zeros((height, stride), dtype=np.int8)
+        grid[:, :width] = passable.reshape(height, width)
+        edges = np.diff(grid.reshape(-1), prepend=0, append=0)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        # 上一行中与段 [start, end) 相邻的段: 结束于 start - stride - 1 之后, 开始于 end - stride + 1 之前
+        first = np.searchsorted(ends, starts - stride - 1, 'right')
+        last = np.searchsorted(starts, ends - stride + 1, 'left')
+        degree = np.maximum(last - first, 0)
+        below = np.repeat(np.arange(starts.size), degree)
+        above = np.repeat(first - np.cumsum(degree) + degree, degree) + np.arange(int(degree.sum()))
+
+        # 并查集: 每轮把较大的根挂到较小的根下, 再压缩路径, 直到每条边两端的根相同
+        roots = np.arange(starts.size)
+        while above.size:
+            root_above, root_below = roots[above], roots[below]
+            split = root_above != root_below
+            if not split.any():
+                break
+            above, below = above[split], below[split]
+            root_above, root_below = root_above[split], root_below[split]
+            np.minimum.at(roots, np.maximum(root_above, root_below), np.minimum(root_above, root_below))
+            while True:
+                jumped = roots[roots]
+                if np.array_equal(jumped, roots):
+                    break
+                roots = jumped
+
+        y, x = divmod(idx, width)
+        run = np.searchsorted(starts, y * stride + x, 'right') - 1
+        region = roots == roots[run]
+        # 区域内每段左右各扩一格, 在上中下三行累加覆盖次数; 前后各留一行余量
+        cover = np.zeros(grid.size + 2 * stride + 2, dtype=np.int32)
+        for offset in (1, stride + 1, 2 * stride + 1):
+            cover[starts[region] - 1 + offset] += 1
+            cover[ends[region] + 1 + offset] -= 1
+        cover = np.cumsum(cover)[stride + 1:stride + 1 + grid.size].reshape(height, stride)[:, :width]
+        cells = np.flatnonzero((cover.reshape(-1) > 0) & (status == HIDDEN))
+        status[cells] = OPENED
+        opened.extend(cells.tolist())
+        return opened
+
+    def _has_marks(self, start: int, end: int) -> bool:
+        """区间内是否有旗子或问号"""
+        status = self.status
+        return bool(status.count(FLAGGED, start, end) or status.count(QUESTIONED, start, end))
+
+    def _narrow_run(self, seed: int, left: int, right: int):
+        """空白段被标记隔断时, 收缩到种子所在的未标记部分"""
+        status = self.status
+        lo, hi = seed, seed + 1
+        while lo > left and status[lo - 1] not in MARKS:
+            lo -= 1
+        while hi < right and status[hi] not in MARKS:
+            hi += 1
+        return lo, hi
+
+    def _collect_seeds(self, start: int, end: int, marked: bool, stack: List[int]):
+        """收集相邻行中尚未打开的空白段作为新的种子"""
+        status, zero = self.status, self._zero
+        if marked:
+            stack.extend(i for i in range(start, end) if zero[i] and status[i] == HIDDEN)
+            return
+        # 没有标记时, 同一空白段要么全部未打开, 要么已经展开过, 每段取一个种子即可
+        pos = zero.find(1, start, end)
+        while pos >= 0:
+            if status[pos] == HIDDEN:
+                stack.append(pos)
+            pos = zero.find(0, pos, end)
+            if pos < 0:
+                break
+            pos = zero.find(1, pos, end)
+
+    def _open_segment(self, start: int, end: int, hidden: int, opened: List[int]):
+        """打开区间内的 hidden 个隐藏格子 (空白格的邻居一定不是地雷)"""
+        status = self.status
+        if hidden == end - start:
+            status[start:end] = OPENED_BYTE * (end - start)
+            opened.extend(range(start, end))
+        else:
+            for i in range(start, end):
+                if status[i] == HIDDEN:
+                    status[i] = OPENED
+                    opened.append(i)
+
+    def cycle_mark(self, x: int, y: int) -> MineStatus:
+        """右键标记: 隐藏 -> 旗子 -> 问号 -> 隐藏"""
+        self.start()
+        idx = y * self.width + x
+        old = self.status[idx]
+        if self.game_state == GameState.PLAYING and old in MARK_TRANSITIONS:
+            new = MARK_TRANSITIONS[old]
+            self.status[idx] = new
+            self._touched([idx], old)
+            self.flags_count += (new == FLAGGED) - (old == FLAGGED)
+            self.changes.append(idx)
+        return MineStatus(self.status[idx])
+
+    def flags_around(self, x: int, y: int) -> int:
+        """周围被标记为旗子的数量"""
+        status = self.status
+        return sum(1 for n in self.neighbors(y * self.width + x) if status[n] == FLAGGED)
+
+    def can_chord(self, x: int, y: int) -> bool:
+        """是否可以快速打开周围格子 (已打开的数字格且旗子数量相符)"""
+        idx = y * self.width + x
+        return (self.status[idx] == OPENED and self.counts[idx] > 0 and
+                self.flags_around(x, y) == self.counts[idx])
+
+    def chord(self, x: int, y: int) -> List[int]:
+        """快速打开周围未标记的格子, 返回新打开的格子下标"""
+        if self.game_state != GameState.PLAYING or not self.can_chord(x, y):
+            return []
+        opened = []
+        for n in self.neighbors(y * self.width + x):
+            if self.status[n] != HIDDEN:
+                continue
+            if self.mines[n]:
+                self._touched(opened, HIDDEN)
+                self.changes.extend(opened)
+                self.opened_count += len(opened)
+                self._explode(n)
+                opened.append(n)
+                return opened
+            opened.extend(self._flood_fill(n))
+        self._touched(opened, HIDDEN)
+        self.changes.extend(opened)
+        self.opened_count += len(opened)
+        self._check_won()
+        return opened
+
+    def _explode(self, idx: int):
+        """触雷: 显示所有地雷和错误标记"""
+        status = np.frombuffer(self.status, dtype=np.uint8)
+        mines = np.frombuffer(self.mines, dtype=bool)
+        revealed = mines & (status == HIDDEN)
+        revealed[idx] = False
+        wrong_flags = ~mines & (status == FLAGGED)
+        status[revealed] = OPENED
+        status[wrong_flags] = WRONG_FLAG
+        self.status[idx] = MINE_EXPLODED
+        self._touched(np.flatnonzero(revealed), HIDDEN)
+        self._touched(np.flatnonzero(wrong_flags), FLAGGED)
+        self._touched([idx], HIDDEN)
+        self.changes.extend(np.flatnonzero(revealed | wrong_flags).tolist())
+        self.changes.append(idx)
+        self.opened_count += int(np.count_nonzero(revealed))
+        self.flags_count -= int(np.count_nonzero(wrong_flags))
+        self.game_state = GameState.GAME_OVER
+
+    def _check_won(self):
+        """所有非雷格子都打开后获胜, 并把剩余地雷标记为旗子"""
+        if self.opened_count != self.size - self.num_mines:
+            return
+        status = np.frombuffer(self.status, dtype=np.uint8)
+        unflagged = np.frombuffer(self.mines, dtype=bool) & (status != FLAGGED)
+        cells = np.flatnonzero(unflagged)
+        # 剩余地雷可能是隐藏或问号
+        old = status[cells]
+        status[cells] = FLAGGED
+        self._touched(cells, old)
+        self.changes.extend(np.flatnonzero(unflagged).tolist())
+        self.flags_count = self.num_mines
+        self.game_state = GameState.GAME_WON
+
+    def pop_changes(self) -> List[int]:
+        """取出并清空自上次调用以来变化的格子"""
+        changes, self.changes = self.changes, []
+        return changes
+
+    @property
+    def is_won(self) -> bool:
+        """是否获胜"""
+        return self.game_state == GameState.GAME_WON
+
+    def _touched(self, cells, old):
+        """状态修改后调用: 记入修改日志并更新哈希, old 为修改前的状态码 (单个值或逐格的数组)"""
+        if not len(cells) or (self._journal is None and self._zobrist is None):
+            return
+        if self._journal is not None:
+            self._journal.append((np.array(cells, dtype=np.int64), old))
+        if self._zobrist is not None:
+            self._zobrist ^= self._hash_delta(cells, old)
+
+    def _visible_codes(self, cells: np.ndarray, status: np.ndarray) -> np.ndarray:
+        """格子在给定状态码下的可见代码"""
+        opened = status == OPENED
+        mines = np.frombuffer(self.mines, dtype=np.uint8)[cells]
+        counts = np.frombuffer(self.counts, dtype=np.uint8)[cells]
+        numbers = np.where(mines != 0, ZOBRIST_MINE, counts)
+        return status.astype(np.int64) * ZOBRIST_STRIDE + np.where(opened, numbers, 0)
+
+    def _visible_code(self, idx: int, status: int) -> int:
+        """_visible_codes 的单个格子版本"""
+        if status != OPENED:
+            return status * ZOBRIST_STRIDE
+        return status * ZOBRIST_STRIDE + (ZOBRIST_MINE if self.mines[idx] else self.counts[idx])
+
+    def _hash_delta(self, cells, old) -> int:
+        """格子从 old 变为当前状态时哈希的变化量"""
+        if len(cells) <= ZOBRIST_SCALAR_LIMIT:
+            cells = cells.tolist() if isinstance(cells, np.ndarray) else cells
+            olds = old.tolist() if isinstance(old, np.ndarray) else [old] * len(cells)
+            status, code = self.status, self._visible_code
+            delta = 0
+            for idx, before in zip(cells, olds):
+                delta ^= zobrist_key(idx, code(idx, before)) ^ zobrist_key(idx, code(idx, status[idx]))
+            return delta
+        cells = np.asarray(cells, dtype=np.int64)
+        old = np.broadcast_to(np.asarray(old, dtype=np.uint8), cells.shape)
+        new = np.frombuffer(self.status, dtype=np.uint8)[cells]
+        keys = zobrist_keys(cells, self._visible_codes(cells, old))
+        keys ^= zobrist_keys(cells, self._visible_codes(cells, new))
+        return int(np.bitwise_xor.reduce(keys))
+
+    @property
+    def zobrist(self) -> int:
+        """可见状态 (格子状态和已打开格子的数字) 的64位哈希; 第一次读取时整盘计算, 之后随修改增量更新"""
+        if self._zobrist is None:
+            cells = np.arange(self.size, dtype=np.int64)
+            status = np.frombuffer(self.status, dtype=np.uint8)
+            self._zobrist = int(np.bitwise_xor.reduce(zobrist_keys(cells, self._visible_codes(cells, status))))
+        return self._zobrist
+
+    def snapshot(self) -> BoardSnapshot:
+        """记录当前局面, 之后用 restore 撤销到这里; 开销与棋盘大小无关"""
+        if self._journal is None:
+            self._journal = []
+        return BoardSnapshot(self._journal, len(self._journal), self.game_state, self.opened_count,
+                             self.flags_count, self.mines_placed,
+                             None if self.mines_placed else self._rng.bit_generator.state)
+
+    def restore(self, snapshot: BoardSnapshot):
+        """撤销快照之后的修改, 耗时与变化的格子数成正比; 恢复到较早的快照后, 较晚的快照随之失效"""
+        journal = self._journal
+        if snapshot.journal is not journal or snapshot.position > len(journal):
+            raise ValueError("快照不属于该棋盘或已失效")
+        status = np.frombuffer(self.status, dtype=np.uint8)
+        while len(journal) > snapshot.position:
+            cells, old = journal.pop()
+            current = status[cells]
+            status[cells] = old
+            if self._zobrist is not None:
+                self._zobrist ^= self._hash_delta(cells, current)
+            self.changes.extend(cells.tolist())
+        if self.mines_placed and not snapshot.mines_placed:
+            # 快照时地雷还没放置, 清空后下一次打开会按相同的随机状态重新放置
+            # 换成新的数组而不是原地清零: 放置后 fork 出的棋盘与本棋盘共享地雷和数字
+            self.mines = bytearray(self.size)
+            self.counts = bytearray(self.size)
+            self._zero = bytes(self.size)
+            self.mines_placed = False
+        if snapshot.rng_state is not None:
+            self._rng.bit_generator.state = snapshot.rng_state
+        self.game_state = snapshot.game_state
+        self.opened_count = snapshot.opened_count
+        self.flags_count = snapshot.flags_count
+
+    def release_snapshots(self):
+        """不再需要撤销时停止记录修改日志, 已有的快照全部失效"""
+        self._journal = None
+
+    def fork(self) -> 'Board':
+        """复制出一个可以独立修改的棋盘
+        地雷布局、数字和邻接表放置后不再改变, 与原棋盘共享; 状态数组 (每格一字节) 整体复制,
+        耗时与棋盘大小成正比 (1000x1000 约 70us); 耗时只与变化的格子数有关的分支请用 snapshot/restore"""
+        board = copy.copy(self)
+        board.status = bytearray(self.status)
+        board.changes = []
+        board._journal = None
+        if not self.mines_placed:
+            # 地雷尚未放置时各自放置, 随机数发生器从相同的状态开始
+            board.mines = bytearray(self.size)
+            board.counts = bytearray(self.size)
+            board._rng = copy.deepcopy(self._rng)
+        return board
+
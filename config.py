@@ -31,8 +31,13 @@ class MineStatus(Enum):
 
 # 游戏参数
 FPS = 60
-GRIDSIZE = 30
+# 事件驱动的主循环: 空闲时阻塞等待输入或计时器跳秒, 只在画面变化时重绘; 为False时按FPS轮询
+EVENT_DRIVEN = True
+# 100%缩放时的格子边长 (像素)
+GRIDSIZE = 40
 BORDERSIZE = 5
+# 雷区显示区域的最大尺寸 (像素), 棋盘更大时可以平移
+MAX_VIEW_SIZE = (1280, 720)
 
 # 难度设置
 DIFFICULTY_SETTINGS = {
@@ -53,16 +58,31 @@ DIFFICULTY_SETTINGS = {
     }
 }
 
-# 默认难度
+# 默认难度, 游戏中按 1/2/3 切换
 DEFAULT_DIFFICULTY = Difficulty.MEDIUM
-GAME_MATRIX_SIZE = DIFFICULTY_SETTINGS[DEFAULT_DIFFICULTY]['grid_size']
-NUM_MINES = DIFFICULTY_SETTINGS[DEFAULT_DIFFICULTY]['num_mines']
 
-# 屏幕尺寸计算
-SCREENSIZE = (
-    GAME_MATRIX_SIZE[0] * GRIDSIZE + BORDERSIZE * 2,
-    (GAME_MATRIX_SIZE[1] + 2) * GRIDSIZE + BORDERSIZE
-)
+# 首次点击保护: 'unsafe' 不保护, 'cell' 点击的格子不是雷, 'area' 点击的格子及周围8格都不是雷
+FIRST_CLICK = 'cell'
+
+# 无猜模式: 棋盘保证从起点出发无需猜测即可解完 (见 noguess.py)
+NO_GUESS = False
+
+# 无限模式: 棋盘按区块惰性生成, 可平移缩放地无限探索 (见 infinite.py)
+INFINITE = False
+
+# 性能剖析: 统计主循环各阶段耗时和重绘格子数等, 退出时导出 (相对于游戏目录, 为None时不导出)
+PROFILE = False
+PROFILE_OVERLAY = True
+PROFILE_JSON = 'profile.json'
+PROFILE_CSV = 'profile.csv'
+
+# 录像归档文件 (相对于游戏目录), 为None时不录像
+REPLAY_ARCHIVE = 'replays/replays.msr'
+
+# 战绩数据库 (相对于游戏目录), 为None时不记录战绩 (见 stats.py)
+STATS_DB = 'stats/stats.db'
+# 记录战绩用的玩家名, 为None时使用系统用户名
+PLAYER_NAME = None
 
 # 颜色定义
 COLORS = {
@@ -0,0 +1,352 @@
+"""
+无限棋盘
+棋盘按 CHUNK_SIZE x CHUNK_SIZE 划分为区块, 区块的地雷由 (种子, 区块坐标) 确定地生成,
+第一次打开或查看区块时才生成; 只保存访问过的区块, 超出内存上限时按LRU把最久未用的区块换出到磁盘
+内存占用随探索面积增长, 与名义棋盘尺寸无关
+坐标可以为负数, 原点及其周围8格一定不是雷, 游戏从原点开始
+"""
+
+import os
+import shutil
+import tempfile
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from board import FLAGGED, HIDDEN, MARK_TRANSITIONS, MINE_EXPLODED, OPENED, WRONG_FLAG, count_neighbors
+from config import GameState, MineStatus
+
+# 区块边长, 取2的幂以便用移位计算区块坐标
+CHUNK_SHIFT = 5
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+# 内存中最多保留的区块数量
+MAX_LOADED_CHUNKS = 256
+DEFAULT_DENSITY = 0.16
+# 空白格占比超过约0.41时8邻接的空白区域会连成无限大的一片, 密度下限保证洪水填充总会结束
+MIN_DENSITY = 0.12
+
+NEIGHBOR_OFFSETS = tuple((dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy)
+
+
+def _zigzag(n: int) -> int:
+    """把整数映射为非负整数, 用作种子序列的熵"""
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+@lru_cache(maxsize=64)
+def chunk_mines(seed: int, density: float, cx: int, cy: int) -> np.ndarray:
+    """确定地生成区块的 (CHUNK_SIZE, CHUNK_SIZE) 布尔地雷掩码 (只读)"""
+    rng = np.random.default_rng([seed, _zigzag(cx), _zigzag(cy)])
+    mask = rng.random((CHUNK_SIZE, CHUNK_SIZE)) < density
+    # 原点及其周围8格不放雷
+    xs = np.abs(cx * CHUNK_SIZE + np.arange(CHUNK_SIZE)) <= 1
+    ys = np.abs(cy * CHUNK_SIZE + np.arange(CHUNK_SIZE)) <= 1
+    mask[np.ix_(ys, xs)] = False
+    mask.flags.writeable = False
+    return mask
+
+
+def chunk_counts(seed: int, density: float, cx: int, cy: int) -> np.ndarray:
+    """区块内每个格子周围的地雷数量, 边缘格子要用到相邻区块的地雷"""
+    size = CHUNK_SIZE
+    padded = np.empty((size + 2, size + 2), dtype=bool)
+    for j in (-1, 0, 1):
+        for i in (-1, 0, 1):
+            mines = chunk_mines(seed, density, cx + i, cy + j)
+            # 相邻区块只需要贴着本区块的一行或一列
+            rows = slice(size - 1, size) if j < 0 else slice(0, 1) if j > 0 else slice(0, size)
+            cols = slice(size - 1, size) if i < 0 else slice(0, 1) if i > 0 else slice(0, size)
+            top = 0 if j < 0 else size + 1 if j > 0 else 1
+            left = 0 if i < 0 else size + 1 if i > 0 else 1
+            block = mines[rows, cols]
+            padded[top:top + block.shape[0], left:left + block.shape[1]] = block
+    return count_neighbors(padded)[1:-1, 1:-1]
+
+'''区块'''
+class Chunk:
+    __slots__ = ('cx', 'cy', 'mines', 'counts', 'status', 'dirty')
+
+    def __init__(self, cx: int, cy: int, mines: bytes, counts: bytes, status: Optional[bytearray] = None):
+        self.cx = cx
+        self.cy = cy
+        # 地雷和计数可由种子重新生成, 换出时不保存
+        self.mines = mines
+        self.counts = counts
+        self.status = status if status is not None else bytearray(CHUNK_SIZE * CHUNK_SIZE)
+        # 自载入以来状态是否被修改, 换出时只写回修改过的区块
+        self.dirty = False
+
+'''区块存储'''
+class ChunkStore:
+    """
+    按LRU顺序保存已载入的区块, 超出上限时换出最久未用的区块
+    换出时只把修改过的状态压缩写入磁盘, 地雷和计数下次载入时重新生成
+    未指定目录时使用临时目录, close() 时删除
+    """
+
+    def __init__(self, seed: int, density: float, directory: Optional[str] = None,
+                 capacity: int = MAX_LOADED_CHUNKS):
+        if capacity < 1:
+            raise ValueError(f"区块数量上限无效: {capacity}")
+        self.seed = seed
+        self.density = density
+        self.capacity = capacity
+        self.directory = directory
+        self._temporary = directory is None
+        self._chunks: 'OrderedDict[Tuple[int, int], Chunk]' = OrderedDict()
+        # 磁盘上有存档的区块
+        self._stored = set()
+        if directory is not None and os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith('.bin'):
+                    cx, cy = name[:-4].split('_')
+                    self._stored.add((int(cx), int(cy)))
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def _path(self, cx: int, cy: int) -> str:
+        return os.path.join(self.directory, f'{cx}_{cy}.bin')
+
+    def get(self, cx: int, cy: int) -> Chunk:
+        """取出区块, 不在内存中时从磁盘载入或重新生成"""
+        key = (cx, cy)
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+        mines = chunk_mines(self.seed, self.density, cx, cy)
+        counts = chunk_counts(self.seed, self.density, cx, cy)
+        status = self.load_status(cx, cy) if key in self._stored else None
+        chunk = Chunk(cx, cy, mines.astype(np.uint8).tobytes(), counts.tobytes(), status)
+        self._chunks[key] = chunk
+        while len(self._chunks) > self.capacity:
+            self._evict(self._chunks.popitem(last=False)[1])
+        return chunk
+
+    def _evict(self, chunk: Chunk):
+        """换出区块, 修改过的状态写回磁盘"""
+        if chunk.dirty:
+            self.save_status(chunk.cx, chunk.cy, chunk.status)
+
+    def load_status(self, cx: int, cy: int) -> bytearray:
+        """读取磁盘上区块的状态"""
+        with open(self._path(cx, cy), 'rb') as f:
+            return bytearray(zlib.decompress(f.read()))
+
+    def save_status(self, cx: int, cy: int, status: bytearray):
+        """把区块的状态写入磁盘"""
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix='minesweeper-chunks-')
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(cx, cy), 'wb') as f:
+            f.write(zlib.compress(bytes(status)))
+        self._stored.add((cx, cy))
+
+    def loaded(self) -> List[Chunk]:
+        """当前在内存中的区块"""
+        return list(self._chunks.values())
+
+    def evicted(self) -> List[Tuple[int, int]]:
+        """已换出到磁盘、不在内存中的区块坐标"""
+        return [key for key in self._stored if key not in self._chunks]
+
+    def flush(self):
+        """把内存中修改过的区块全部写回磁盘"""
+        for chunk in self._chunks.values():
+            self._evict(chunk)
+            chunk.dirty = False
+
+    def close(self):
+        """释放内存中的区块, 删除临时目录"""
+        self._chunks.clear()
+        if self._temporary and self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+            self._stored.clear()
+
+'''无限棋盘类'''
+class InfiniteBoard:
+    def __init__(self, seed: Optional[int] = None, density: float = DEFAULT_DENSITY,
+                 directory: Optional[str] = None, capacity: int = MAX_LOADED_CHUNKS):
+        if not MIN_DENSITY <= density < 1:
+            raise ValueError(f"地雷密度无效: {density}")
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.density = density
+        self.game_state = GameState.NOT_STARTED
+        self.store = ChunkStore(self.seed, density, directory, capacity)
+        # 自上次 pop_changes 以来状态发生变化的格子坐标, 供渲染层局部重绘
+        self.changes: List[Tuple[int, int]] = []
+        self.opened_count = 0
+        self.flags_count = 0
+
+    def _locate(self, x: int, y: int) -> Tuple[Chunk, int]:
+        """坐标所在的区块及区块内下标"""
+        chunk = self.store.get(x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        return chunk, (y & CHUNK_MASK) * CHUNK_SIZE + (x & CHUNK_MASK)
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        """无限棋盘上任何坐标都有效"""
+        return True
+
+    def status_at(self, x: int, y: int) -> MineStatus:
+        """获取格子状态"""
+        chunk, i = self._locate(x, y)
+        return MineStatus(chunk.status[i])
+
+    def is_mine(self, x: int, y: int) -> bool:
+        """格子是否为地雷"""
+        chunk, i = self._locate(x, y)
+        return bool(chunk.mines[i])
+
+    def count_at(self, x: int, y: int) -> int:
+        """格子周围的地雷数量"""
+        chunk, i = self._locate(x, y)
+        return chunk.counts[i]
+
+    def start(self):
+        """首次操作时开始游戏"""
+        if self.game_state == GameState.NOT_STARTED:
+            self.game_state = GameState.PLAYING
+
+    @property
+    def is_playing(self) -> bool:
+        """是否正在游戏中"""
+        return self.game_state == GameState.PLAYING
+
+    @property
+    def is_finished(self) -> bool:
+        """游戏是否已结束 (无限棋盘只会因触雷结束)"""
+        return self.game_state == GameState.GAME_OVER
+
+    def open(self, x: int, y: int) -> List[Tuple[int, int]]:
+        """打开格子, 返回新打开的格子坐标; 触雷时游戏结束"""
+        self.start()
+        if self.game_state != GameState.PLAYING:
+            return []
+        chunk, i = self._locate(x, y)
+        if chunk.status[i] != HIDDEN:
+            return []
+        if chunk.mines[i]:
+            self._explode(x, y)
+            return [(x, y)]
+        opened = self._flood_fill(x, y)
+        self.changes.extend(opened)
+        self.opened_count += len(opened)
+        return opened
+
+    def _flood_fill(self, x: int, y: int) -> List[Tuple[int, int]]:
+        """从非雷格子开始打开, 遇到空白格继续展开周围格子"""
+        opened = []
+        stack = [(x, y)]
+        while stack:
+            x, y = stack.pop()
+            # 每次都重新定位, 正在修改的区块总是最近使用的, 不会在修改前被换出
+            chunk, i = self._locate(x, y)
+            if chunk.status[i] != HIDDEN:
+                continue
+            chunk.status[i] = OPENED
+            chunk.dirty = True
+            opened.append((x, y))
+            if not chunk.counts[i]:
+                stack.extend((x + dx, y + dy) for dx, dy in NEIGHBOR_OFFSETS)
+        return opened
+
+    def cycle_mark(self, x: int, y: int) -> MineStatus:
+        """右键标记: 隐藏 -> 旗子 -> 问号 -> 隐藏"""
+        self.start()
+        chunk, i = self._locate(x, y)
+        old = chunk.status[i]
+        if self.game_state == GameState.PLAYING and old in MARK_TRANSITIONS:
+            new = MARK_TRANSITIONS[old]
+            chunk.status[i] = new
+            chunk.dirty = True
+            self.flags_count += (new == FLAGGED) - (old == FLAGGED)
+            self.changes.append((x, y))
+        return MineStatus(chunk.status[i])
+
+    def flags_around(self, x: int, y: int) -> int:
+        """周围被标记为旗子的数量"""
+        return sum(1 for dx, dy in NEIGHBOR_OFFSETS if self.status_at(x + dx, y + dy) == MineStatus.FLAGGED)
+
+    def can_chord(self, x: int, y: int) -> bool:
+        """是否可以快速打开周围格子 (已打开的数字格且旗子数量相符)"""
+        chunk, i = self._locate(x, y)
+        count = chunk.counts[i]
+        return chunk.status[i] == OPENED and count > 0 and self.flags_around(x, y) == count
+
+    def chord(self, x: int, y: int) -> List[Tuple[int, int]]:
+        """快速打开周围未标记的格子, 返回新打开的格子坐标"""
+        if self.game_state != GameState.PLAYING or not self.can_chord(x, y):
+            return []
+        opened = []
+        for dx, dy in NEIGHBOR_OFFSETS:
+            nx, ny = x + dx, y + dy
+            chunk, i = self._locate(nx, ny)
+            if chunk.status[i] != HIDDEN:
+                continue
+            if chunk.mines[i]:
+                self.changes.extend(opened)
+                self.opened_count += len(opened)
+                self._explode(nx, ny)
+                opened.append((nx, ny))
+                return opened
+            opened.extend(self._flood_fill(nx, ny))
+        self.changes.extend(opened)
+        self.opened_count += len(opened)
+        return opened
+
+    def _explode(self, x: int, y: int):
+        """触雷: 显示内存中和已换出到磁盘的区块中的地雷和错误标记
+        从未修改过的区块没有旗子, 不写回也不影响旗子计数; 这些区块再次载入时仍是隐藏的"""
+        chunk, i = self._locate(x, y)
+        chunk.status[i] = MINE_EXPLODED
+        for loaded in self.store.loaded():
+            changed = self._reveal(loaded.mines, loaded.status)
+            loaded.dirty = True
+            left, top = loaded.cx * CHUNK_SIZE, loaded.cy * CHUNK_SIZE
+            for idx in changed.tolist():
+                self.changes.append((left + (idx & CHUNK_MASK), top + (idx >> CHUNK_SHIFT)))
+        for cx, cy in self.store.evicted():
+            # 不在画面中, 直接改写磁盘上的状态, 不载入内存也不记入 changes
+            status = self.store.load_status(cx, cy)
+            mines = chunk_mines(self.seed, self.density, cx, cy).astype(np.uint8).tobytes()
+            if self._reveal(mines, status).size:
+                self.store.save_status(cx, cy, status)
+        self.changes.append((x, y))
+        self.game_state = GameState.GAME_OVER
+
+    def _reveal(self, mines: bytes, status: bytearray) -> np.ndarray:
+        """显示区块中隐藏的地雷并标出插错的旗子, 更新计数, 返回变化的区块内下标"""
+        status = np.frombuffer(status, dtype=np.uint8)
+        mines = np.frombuffer(mines, dtype=bool)
+        revealed = mines & (status == HIDDEN)
+        wrong_flags = ~mines & (status == FLAGGED)
+        status[revealed] = OPENED
+        status[wrong_flags] = WRONG_FLAG
+        self.opened_count += int(np.count_nonzero(revealed))
+        self.flags_count -= int(np.count_nonzero(wrong_flags))
+        return np.flatnonzero(revealed | wrong_flags)
+
+    @property
+    def is_won(self) -> bool:
+        """无限棋盘不会获胜"""
+        return False
+
+    def pop_changes(self) -> List[Tuple[int, int]]:
+        """取出并清空自上次调用以来变化的格子"""
+        changes, self.changes = self.changes, []
+        return changes
+
+    @property
+    def loaded_chunks(self) -> int:
+        """内存中的区块数量"""
+        return len(self.store)
+
+    def close(self):
+        """释放区块存储"""
+        self.store.close()
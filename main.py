@@ -1,10 +1,21 @@
+import math
 import os
 import sys
 import time
-import random
 import pygame
-from enum import Enum
-from typing import List, Tuple
+from typing import List, Optional, Tuple
+
+from atlas import TileAtlas
+from board import Board
+from config import (BORDERSIZE, DEFAULT_DIFFICULTY, DIFFICULTY_SETTINGS, EVENT_DRIVEN, FIRST_CLICK, FONT_SIZE, FPS,
+                    GRIDSIZE, INFINITE, MAX_VIEW_SIZE, NO_GUESS, PROFILE, PROFILE_CSV, PROFILE_JSON,
+                    PROFILE_OVERLAY, REPLAY_ARCHIVE, STATS_DB, Difficulty, GameState, MineStatus)
+from infinite import InfiniteBoard
+from noguess import get_no_guess_board
+from profiler import Profiler
+from replay import BUTTON_LEFT, EVENT_DOWN, EVENT_UP, ReplayRecorder, buttons_to_mask
+from simulate import three_bv
+from stats import GameRecord, StatsWriter, default_path, default_player
 
 
 # 获取资源路径
@@ -37,31 +48,22 @@ IMAGE_PATHS = {
 
 '''字体路径'''
 FONT_PATH = resource_path('resources/font/font.TTF')
-FONT_SIZE = 40
-
-class GameState(Enum):
-    NOT_STARTED = -1
-    PLAYING = 0
-    GAME_OVER = 1
-    GAME_WON = 2
-
-class MineStatus(Enum):
-    HIDDEN = 0
-    OPENED = 1
-    FLAGGED = 2
-    QUESTIONED = 3
-    DOUBLE_CLICKED = 4
-    DOUBLE_CLICKED_AROUND = 5
-    MINE_EXPLODED = 6
-    WRONG_FLAG = 7
-
-'''游戏相关参数'''
-FPS = 60
-GRIDSIZE = 40
-NUM_MINES = 50
-GAME_MATRIX_SIZE = (30, 16)
-BORDERSIZE = 5
-SCREENSIZE = (GAME_MATRIX_SIZE[0] * GRIDSIZE + BORDERSIZE * 2, (GAME_MATRIX_SIZE[1] + 2) * GRIDSIZE + BORDERSIZE)
+
+'''游戏相关参数, 棋盘尺寸和地雷数按局设置 (见 config.DIFFICULTY_SETTINGS)'''
+def view_size(board_size: Optional[Tuple[int, int]]) -> Tuple[int, int]:
+    """棋盘在100%缩放下的显示区域尺寸 (像素), 不超过 MAX_VIEW_SIZE; 无限棋盘 (None) 占满最大尺寸"""
+    if board_size is None:
+        return MAX_VIEW_SIZE
+    return min(board_size[0] * GRIDSIZE, MAX_VIEW_SIZE[0]), min(board_size[1] * GRIDSIZE, MAX_VIEW_SIZE[1])
+
+# 窗口按最大的难度预设确定尺寸, 切换难度时无需重建窗口, 较小的棋盘水平居中显示
+_VIEW_SIZES = [view_size(None)] if INFINITE else [view_size(s['grid_size']) for s in DIFFICULTY_SETTINGS.values()]
+SCREENSIZE = (max(w for w, _ in _VIEW_SIZES) + BORDERSIZE * 2,
+              max(h for _, h in _VIEW_SIZES) + 2 * GRIDSIZE + BORDERSIZE)
+# 缩放级别, 每一级的格子贴图都在启动时预先缩放好
+ZOOM_LEVELS = (0.5, 0.75, 1.0, 1.5, 2.0)
+# 单帧逐个提交的最大脏矩形数量, 超过后合并为一个区域
+MAX_DIRTY_RECTS = 64
 
 '''颜色'''
 BACKGROUND_COLOR = (225, 225, 225)
@@ -69,397 +71,526 @@ RED = (200, 0, 0)
 GREEN = (0, 200, 0)
 BLUE = (0, 0, 200)
 
-'''雷类'''
-class Mine(pygame.sprite.Sprite):
-    def __init__(self, images, position, status_code=MineStatus.HIDDEN, **kwargs):
-        super().__init__()
-        self.images = images
-        self.image = self.images['blank']
-        self.rect = self.image.get_rect(topleft=position)
-        self.status_code = status_code
-        self.is_mine = False
-        self.num_mines_around = -1
-
-    def set_status(self, status: MineStatus):
-        """设置当前状态"""
-        self.status_code = status
-
-    def bury_mine(self):
-        """设置此格子为地雷"""
-        self.is_mine = True
-
-    def set_mines_around(self, count: int):
-        """设置周围地雷数量"""
-        self.num_mines_around = count
-
-    def update_image(self):
-        """更新地雷图像"""
-        image_map = {
-            MineStatus.HIDDEN: 'blank',
-            MineStatus.OPENED: 'mine' if self.is_mine else str(self.num_mines_around),
-            MineStatus.FLAGGED: 'flag',
-            MineStatus.QUESTIONED: 'ask',
-            MineStatus.DOUBLE_CLICKED: str(self.num_mines_around),
-            MineStatus.DOUBLE_CLICKED_AROUND: '0',
-            MineStatus.MINE_EXPLODED: 'blood',
-            MineStatus.WRONG_FLAG: 'error'
-        }
-        
-        image_key = image_map.get(self.status_code, 'blank')
-        self.image = self.images[image_key]
+'''格子状态对应的贴图'''
+STATUS_IMAGES = {
+    MineStatus.HIDDEN.value: 'blank',
+    MineStatus.FLAGGED.value: 'flag',
+    MineStatus.QUESTIONED.value: 'ask',
+    MineStatus.MINE_EXPLODED.value: 'blood',
+    MineStatus.WRONG_FLAG.value: 'error'
+}
 
-    @property
-    def opened(self) -> bool:
-        """是否已打开"""
-        return self.status_code == MineStatus.OPENED
+'''表情贴图'''
+FACE_IMAGES = ('face_fail', 'face_normal', 'face_success')
 
-    @property
-    def flagged(self) -> bool:
-        """是否被标记为旗子"""
-        return self.status_code == MineStatus.FLAGGED
+'''切换难度的按键'''
+DIFFICULTY_KEYS = {
+    pygame.K_1: Difficulty.EASY,
+    pygame.K_2: Difficulty.MEDIUM,
+    pygame.K_3: Difficulty.HARD
+}
 
 '''文字板类'''
 class TextBoard(pygame.sprite.Sprite):
-    def __init__(self, text, font, position, color, bg_color=(0, 0, 0, 128), **kwargs):
+    def __init__(self, text, font, position, color, bg_color=(0, 0, 0, 128), backdrop=BACKGROUND_COLOR, **kwargs):
         pygame.sprite.Sprite.__init__(self)
         self.text = text
         self.font = font
         self.position = position
         self.color = color
         self.bg_color = bg_color
+        # 文字板下方的底色, 合成时先铺上, 绘制时整块不透明地贴到屏幕
+        self.backdrop = backdrop
         self.text_render = None
         self.text_rect = None
+        # 预先合成好的背景框、阴影和文本, 只在文本变化时重新合成
+        self.surface = None
         self._render_text()
+        # 需要重绘的屏幕区域, 为None表示无需重绘
+        self.dirty_rect = self.bounds
     
     def _render_text(self):
-        """渲染文本"""
+        """渲染文本, 并把背景框、阴影和文本合成到一张表面上"""
         self.text_render = self.font.render(self.text, True, self.color)
         self.text_rect = self.text_render.get_rect()
         self.text_rect.topleft = self.position
+        bounds = self.bounds
+        surface = pygame.Surface(bounds.size).convert()
+        surface.fill(self.backdrop)
+
+        # 绘制背景框
+        bg_rect = self.text_rect.inflate(10, 5)
+        bg_surface = pygame.Surface(bg_rect.size, pygame.SRCALPHA)
+        pygame.draw.rect(bg_surface, self.bg_color, bg_surface.get_rect(), border_radius=5)
+        surface.blit(bg_surface, bg_rect.move(-bounds.left, -bounds.top))
+        
+        # 绘制阴影
+        shadow_render = self.font.render(self.text, True, (0, 0, 0, 128))
+        surface.blit(shadow_render, (self.position[0] + 2 - bounds.left, self.position[1] + 2 - bounds.top))
+        
+        # 绘制文本
+        surface.blit(self.text_render, (self.position[0] - bounds.left, self.position[1] - bounds.top))
+        self.surface = surface
     
     def draw(self, screen):
         """绘制文本"""
-        if self.text_render:
-            # 绘制背景框
-            bg_rect = self.text_rect.inflate(10, 5)
-            bg_surface = pygame.Surface(bg_rect.size, pygame.SRCALPHA)
-            pygame.draw.rect(bg_surface, self.bg_color, bg_surface.get_rect(), border_radius=5)
-            screen.blit(bg_surface, bg_rect)
-            
-            # 绘制阴影
-            shadow_render = self.font.render(self.text, True, (0, 0, 0, 128))
-            screen.blit(shadow_render, (self.position[0] + 2, self.position[1] + 2))
-            
-            # 绘制文本
-            screen.blit(self.text_render, self.position)
+        if self.surface:
+            screen.blit(self.surface, self.bounds)
+    
+    @property
+    def bounds(self) -> pygame.Rect:
+        """背景框和阴影覆盖的区域"""
+        return self.text_rect.inflate(10, 5).union(self.text_rect.move(2, 2))
     
     def update(self, text):
         """更新文本"""
         if self.text != text:
+            old_bounds = self.bounds
             self.text = text
             self._render_text()
+            self.dirty_rect = old_bounds.union(self.bounds)
 
 '''表情按钮类'''
 class EmojiButton(pygame.sprite.Sprite):
-    def __init__(self, images, position, status_code=0, **kwargs):
+    def __init__(self, images, position, status_code=0, backdrop=BACKGROUND_COLOR, **kwargs):
         pygame.sprite.Sprite.__init__(self)
         # 导入图片
         self.images = images
         self.image = self.images['face_normal']
         self.rect = self.image.get_rect()
         self.rect.left, self.rect.top = position
+        # 按钮下方的底色
+        self.backdrop = backdrop
+        # 每个状态预先合成好的按钮 (立体背景 + 表情)
+        self.surfaces = {code: self._compose(self.images[key]) for code, key in self.FACES.items()}
         # 表情按钮的当前状态
         self.status_code = status_code
+        self.image = self.images[self.FACES[status_code]]
+        # 需要重绘的屏幕区域, 为None表示无需重绘
+        self.dirty_rect = self.bounds
 
-    '''画到屏幕上'''
-    def draw(self, screen):
+    '''状态码对应的表情: 0正常, 1失败, 2成功'''
+    FACES = {
+        0: 'face_normal',
+        1: 'face_fail',
+        2: 'face_success'
+    }
+
+    '''把立体背景和表情合成到一张表面上'''
+    def _compose(self, image) -> pygame.Surface:
+        bounds = self.bounds
+        surface = pygame.Surface(bounds.size).convert()
+        surface.fill(self.backdrop)
         # 绘制立体背景
-        bg_rect = self.rect.inflate(8, 8)
+        bg_rect = self.rect.inflate(8, 8).move(-bounds.left, -bounds.top)
         
         # 绘制阴影
         shadow_rect = bg_rect.inflate(4, 4)
         shadow_rect.center = (bg_rect.center[0] + 2, bg_rect.center[1] + 2)
-        pygame.draw.rect(screen, (80, 80, 80), shadow_rect, border_radius=8)
+        pygame.draw.rect(surface, (80, 80, 80), shadow_rect, border_radius=8)
         
         # 绘制背景
-        pygame.draw.rect(screen, (200, 200, 200), bg_rect, border_radius=8)
+        pygame.draw.rect(surface, (200, 200, 200), bg_rect, border_radius=8)
         
         # 绘制高光边框
-        pygame.draw.rect(screen, (255, 255, 255), bg_rect, 2, border_radius=8)
+        pygame.draw.rect(surface, (255, 255, 255), bg_rect, 2, border_radius=8)
         
-        # 状态码为0, 代表正常的表情
-        if self.status_code == 0:
-            self.image = self.images['face_normal']
-        # 状态码为1, 代表失败的表情
-        elif self.status_code == 1:
-            self.image = self.images['face_fail']
-        # 状态码为2, 代表成功的表情
-        elif self.status_code == 2:
-            self.image = self.images['face_success']
-        # 绑定图片到屏幕
-        screen.blit(self.image, self.rect)
+        # 绑定表情
+        surface.blit(image, self.rect.move(-bounds.left, -bounds.top))
+        return surface
+
+    '''画到屏幕上'''
+    def draw(self, screen):
+        screen.blit(self.surfaces[self.status_code], self.bounds)
+
+    '''背景和阴影覆盖的区域'''
+    @property
+    def bounds(self) -> pygame.Rect:
+        bg_rect = self.rect.inflate(8, 8)
+        return bg_rect.inflate(4, 4).move(2, 2).union(bg_rect)
 
     '''设置当前的按钮的状态'''
     def setstatus(self, status_code):
-        self.status_code = status_code
+        if self.status_code != status_code:
+            self.status_code = status_code
+            self.image = self.images[self.FACES[status_code]]
+            self.dirty_rect = self.bounds
+
+'''视口类'''
+class Viewport:
+    def __init__(self, rect: pygame.Rect, board_size: Optional[Tuple[int, int]] = None):
+        # 雷区在屏幕上的显示区域
+        self.rect = rect
+        # 棋盘尺寸 (格), 为None表示无限棋盘
+        self.board_size = board_size
+        self.zoom_index = ZOOM_LEVELS.index(1.0)
+        # 显示区域左上角在棋盘像素坐标 (当前缩放级别) 中的位置
+        self.left = 0
+        self.top = 0
+
+    @property
+    def cell_size(self) -> int:
+        """当前缩放级别下的格子边长"""
+        return round(GRIDSIZE * ZOOM_LEVELS[self.zoom_index])
+
+    def _clamp(self):
+        """有限棋盘不能移出边界, 比显示区域小时靠左上角"""
+        if self.board_size is None:
+            return
+        size = self.cell_size
+        self.left = max(0, min(self.left, self.board_size[0] * size - self.rect.width))
+        self.top = max(0, min(self.top, self.board_size[1] * size - self.rect.height))
+
+    def visible_range(self) -> Tuple[int, int, int, int]:
+        """显示区域内的格子范围 (x0, y0, x1, y1), 右下为开区间"""
+        size = self.cell_size
+        x0, y0 = self.left // size, self.top // size
+        x1 = -(-(self.left + self.rect.width) // size)
+        y1 = -(-(self.top + self.rect.height) // size)
+        if self.board_size is not None:
+            x1 = min(x1, self.board_size[0])
+            y1 = min(y1, self.board_size[1])
+        return x0, y0, x1, y1
+
+    def cell_rect(self, x: int, y: int) -> pygame.Rect:
+        """格子在屏幕上的矩形区域 (可能超出显示区域)"""
+        size = self.cell_size
+        return pygame.Rect(self.rect.left + x * size - self.left, self.rect.top + y * size - self.top, size, size)
+
+    def cell_at(self, pos) -> Optional[Tuple[int, int]]:
+        """屏幕坐标处的格子坐标, 不在雷区内时返回None"""
+        if not self.rect.collidepoint(pos):
+            return None
+        size = self.cell_size
+        x = (pos[0] - self.rect.left + self.left) // size
+        y = (pos[1] - self.rect.top + self.top) // size
+        if self.board_size is not None and not (x < self.board_size[0] and y < self.board_size[1]):
+            return None
+        return x, y
+
+    def pan(self, dx: int, dy: int) -> bool:
+        """平移显示区域 (像素), 返回是否移动"""
+        old = (self.left, self.top)
+        self.left += dx
+        self.top += dy
+        self._clamp()
+        return (self.left, self.top) != old
+
+    def zoom_at(self, step: int, pos) -> bool:
+        """按级别缩放, 保持鼠标所指的位置不动, 返回是否缩放"""
+        zoom_index = max(0, min(self.zoom_index + step, len(ZOOM_LEVELS) - 1))
+        if zoom_index == self.zoom_index:
+            return False
+        if not self.rect.collidepoint(pos):
+            pos = self.rect.center
+        old_size = self.cell_size
+        anchor_x, anchor_y = pos[0] - self.rect.left, pos[1] - self.rect.top
+        self.zoom_index = zoom_index
+        size = self.cell_size
+        self.left = (self.left + anchor_x) * size // old_size - anchor_x
+        self.top = (self.top + anchor_y) * size // old_size - anchor_y
+        self._clamp()
+        return True
+
+    def center_on(self, x: int, y: int):
+        """把格子移到显示区域中央"""
+        size = self.cell_size
+        self.left = x * size + size // 2 - self.rect.width // 2
+        self.top = y * size + size // 2 - self.rect.height // 2
+        self._clamp()
+
+    def ensure_visible(self, x: int, y: int) -> bool:
+        """格子不完全可见时移到中央, 返回是否移动"""
+        if self.rect.contains(self.cell_rect(x, y)):
+            return False
+        self.center_on(x, y)
+        return True
 
 '''扫雷地图类'''
 class MinesweeperMap():
-    def __init__(self, images, **kwargs):
+    def __init__(self, images, board=None, viewport: Optional[Viewport] = None,
+                 profiler: Optional[Profiler] = None, **kwargs):
+        # 格子贴图图集, 每个缩放级别一行
         self.images = images
-        self.mines_matrix = []
-        self.mines_group = pygame.sprite.Group()
-        self.game_state = GameState.NOT_STARTED
-        self.mouse_pos = None
+        self.profiler = profiler or Profiler()
+        if board is None:
+            settings = DIFFICULTY_SETTINGS[kwargs.get('difficulty', DEFAULT_DIFFICULTY)]
+            board = Board(*settings['grid_size'], settings['num_mines'],
+                          seed=kwargs.get('seed'), first_click=FIRST_CLICK)
+        self.board = board
+        self.infinite = isinstance(self.board, InfiniteBoard)
+        if viewport is None:
+            # 显示区域由本局棋盘的尺寸决定, 在窗口中水平居中
+            board_size = None if self.infinite else (self.board.width, self.board.height)
+            size = view_size(board_size)
+            viewport = Viewport(pygame.Rect(((SCREENSIZE[0] - size[0]) // 2, 2 * GRIDSIZE), size), board_size)
+            if self.infinite:
+                viewport.center_on(0, 0)
+        self.viewport = viewport
+        # 左右键同时按下时呈按下状态的周围格子
+        self.pressed_cells = set()
+        # 需要重绘的格子坐标 (按下效果等渲染层的变化)
+        self.dirty_cells = set()
+        self.full_redraw = True
+        # 最近一次按下时鼠标所在的格子
+        self.mouse_cell = None
         self.mouse_pressed = None
-        
-        self._init_matrix()
-        self._place_mines()
-        self._calculate_mines_around()
-    
-    def _init_matrix(self):
-        """初始化游戏矩阵"""
-        for j in range(GAME_MATRIX_SIZE[1]):
-            mines_line = []
-            for i in range(GAME_MATRIX_SIZE[0]):
-                position = i * GRIDSIZE + BORDERSIZE, (j + 2) * GRIDSIZE
-                mine = Mine(images=self.images, position=position)
-                mines_line.append(mine)
-                self.mines_group.add(mine)
-            self.mines_matrix.append(mines_line)
-    
-    def _place_mines(self):
-        """随机放置地雷"""
-        total_cells = GAME_MATRIX_SIZE[0] * GAME_MATRIX_SIZE[1]
-        mine_positions = random.sample(range(total_cells), NUM_MINES)
-        for pos in mine_positions:
-            y, x = divmod(pos, GAME_MATRIX_SIZE[0])
-            self.mines_matrix[y][x].bury_mine()
-    
-    def _calculate_mines_around(self):
-        """计算每个格子周围的地雷数量"""
-        for y in range(GAME_MATRIX_SIZE[1]):
-            for x in range(GAME_MATRIX_SIZE[0]):
-                mine = self.mines_matrix[y][x]
-                if not mine.is_mine:
-                    count = sum(1 for j, i in self._get_around_coords(y, x) 
-                               if self.mines_matrix[j][i].is_mine)
-                    mine.set_mines_around(count)
 
-    def draw(self, screen):
-        """绘制游戏地图"""
-        # 更新所有地雷的图像
-        for row in self.mines_matrix:
-            for mine in row:
-                mine.update_image()
-        # 使用Group绘制所有地雷
-        self.mines_group.draw(screen)
+    def _image_key(self, x: int, y: int) -> str:
+        """根据格子状态选择贴图"""
+        if (x, y) in self.pressed_cells:
+            return '0'
+        board = self.board
+        status = board.status_at(x, y)
+        if status == MineStatus.OPENED:
+            return 'mine' if board.is_mine(x, y) else str(board.count_at(x, y))
+        return STATUS_IMAGES.get(status.value, 'blank')
+
+    @property
+    def rect(self) -> pygame.Rect:
+        """雷区在屏幕上的显示区域"""
+        return self.viewport.rect
+
+    def draw(self, screen) -> List[pygame.Rect]:
+        """只重绘显示区域内状态变化过的格子, 返回需要刷新到屏幕的区域"""
+        changes = self.board.pop_changes()
+        self.dirty_cells.update(changes if self.infinite else map(self.board.coords, changes))
+        viewport = self.viewport
+        x0, y0, x1, y1 = viewport.visible_range()
+        if self.full_redraw:
+            # 只遍历显示区域内的格子, 开销与棋盘大小无关
+            cells = [(x, y) for y in range(y0, y1) for x in range(x0, x1)]
+            screen.fill(BACKGROUND_COLOR, viewport.rect)
+        elif self.dirty_cells:
+            cells = [(x, y) for x, y in self.dirty_cells if x0 <= x < x1 and y0 <= y < y1]
+        else:
+            return []
+        atlas = self.images.surface
+        areas = self.images.rects[viewport.zoom_index]
+        image_key = self._image_key
+        cell_rect = viewport.cell_rect
+        blits = [(atlas, cell_rect(x, y), areas[image_key(x, y)]) for x, y in cells]
+        # 边缘的格子只画出显示区域内的部分, 一次批量提交
+        clip = screen.get_clip()
+        screen.set_clip(viewport.rect)
+        screen.blits(blits, doreturn=False)
+        screen.set_clip(clip)
+        rects = [dest.clip(viewport.rect) for _, dest, _ in blits]
+        self.profiler.record('cells', len(blits))
+        self.dirty_cells = set()
+        # 变化的格子太多时合并为一个区域, 避免逐个提交
+        if self.full_redraw:
+            rects = [viewport.rect]
+        elif len(rects) > MAX_DIRTY_RECTS:
+            rects = [rects[0].unionall(rects)]
+        self.full_redraw = False
+        return rects
+
+    def invalidate_rect(self, rect: pygame.Rect):
+        """把与屏幕区域相交的格子标记为需要重绘"""
+        viewport = self.viewport
+        area = rect.clip(viewport.rect)
+        if not area:
+            return
+        size = viewport.cell_size
+        x0 = (area.left - viewport.rect.left + viewport.left) // size
+        y0 = (area.top - viewport.rect.top + viewport.top) // size
+        x1 = (area.right - 1 - viewport.rect.left + viewport.left) // size + 1
+        y1 = (area.bottom - 1 - viewport.rect.top + viewport.top) // size + 1
+        self.dirty_cells.update((x, y) for y in range(y0, y1) for x in range(x0, x1))
+
+    def pan(self, dx: int, dy: int):
+        """平移视口 (像素)"""
+        if self.viewport.pan(dx, dy):
+            self.full_redraw = True
+
+    def zoom(self, step: int, pos):
+        """以屏幕坐标 pos 为中心缩放视口"""
+        if self.viewport.zoom_at(step, pos):
+            self.full_redraw = True
+
+    @property
+    def game_state(self) -> GameState:
+        """当前游戏状态"""
+        return self.board.game_state
 
     def set_game_state(self, state: GameState):
         """设置游戏状态"""
-        self.game_state = state
+        self.board.game_state = state
 
     def update(self, mouse_pressed=None, mouse_pos=None, type_='down'):
         """根据鼠标操作更新游戏状态"""
         assert type_ in ['down', 'up']
         
         if type_ == 'down' and mouse_pos is not None and mouse_pressed is not None:
-            self.mouse_pos = mouse_pos
+            self.mouse_cell = self.viewport.cell_at(mouse_pos)
             self.mouse_pressed = mouse_pressed
+        
+        # 任意按键释放后, 按下效果都要恢复
+        if type_ == 'up':
+            self._release_pressed_cells()
             
-        if not self._is_click_in_bounds():
+        if self.mouse_cell is None:
             return
             
-        if self.game_state == GameState.NOT_STARTED:
-            self.game_state = GameState.PLAYING
+        self.board.start()
             
         if self.game_state != GameState.PLAYING:
             return
             
-        x, y = self._get_grid_coords()
-        mine = self.mines_matrix[y][x]
+        x, y = self.mouse_cell
         
         if type_ == 'down':
-            self._handle_mouse_down(x, y, mine)
+            self._handle_mouse_down(x, y)
         else:
-            self._handle_mouse_up(x, y, mine)
+            self._handle_mouse_up(x, y)
     
-    def _is_click_in_bounds(self) -> bool:
-        """检查点击是否在有效范围内"""
-        return (BORDERSIZE <= self.mouse_pos[0] <= SCREENSIZE[0] - BORDERSIZE and
-                GRIDSIZE * 2 <= self.mouse_pos[1] <= SCREENSIZE[1] - BORDERSIZE)
-    
-    def _get_grid_coords(self) -> Tuple[int, int]:
-        """获取网格坐标"""
-        x = (self.mouse_pos[0] - BORDERSIZE) // GRIDSIZE
-        y = self.mouse_pos[1] // GRIDSIZE - 2
-        return x, y
+    def cell_at(self, pos) -> Optional[int]:
+        """屏幕坐标处的格子下标, 不在雷区内 (或为无限棋盘) 时返回None"""
+        cell = self.viewport.cell_at(pos)
+        if cell is None or self.infinite:
+            return None
+        return self.board.index(*cell)
+
+    def cell_center(self, idx: int) -> Tuple[int, int]:
+        """格子中心的屏幕坐标, 必要时平移视口使格子可见; 下标无效时返回雷区外的坐标"""
+        if not 0 <= idx < self.board.size:
+            return (-1, -1)
+        x, y = self.board.coords(idx)
+        if self.viewport.ensure_visible(x, y):
+            self.full_redraw = True
+        return self.viewport.cell_rect(x, y).center
     
-    def _handle_mouse_down(self, x: int, y: int, mine: Mine):
+    def _handle_mouse_down(self, x: int, y: int):
         """处理鼠标按下事件"""
         left, _, right = self.mouse_pressed
         
-        if left and right and mine.opened and mine.num_mines_around > 0:
-            mine.set_status(MineStatus.DOUBLE_CLICKED)
+        if left and right and self.board.status_at(x, y) == MineStatus.OPENED and self.board.count_at(x, y) > 0:
             self._handle_double_click_around(x, y)
     
-    def _handle_mouse_up(self, x: int, y: int, mine: Mine):
+    def _handle_mouse_up(self, x: int, y: int):
         """处理鼠标释放事件"""
         left, _, right = self.mouse_pressed
         
         if left and not right:
-            self._handle_left_click(x, y, mine)
+            self._handle_left_click(x, y)
         elif right and not left:
-            self._handle_right_click(mine)
-        elif left and right:
-            self._handle_double_click_release(x, y)
+            self._handle_right_click(x, y)
     
-    def _handle_left_click(self, x: int, y: int, mine: Mine):
+    def _handle_left_click(self, x: int, y: int):
         """处理左键点击"""
-        if mine.status_code not in [MineStatus.FLAGGED, MineStatus.QUESTIONED]:
-            if self._open_mine(x, y):
-                self.set_game_state(GameState.GAME_OVER)
+        opened = self.board.open(x, y)
+        self.profiler.record('flood', len(opened))
     
-    def _handle_right_click(self, mine: Mine):
+    def _handle_right_click(self, x: int, y: int):
         """处理右键点击"""
-        status_transitions = {
-            MineStatus.HIDDEN: MineStatus.FLAGGED,
-            MineStatus.FLAGGED: MineStatus.QUESTIONED,
-            MineStatus.QUESTIONED: MineStatus.HIDDEN
-        }
-        mine.set_status(status_transitions.get(mine.status_code, MineStatus.HIDDEN))
+        self.board.cycle_mark(x, y)
     
     def _handle_double_click_around(self, x: int, y: int):
         """处理双击周围格子"""
-        mine = self.mines_matrix[y][x]
-        around_coords = self._get_around_coords(y, x)
-        
-        flags_count = sum(1 for j, i in around_coords 
-                       if self.mines_matrix[j][i].status_code == MineStatus.FLAGGED)
-        
-        if flags_count == mine.num_mines_around:
-            for j, i in around_coords:
-                if self.mines_matrix[j][i].status_code == MineStatus.HIDDEN:
-                    self._open_mine(i, j)
+        if self.board.can_chord(x, y):
+            opened = self.board.chord(x, y)
+            self.profiler.record('chord', len(opened))
         else:
-            for j, i in around_coords:
-                if self.mines_matrix[j][i].status_code == MineStatus.HIDDEN:
-                    self.mines_matrix[j][i].set_status(MineStatus.DOUBLE_CLICKED_AROUND)
-    
-    def _handle_double_click_release(self, x: int, y: int):
-        """处理双击释放"""
-        self.mines_matrix[y][x].set_status(MineStatus.OPENED)
-        around_coords = self._get_around_coords(y, x)
-        
-        for j, i in around_coords:
-            if self.mines_matrix[j][i].status_code == MineStatus.DOUBLE_CLICKED_AROUND:
-                self.mines_matrix[j][i].set_status(MineStatus.HIDDEN)
-
-    def _open_mine(self, x: int, y: int) -> bool:
-        """打开指定位置的格子，返回是否触雷"""
-        mine = self.mines_matrix[y][x]
-        
-        if mine.is_mine:
-            self._reveal_all_mines()
-            mine.set_status(MineStatus.MINE_EXPLODED)
-            return True
-            
-        if mine.status_code != MineStatus.HIDDEN:
-            return False
-            
-        self._flood_fill(x, y)
-        return False
+            board = self.board
+            self._release_pressed_cells()
+            self.pressed_cells = {(x + dx, y + dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+                                  if (dx or dy) and board.in_bounds(x + dx, y + dy)
+                                  and board.status_at(x + dx, y + dy) == MineStatus.HIDDEN}
+            self.dirty_cells.update(self.pressed_cells)
     
-    def _flood_fill(self, x: int, y: int):
-        """使用洪水填充算法打开空白区域"""
-        if x < 0 or x >= GAME_MATRIX_SIZE[0] or y < 0 or y >= GAME_MATRIX_SIZE[1]:
-            return
-            
-        mine = self.mines_matrix[y][x]
-        if mine.status_code != MineStatus.HIDDEN or mine.is_mine:
-            return
-            
-        mine.set_status(MineStatus.OPENED)
-        
-        if mine.num_mines_around == 0:
-            for j, i in self._get_around_coords(y, x):
-                self._flood_fill(i, j)
-    
-    def _reveal_all_mines(self):
-        """显示所有地雷和错误标记"""
-        for row in self.mines_matrix:
-            for mine in row:
-                if mine.is_mine and mine.status_code == MineStatus.HIDDEN:
-                    mine.set_status(MineStatus.OPENED)
-                elif not mine.is_mine and mine.status_code == MineStatus.FLAGGED:
-                    mine.set_status(MineStatus.WRONG_FLAG)
-    
-    def _get_around_coords(self, row: int, col: int) -> List[Tuple[int, int]]:
-        """获取周围8个格子的坐标"""
-        coords = []
-        for j in range(max(0, row-1), min(row+1, GAME_MATRIX_SIZE[1]-1)+1):
-            for i in range(max(0, col-1), min(col+1, GAME_MATRIX_SIZE[0]-1)+1):
-                if j == row and i == col:
-                    continue
-                coords.append((j, i))
-        return coords
+    def _release_pressed_cells(self):
+        """恢复按下效果"""
+        self.dirty_cells.update(self.pressed_cells)
+        self.pressed_cells = set()
     
     @property
     def is_playing(self) -> bool:
         """是否正在游戏中"""
-        return self.game_state == GameState.PLAYING
+        return self.board.is_playing
     
     @property
     def flags_count(self) -> int:
         """被标记为旗子的数量"""
-        return sum(1 for row in self.mines_matrix 
-                  for mine in row if mine.flagged)
+        return self.board.flags_count
     
     @property
     def opened_count(self) -> int:
         """已打开的格子数量"""
-        return sum(1 for row in self.mines_matrix 
-                  for mine in row if mine.opened)
+        return self.board.opened_count
     
     @property
     def is_won(self) -> bool:
         """是否获胜"""
-        total_cells = GAME_MATRIX_SIZE[0] * GAME_MATRIX_SIZE[1]
-        return self.opened_count + self.flags_count == total_cells and self.flags_count == NUM_MINES
+        return self.board.is_won
 
 class GameManager:
     def __init__(self):
         pygame.init()
         self.screen = pygame.display.set_mode(SCREENSIZE)
-        pygame.display.set_caption('扫雷')
         self.clock = pygame.time.Clock()
-        self.images = self._load_images()
+        self.images, self.tiles = self._load_images()
+        self.profiler = Profiler(PROFILE)
+        # 剖析叠加层, F3 切换显示
+        self.show_overlay = PROFILE and PROFILE_OVERLAY
+        self.overlay_rect = None
+        self.overlay_font = pygame.font.Font(None, 20)
+        self.minesweeper_map = None
+        # 当前难度, 游戏中按 1/2/3 切换
+        self.difficulty = DEFAULT_DIFFICULTY
+        # 按住中键拖动平移视口
+        self.dragging = False
+        # 战绩由后台线程成批写入数据库
+        self.stats = StatsWriter(default_path()) if STATS_DB else None
+        self.player = default_player()
         self.font = pygame.font.Font(FONT_PATH, FONT_SIZE)
         self.reset_game()
     
-    def _load_images(self) -> dict:
-        """加载所有图片资源"""
-        images = {}
-        for key, value in IMAGE_PATHS.items():
-            try:
-                if key in ['face_fail', 'face_normal', 'face_success']:
-                    image = pygame.image.load(value).convert_alpha()
-                    images[key] = pygame.transform.smoothscale(
-                        image, (int(GRIDSIZE*1.25), int(GRIDSIZE*1.25)))
-                else:
-                    image = pygame.image.load(value).convert()
-                    images[key] = pygame.transform.smoothscale(image, (GRIDSIZE, GRIDSIZE))
-            except pygame.error as e:
-                print(f"无法加载图片 {key}: {value}")
-                print(f"错误信息: {e}")
-                sys.exit(1)
-        return images
+    @staticmethod
+    def _load_images() -> Tuple[dict, TileAtlas]:
+        """加载图片资源, 返回表情贴图和按缩放级别分行打包的格子贴图图集; 不依赖实例, 也供离屏渲染使用"""
+        face_paths = {key: value for key, value in IMAGE_PATHS.items() if key in FACE_IMAGES}
+        tile_paths = {key: value for key, value in IMAGE_PATHS.items() if key not in FACE_IMAGES}
+        try:
+            faces = TileAtlas.load('faces', face_paths, [int(GRIDSIZE*1.25)], alpha=True)
+            tiles = TileAtlas.load('tiles', tile_paths, [round(GRIDSIZE * zoom) for zoom in ZOOM_LEVELS])
+        except (pygame.error, OSError) as e:
+            print(f"无法加载图片: {e}")
+            sys.exit(1)
+        return faces.subsurfaces(), tiles
     
     def reset_game(self):
         """重置游戏"""
-        self.minesweeper_map = MinesweeperMap(self.images)
+        if self.minesweeper_map is not None and self.minesweeper_map.infinite:
+            self.minesweeper_map.board.close()
+        settings = DIFFICULTY_SETTINGS[self.difficulty]
+        width, height = settings['grid_size']
+        no_guess = None
+        if INFINITE:
+            board = InfiniteBoard()
+        elif NO_GUESS:
+            # 无猜模式: 从磁盘缓存取一个起点已打开的棋盘
+            try:
+                no_guess = get_no_guess_board(width, height, settings['num_mines'])
+                board = no_guess.to_board()
+            except RuntimeError as e:
+                print(f"无法生成无猜棋盘, 改用普通棋盘: {e}")
+                board = Board(width, height, settings['num_mines'], first_click=FIRST_CLICK)
+        else:
+            board = Board(width, height, settings['num_mines'], first_click=FIRST_CLICK)
+        pygame.display.set_caption('扫雷' if INFINITE else f"扫雷 - {settings['name']}")
+        self.minesweeper_map = MinesweeperMap(self.tiles, board=board, profiler=self.profiler)
+        # 无限棋盘不录像
+        self.recorder = ReplayRecorder(self.minesweeper_map.board) if REPLAY_ARCHIVE and not INFINITE else None
+        self.replay_saved = False
+        self.result_recorded = False
+        if no_guess is not None and self.recorder:
+            # 起点是自动打开的, 录成一次左键点击以便回放
+            self.recorder.record(EVENT_DOWN, BUTTON_LEFT, no_guess.first_click)
+            self.recorder.record(EVENT_UP, 0, None)
         self.start_time = None
         self._create_ui_elements()
+        self.full_redraw = True
     
     def _create_ui_elements(self):
         """创建UI元素"""
@@ -469,9 +600,10 @@ class GameManager:
         self.emoji_button = EmojiButton(self.images, position=emoji_pos)
         
         # 剩余地雷计数器
-        text_size = self.font.size(str(NUM_MINES))
+        num_mines = 0 if self.minesweeper_map.infinite else self.minesweeper_map.board.num_mines
+        text_size = self.font.size(str(num_mines))
         self.remaining_mines_text = TextBoard(
-            str(NUM_MINES).zfill(3), self.font, 
+            str(num_mines).zfill(3), self.font, 
             (30, (GRIDSIZE*2-text_size[1])//2-2), RED, bg_color=(0, 0, 0, 180))
         
         # 计时器
@@ -480,17 +612,48 @@ class GameManager:
             '000', self.font, 
             (SCREENSIZE[0]-30-time_size[0], (GRIDSIZE*2-time_size[1])//2-2), RED, bg_color=(0, 0, 0, 180))
     
-    def handle_events(self):
-        """处理游戏事件"""
-        for event in pygame.event.get():
+    def _poll_events(self, timeout: Optional[int] = None) -> list:
+        """取出待处理事件; timeout 不为None且没有事件时, 先阻塞等待至多 timeout 毫秒 (0表示一直等待)"""
+        events = pygame.event.get()
+        if not events and timeout is not None:
+            event = pygame.event.wait(timeout)
+            if event.type != pygame.NOEVENT:
+                events = [event] + pygame.event.get()
+        return events
+    
+    def handle_events(self, events: Optional[list] = None):
+        """处理游戏事件, 未给出事件时取出所有待处理事件"""
+        for event in pygame.event.get() if events is None else events:
             if event.type == pygame.QUIT:
                 return False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                # 窗口被遮挡后重新露出时整屏重绘
+                self.full_redraw = True
+            elif event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP) and event.button > 3:
+                # 滚轮产生的按键事件由 MOUSEWHEEL 处理
+                continue
+            elif event.type == pygame.MOUSEWHEEL:
+                self.minesweeper_map.zoom(event.y, pygame.mouse.get_pos())
+            elif event.type == pygame.MOUSEMOTION:
+                if self.dragging:
+                    self.minesweeper_map.pan(-event.rel[0], -event.rel[1])
+            elif event.type == pygame.KEYDOWN:
+                self._handle_key(event.key)
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = event.pos
+                if event.button == 2:
+                    self.dragging = True
                 mouse_pressed = pygame.mouse.get_pressed()
+                if self.recorder:
+                    self.recorder.record(EVENT_DOWN, buttons_to_mask(mouse_pressed),
+                                         self.minesweeper_map.cell_at(mouse_pos))
                 self.minesweeper_map.update(
                     mouse_pressed=mouse_pressed, mouse_pos=mouse_pos, type_='down')
             elif event.type == pygame.MOUSEBUTTONUP:
+                if event.button == 2:
+                    self.dragging = False
+                if self.recorder:
+                    self.recorder.record(EVENT_UP, 0, None)
                 self.minesweeper_map.update(type_='up')
                 # 只在游戏结束或胜利时检查表情按钮点击
                 if (self.minesweeper_map.game_state in [GameState.GAME_OVER, GameState.GAME_WON] and 
@@ -498,6 +661,31 @@ class GameManager:
                     self.reset_game()
         return True
     
+    def _handle_key(self, key):
+        """方向键平移视口, +/- 缩放, 1/2/3 切换难度"""
+        cell_size = self.minesweeper_map.viewport.cell_size
+        moves = {
+            pygame.K_LEFT: (-cell_size, 0),
+            pygame.K_RIGHT: (cell_size, 0),
+            pygame.K_UP: (0, -cell_size),
+            pygame.K_DOWN: (0, cell_size)
+        }
+        if key in moves:
+            self.minesweeper_map.pan(*moves[key])
+        elif key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+            self.minesweeper_map.zoom(1, self.minesweeper_map.rect.center)
+        elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+            self.minesweeper_map.zoom(-1, self.minesweeper_map.rect.center)
+        elif key == pygame.K_F3 and self.profiler.enabled:
+            self.show_overlay = not self.show_overlay
+        elif key in DIFFICULTY_KEYS and not INFINITE:
+            self.set_difficulty(DIFFICULTY_KEYS[key])
+    
+    def set_difficulty(self, difficulty: Difficulty):
+        """切换难度并开始新的一局, 窗口保持不变"""
+        self.difficulty = difficulty
+        self.reset_game()
+    
     def update(self):
         """更新游戏状态"""
         # 更新计时器和剩余地雷数
@@ -508,8 +696,32 @@ class GameManager:
         if self.minesweeper_map.game_state == GameState.GAME_OVER:
             self.emoji_button.setstatus(status_code=1)
         elif self.minesweeper_map.is_won:
-            self.minesweeper_map.game_state = GameState.GAME_WON
             self.emoji_button.setstatus(status_code=2)
+        if self.minesweeper_map.board.is_finished:
+            self._save_replay()
+            self._record_result()
+    
+    def _save_replay(self):
+        """对局结束时把录像追加到归档文件, 每局只保存一次"""
+        if self.recorder is None or self.replay_saved:
+            return
+        self.replay_saved = True
+        try:
+            self.recorder.save(os.path.join(os.path.dirname(os.path.abspath(__file__)), REPLAY_ARCHIVE))
+        except OSError as e:
+            print(f"无法保存录像: {e}")
+    
+    def _record_result(self):
+        """对局结束时把胜负和用时交给后台线程写入战绩, 每局只记录一次"""
+        if self.stats is None or self.result_recorded or self.minesweeper_map.infinite:
+            return
+        self.result_recorded = True
+        board = self.minesweeper_map.board
+        finished_at = time.time()
+        # 第一次点击就结束的对局没有开始计时, 不记录用时
+        duration = finished_at - self.start_time if self.start_time is not None else None
+        self.stats.record(GameRecord(self.player, self.difficulty.value, board.width, board.height, board.num_mines,
+                                     board.is_won, duration, three_bv(board), board.opened_count, finished_at))
     
     def _update_timer(self):
         """更新计时器"""
@@ -523,29 +735,114 @@ class GameManager:
     
     def _update_mine_counter(self):
         """更新剩余地雷数"""
-        remaining = max(NUM_MINES - self.minesweeper_map.flags_count, 0)
+        if self.minesweeper_map.infinite:
+            # 无限棋盘没有地雷总数, 显示已插的旗子数
+            remaining = min(self.minesweeper_map.flags_count, 999)
+        else:
+            remaining = max(self.minesweeper_map.board.num_mines - self.minesweeper_map.flags_count, 0)
         # 只在剩余地雷数变化时更新文本
         if self.remaining_mines_text.text != str(remaining).zfill(3):
             self.remaining_mines_text.update(str(remaining).zfill(3))
     
+    def _wait_timeout(self) -> int:
+        """距计时器下一次跳秒的毫秒数, 不在计时时返回0 (一直等待输入)"""
+        if not self.minesweeper_map.is_playing or self.start_time is None:
+            return 0
+        elapsed = time.time() - self.start_time
+        if elapsed >= 999:
+            return 0
+        return max(1, math.ceil((math.floor(elapsed) + 1 - elapsed) * 1000))
+    
+    @property
+    def needs_redraw(self) -> bool:
+        """画面是否有需要重绘的部分"""
+        minesweeper_map = self.minesweeper_map
+        return (self.full_redraw or minesweeper_map.full_redraw or bool(minesweeper_map.dirty_cells) or
+                bool(minesweeper_map.board.changes) or self.show_overlay or self.overlay_rect is not None or
+                any(widget.dirty_rect is not None
+                    for widget in (self.emoji_button, self.remaining_mines_text, self.time_text)))
+    
     def draw(self):
-        """绘制游戏画面"""
-        self.screen.fill(BACKGROUND_COLOR)
-        self.minesweeper_map.draw(self.screen)
-        self.emoji_button.draw(self.screen)
-        self.remaining_mines_text.draw(self.screen)
-        self.time_text.draw(self.screen)
-        pygame.display.update()
+        """绘制游戏画面, 只把变化的区域刷新到屏幕"""
+        if self.full_redraw:
+            self.screen.fill(BACKGROUND_COLOR)
+            self.minesweeper_map.full_redraw = True
+        overlay_rects = []
+        if self.overlay_rect is not None:
+            # 先恢复叠加层下方的雷区
+            self.screen.fill(BACKGROUND_COLOR, self.overlay_rect)
+            self.minesweeper_map.invalidate_rect(self.overlay_rect)
+            overlay_rects.append(self.overlay_rect)
+            self.overlay_rect = None
+        rects = self.minesweeper_map.draw(self.screen)
+        for widget in (self.emoji_button, self.remaining_mines_text, self.time_text):
+            if self.full_redraw or widget.dirty_rect is not None:
+                if not self.full_redraw:
+                    self.screen.fill(BACKGROUND_COLOR, widget.dirty_rect)
+                    rects.append(widget.dirty_rect)
+                widget.draw(self.screen)
+                widget.dirty_rect = None
+        if self.show_overlay:
+            self.overlay_rect = self._draw_overlay()
+            overlay_rects.append(self.overlay_rect)
+        rects.extend(overlay_rects)
+        if self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        elif rects:
+            pygame.display.update(rects)
+    
+    def _draw_overlay(self) -> pygame.Rect:
+        """在雷区左上角绘制剖析数据, 返回覆盖的区域"""
+        lines = self.profiler.overlay_lines() or ['profiling...']
+        renders = [self.overlay_font.render(line, True, (255, 255, 255)) for line in lines]
+        line_height = self.overlay_font.get_linesize()
+        map_rect = self.minesweeper_map.rect
+        rect = pygame.Rect(map_rect.left, map_rect.top, max(r.get_width() for r in renders) + 8,
+                           line_height * len(renders) + 8).clip(map_rect)
+        surface = pygame.Surface(rect.size, pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        for i, render in enumerate(renders):
+            surface.blit(render, (4, 4 + i * line_height))
+        self.screen.blit(surface, rect)
+        return rect
+    
+    def _export_profile(self):
+        """退出时导出剖析数据"""
+        base = os.path.dirname(os.path.abspath(__file__))
+        try:
+            self.profiler.export(PROFILE_JSON and os.path.join(base, PROFILE_JSON),
+                                 PROFILE_CSV and os.path.join(base, PROFILE_CSV))
+        except OSError as e:
+            print(f"无法导出剖析数据: {e}")
     
     def run(self):
         """运行游戏主循环"""
+        profiler = self.profiler
         while True:
-            if not self.handle_events():
+            # 事件驱动时空闲阻塞, 只在有输入或计时器跳秒时醒来
+            timeout = self._wait_timeout() if EVENT_DRIVEN else None
+            with profiler.phase('wait'):
+                events = self._poll_events(timeout)
+            with profiler.phase('events'):
+                running = self.handle_events(events)
+            if not running:
                 break
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
+            with profiler.phase('update'):
+                self.update()
+            if self.needs_redraw:
+                with profiler.phase('draw'):
+                    self.draw()
+                profiler.count('frames')
+            if not EVENT_DRIVEN:
+                with profiler.phase('tick'):
+                    self.clock.tick(FPS)
         
+        self._export_profile()
+        if self.stats is not None:
+            self.stats.close()
+        if self.minesweeper_map.infinite:
+            self.minesweeper_map.board.close()
         pygame.quit()
         sys.exit()
 
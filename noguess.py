@@ -0,0 +1,225 @@
+"""
+无猜棋盘生成器
+从固定的起点出发, 只靠求解器的确定推理(含地雷总数)就能解完整个棋盘
+卡住时不整盘重新生成, 而是把前沿上的地雷挪到未探索区域做局部修补, 再继续验证
+生成好的棋盘按 (宽, 高, 雷数) 存放在磁盘缓存中, 新开一局时直接取用
+
+用法示例:
+    python noguess.py --difficulty hard --count 200 --workers 4
+"""
+
+import argparse
+import os
+from multiprocessing import Pool
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from board import Board, HIDDEN, OPENED, count_neighbors, generate_mine_mask
+from config import DIFFICULTY_SETTINGS, Difficulty, GameState
+from solver import Solver
+
+# 单个棋盘最多修补次数, 超过后换一个随机布局重来
+MAX_REPAIRS = 400
+# 最多尝试的随机布局数, 超过后放弃 (地雷过密时可能根本不存在无猜棋盘)
+MAX_ATTEMPTS = 200
+# 默认缓存目录
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'noguess')
+
+'''无猜棋盘'''
+class NoGuessBoard(NamedTuple):
+    width: int
+    height: int
+    num_mines: int
+    # 地雷布局, 每格一个字节 (0/1)
+    mines: bytes
+    # 起点下标, 打开后即可一路推理到底
+    first_click: int
+
+    def to_board(self) -> Board:
+        """生成可游玩的棋盘, 起点已打开"""
+        board = Board(self.width, self.height, self.num_mines, mines=self.mines)
+        board.open(*board.coords(self.first_click))
+        return board
+
+
+def _safe_zone(width: int, height: int, first_click: int) -> np.ndarray:
+    """起点及其周围8格, 保证起点是空白格"""
+    zone = np.zeros((height, width), dtype=bool)
+    y, x = divmod(first_click, width)
+    zone[max(0, y - 1):y + 2, max(0, x - 1):x + 2] = True
+    return zone.reshape(-1)
+
+
+def solve_without_guessing(mines: bytes, width: int, height: int, num_mines: int, first_click: int,
+                           solver: Optional[Solver] = None) -> Board:
+    """只用确定推理从起点开始解题, 返回停下时的棋盘 (获胜即为无猜)"""
+    solver = solver or Solver()
+    board = Board(width, height, num_mines, mines=mines)
+    board.open(*board.coords(first_click))
+    while board.is_playing:
+        result = solver.solve(board)
+        safe = [idx for idx in result.safe if board.status[idx] == HIDDEN]
+        if not safe:
+            break
+        for idx in safe:
+            board.open(*board.coords(idx))
+    return board
+
+
+def _repair(mines: np.ndarray, board: Board, protected: np.ndarray, rng: np.random.Generator) -> bool:
+    """把卡住处前沿上的一颗雷挪到远离已探索区域的格子, 返回是否修补成功"""
+    shape = (board.height, board.width)
+    status = np.frombuffer(board.status, dtype=np.uint8)
+    hidden = status == HIDDEN
+    opened = status == OPENED
+    near_opened = count_neighbors(opened.reshape(shape)).reshape(-1) > 0
+    frontier = hidden & near_opened
+
+    sources = np.flatnonzero(frontier & mines)
+    # 目标格既不能改变已打开数字格之外的已知信息, 也不能落在起点安全区
+    targets = np.flatnonzero(hidden & ~near_opened & ~mines & ~protected)
+    if not sources.size or not targets.size:
+        # 前沿全是安全格或没有未探索区域时, 反向把一颗未探索区域的雷挪到前沿
+        sources = np.flatnonzero(hidden & ~near_opened & mines)
+        targets = np.flatnonzero(frontier & ~mines & ~protected)
+        if not sources.size or not targets.size:
+            return False
+    mines[sources[rng.integers(sources.size)]] = False
+    mines[targets[rng.integers(targets.size)]] = True
+    return True
+
+
+def generate_no_guess(width: int, height: int, num_mines: int, seed: Optional[int] = None,
+                      first_click: Optional[int] = None, max_repairs: int = MAX_REPAIRS,
+                      max_attempts: int = MAX_ATTEMPTS) -> NoGuessBoard:
+    """生成一个从起点出发无需猜测的棋盘, 尝试 max_attempts 个布局仍失败时抛出 RuntimeError"""
+    if first_click is None:
+        first_click = (height // 2) * width + width // 2
+    protected = _safe_zone(width, height, first_click)
+    if num_mines > width * height - int(protected.sum()):
+        raise ValueError(f"地雷数量过多, 无法保证起点安全: {num_mines}")
+    rng = np.random.default_rng(seed)
+    solver = Solver()
+    for _ in range(max_attempts):
+        mask = generate_mine_mask(width, height, num_mines, rng, exclude=np.flatnonzero(protected))
+        mines = mask.reshape(-1).copy()
+        for _ in range(max_repairs):
+            layout = mines.tobytes()
+            board = solve_without_guessing(layout, width, height, num_mines, first_click, solver)
+            if board.game_state == GameState.GAME_WON:
+                return NoGuessBoard(width, height, num_mines, layout, first_click)
+            if not _repair(mines, board, protected, rng):
+                break
+    raise RuntimeError(f"尝试 {max_attempts} 个布局仍未生成无猜棋盘: {width}x{height}/{num_mines}")
+
+
+def _generate_task(args) -> NoGuessBoard:
+    """进程池任务"""
+    width, height, num_mines, seed = args
+    return generate_no_guess(width, height, num_mines, seed=seed)
+
+
+def pregenerate(width: int, height: int, num_mines: int, count: int, seed: Optional[int] = None,
+                workers: Optional[int] = None) -> Iterator[NoGuessBoard]:
+    """在进程池中并行生成无猜棋盘, 按完成顺序返回"""
+    seeds = np.random.SeedSequence(seed).spawn(count)
+    tasks = [(width, height, num_mines, s) for s in seeds]
+    with Pool(workers) as pool:
+        yield from pool.imap_unordered(_generate_task, tasks)
+
+'''磁盘缓存'''
+class BoardCache:
+    """
+    每个 (宽, 高, 雷数) 对应一个文件, 由定长记录依次拼接而成
+    记录 = 4字节小端起点下标 + 按位压缩的地雷布局; 取用时从文件尾部截断
+    """
+
+    def __init__(self, directory: str = CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, width: int, height: int, num_mines: int) -> str:
+        return os.path.join(self.directory, f'{width}x{height}x{num_mines}.bin')
+
+    @staticmethod
+    def _record_size(width: int, height: int) -> int:
+        return 4 + (width * height + 7) // 8
+
+    def count(self, width: int, height: int, num_mines: int) -> int:
+        """缓存中可用的棋盘数量"""
+        path = self._path(width, height, num_mines)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // self._record_size(width, height)
+
+    def put(self, board: NoGuessBoard):
+        """追加一个棋盘"""
+        os.makedirs(self.directory, exist_ok=True)
+        packed = np.packbits(np.frombuffer(board.mines, dtype=np.uint8)).tobytes()
+        with open(self._path(board.width, board.height, board.num_mines), 'ab') as f:
+            f.write(board.first_click.to_bytes(4, 'little') + packed)
+
+    def pop(self, width: int, height: int, num_mines: int) -> Optional[NoGuessBoard]:
+        """取出一个棋盘, 缓存为空时返回None"""
+        path = self._path(width, height, num_mines)
+        record_size = self._record_size(width, height)
+        try:
+            with open(path, 'r+b') as f:
+                records = os.fstat(f.fileno()).st_size // record_size
+                if not records:
+                    return None
+                f.seek((records - 1) * record_size)
+                record = f.read(record_size)
+                f.truncate((records - 1) * record_size)
+        except FileNotFoundError:
+            return None
+        first_click = int.from_bytes(record[:4], 'little')
+        mines = np.unpackbits(np.frombuffer(record[4:], dtype=np.uint8), count=width * height)
+        return NoGuessBoard(width, height, num_mines, mines.tobytes(), first_click)
+
+
+def get_no_guess_board(width: int, height: int, num_mines: int,
+                       cache: Optional[BoardCache] = None) -> NoGuessBoard:
+    """优先从缓存取棋盘, 缓存为空时当场生成; 生成失败时抛出 RuntimeError"""
+    cache = cache or BoardCache()
+    board = cache.pop(width, height, num_mines)
+    if board is None:
+        board = generate_no_guess(width, height, num_mines)
+    return board
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='预先生成无猜棋盘并写入磁盘缓存')
+    parser.add_argument('--difficulty', choices=[d.value for d in Difficulty],
+                        default=Difficulty.HARD.value, help='难度预设')
+    parser.add_argument('--size', help='自定义尺寸 WxH, 需同时指定 --mines')
+    parser.add_argument('--mines', type=int, help='自定义地雷数量')
+    parser.add_argument('--count', type=int, default=100, help='生成数量')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='进程数')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='缓存目录')
+    args = parser.parse_args(argv)
+
+    if args.size:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        num_mines = args.mines
+        if num_mines is None:
+            parser.error('--size 需要同时指定 --mines')
+    else:
+        settings = DIFFICULTY_SETTINGS[Difficulty(args.difficulty)]
+        width, height = settings['grid_size']
+        num_mines = settings['num_mines']
+
+    cache = BoardCache(args.cache_dir)
+    try:
+        for i, board in enumerate(pregenerate(width, height, num_mines, args.count, args.seed, args.workers), 1):
+            cache.put(board)
+            print(f'\r已生成 {i}/{args.count}', end='', flush=True)
+    except RuntimeError as e:
+        print()
+        parser.error(str(e))
+    print(f'\n缓存中共有 {cache.count(width, height, num_mines)} 个 {width}x{height}/{num_mines} 棋盘')
+
+
+if __name__ == '__main__':
+    main()
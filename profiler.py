@@ -0,0 +1,179 @@
+"""
+性能剖析
+按阶段统计主循环各部分的耗时, 并记录重绘格子数、洪水填充大小等数值的分布
+直方图按对数分桶, 内存占用固定, 可以长时间运行; 关闭时各个入口都直接返回, 开销可以忽略
+"""
+
+import csv
+import json
+import math
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 每个2倍区间划分的桶数, 分位数的相对误差约为 1/SUB_BUCKETS
+SUB_BUCKETS = 16
+# 小于该值的样本按原值精确计数
+EXACT_LIMIT = 2 * SUB_BUCKETS
+PERCENTILES = (50, 95, 99)
+
+'''对数分桶直方图'''
+class Histogram:
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """加入一个非负样本"""
+        if value < EXACT_LIMIT:
+            self.buckets[value] += 1
+        else:
+            # 以桶的几何中点作为键, 分位数直接取键值
+            self.buckets[2 ** ((int(math.log2(value) * SUB_BUCKETS) + 0.5) / SUB_BUCKETS)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """近似分位数, 取所在桶的代表值并限制在样本范围内"""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(max(bucket, self.min), self.max)
+        return self.max
+
+    def summary(self, scale: float = 1.0) -> dict:
+        """统计摘要, 数值统一除以 scale"""
+        result = {'count': self.count, 'mean': self.mean / scale}
+        for p in PERCENTILES:
+            result[f'p{p}'] = self.percentile(p) / scale
+        result['max'] = (self.max or 0) / scale
+        return result
+
+'''空上下文, 关闭剖析时复用'''
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+'''计时上下文'''
+class _Phase:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.add(time.perf_counter_ns() - self.start)
+        return False
+
+'''剖析器'''
+class Profiler:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # 各阶段耗时 (纳秒)
+        self.timers: Dict[str, Histogram] = {}
+        # 其他数值的分布, 如每帧重绘的格子数
+        self.values: Dict[str, Histogram] = {}
+        self.counters = Counter()
+        self.started = time.perf_counter()
+
+    def phase(self, name: str):
+        """用 with 语句统计一个阶段的耗时"""
+        if not self.enabled:
+            return _NULL_PHASE
+        histogram = self.timers.get(name)
+        if histogram is None:
+            histogram = self.timers[name] = Histogram()
+        return _Phase(histogram)
+
+    def record(self, name: str, value):
+        """记录一个数值样本"""
+        if not self.enabled:
+            return
+        histogram = self.values.get(name)
+        if histogram is None:
+            histogram = self.values[name] = Histogram()
+        histogram.add(value)
+
+    def count(self, name: str, n: int = 1):
+        """计数器累加"""
+        if self.enabled:
+            self.counters[name] += n
+
+    def summary(self) -> dict:
+        """汇总统计, 耗时以毫秒为单位"""
+        return {
+            'elapsed_s': time.perf_counter() - self.started,
+            'timers_ms': {name: h.summary(1e6) for name, h in self.timers.items()},
+            'values': {name: h.summary() for name, h in self.values.items()},
+            'counters': dict(self.counters)
+        }
+
+    def overlay_lines(self) -> List[str]:
+        """叠加层显示的文本行"""
+        lines = []
+        for name, h in self.timers.items():
+            s = h.summary(1e6)
+            lines.append(f"{name:<8} p50 {s['p50']:6.2f}  p95 {s['p95']:6.2f}  p99 {s['p99']:6.2f} ms")
+        for name, h in self.values.items():
+            s = h.summary()
+            lines.append(f"{name:<8} p50 {s['p50']:6.0f}  p95 {s['p95']:6.0f}  max {s['max']:6.0f}")
+        for name, n in self.counters.items():
+            lines.append(f"{name:<8} {n}")
+        return lines
+
+    def export_json(self, path: str):
+        """导出JSON汇总"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+    def export_csv(self, path: str):
+        """导出CSV, 每个统计项一行"""
+        columns = ['count', 'mean'] + [f'p{p}' for p in PERCENTILES] + ['max']
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'name', 'unit'] + columns)
+            for name, h in self.timers.items():
+                s = h.summary(1e6)
+                writer.writerow(['timer', name, 'ms'] + [s[c] for c in columns])
+            for name, h in self.values.items():
+                s = h.summary()
+                writer.writerow(['value', name, ''] + [s[c] for c in columns])
+            for name, n in self.counters.items():
+                writer.writerow(['counter', name, '', n] + [''] * (len(columns) - 1))
+
+    def export(self, json_path: Optional[str] = None, csv_path: Optional[str] = None):
+        """按需导出, 关闭剖析时什么也不做"""
+        if not self.enabled:
+            return
+        if json_path:
+            self.export_json(json_path)
+        if csv_path:
+            self.export_csv(csv_path)
@@ -0,0 +1,341 @@
+"""
+录像渲染
+用SDL的虚拟显示驱动无窗口地回放录像, 复用游戏界面的雷区、计数器和表情按钮, 输出PNG帧序列或GIF动画
+每一帧只重新合成状态变化的格子和控件, 没有变化的时刻不产生新帧, 只延长上一帧的显示时间; 多条录像在进程池中并行渲染
+
+PNG输出为每局一个目录, 其中 frames.txt 是 ffmpeg concat 格式的帧列表 (含每帧时长), 可直接转成视频:
+    ffmpeg -f concat -i renders/replays_00000/frames.txt -vsync vfr game.mp4
+GIF输出需要安装 Pillow
+
+用法示例:
+    python render.py replays/replays.msr --output renders --format gif --zoom 0.5
+    python render.py replays/replays.msr --games 0:100 --format png --speed 2
+"""
+
+import os
+# 渲染使用SDL的虚拟显示驱动, 必须在导入pygame之前设置
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+# 不让SDL接管 SIGINT/SIGTERM, 否则进程池结束时无法终止工作进程
+os.environ.setdefault('SDL_NO_SIGNAL_HANDLERS', '1')
+
+import argparse
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pygame
+
+from config import BORDERSIZE, FONT_SIZE, GRIDSIZE, MAX_VIEW_SIZE, GameState
+from main import (BACKGROUND_COLOR, FONT_PATH, RED, ZOOM_LEVELS, EmojiButton, GameManager, MinesweeperMap,
+                  TextBoard, Viewport)
+from replay import EVENT_DOWN, Replay, ReplayArchive, mask_to_buttons
+
+FORMAT_PNG = 'png'
+FORMAT_GIF = 'gif'
+# 最后一帧停留的时间 (毫秒)
+HOLD_MS = 2000
+# 相邻两帧的最小间隔 (毫秒), 间隔内的变化合并到同一帧; 浏览器会把小于20毫秒的GIF帧放慢到100毫秒
+MIN_FRAME_MS = 20
+# 画面的最小宽度, 保证小棋盘缩小显示时计数器、表情和计时器不重叠
+MIN_FRAME_WIDTH = 320
+# GIF调色板的颜色数
+GIF_COLORS = 256
+
+'''单局渲染任务'''
+class RenderTask(NamedTuple):
+    archive: str
+    index: int
+    output: str
+    output_format: str
+    zoom: float
+    speed: float
+    min_frame_ms: int
+
+'''单局渲染结果'''
+class RenderResult(NamedTuple):
+    index: int
+    output: str
+    frames: int
+    duration_ms: int
+    seconds: float
+
+'''录像回放画面'''
+class ReplayRenderer:
+    """把录像的事件依次送入 MinesweeperMap, 在离屏表面上只重绘变化的部分"""
+
+    def __init__(self, replay: Replay, tiles, faces, font, zoom: float = 1.0):
+        self.replay = replay
+        board_size = (replay.width, replay.height)
+        cell_size = round(GRIDSIZE * zoom)
+        # 雷区显示整个棋盘, 超过最大显示尺寸时与游戏中一样跟随点击平移
+        view = (min(replay.width * cell_size, MAX_VIEW_SIZE[0]), min(replay.height * cell_size, MAX_VIEW_SIZE[1]))
+        width = max(view[0] + BORDERSIZE * 2, MIN_FRAME_WIDTH)
+        self.surface = pygame.Surface((width, view[1] + 2 * GRIDSIZE + BORDERSIZE)).convert()
+        self.surface.fill(BACKGROUND_COLOR)
+        viewport = Viewport(pygame.Rect(((width - view[0]) // 2, 2 * GRIDSIZE), view), board_size)
+        viewport.zoom_index = ZOOM_LEVELS.index(zoom)
+        self.map = MinesweeperMap(tiles, board=replay.new_board(), viewport=viewport)
+        # 控件的位置与 GameManager._create_ui_elements 相同, 以画面宽度为准
+        face_size = int(GRIDSIZE * 1.25)
+        self.emoji_button = EmojiButton(faces, position=((width - face_size) // 2, (GRIDSIZE * 2 - face_size) // 2))
+        num_mines = replay.num_mines
+        text_size = font.size(str(num_mines))
+        self.mines_text = TextBoard(str(num_mines).zfill(3), font, (30, (GRIDSIZE * 2 - text_size[1]) // 2 - 2),
+                                    RED, bg_color=(0, 0, 0, 180))
+        time_size = font.size('000')
+        self.time_text = TextBoard('000', font, (width - 30 - time_size[0], (GRIDSIZE * 2 - time_size[1]) // 2 - 2),
+                                   RED, bg_color=(0, 0, 0, 180))
+        self.widgets = (self.emoji_button, self.mines_text, self.time_text)
+
+    def draw(self) -> List[pygame.Rect]:
+        """把变化的格子和控件画到离屏表面, 返回变化的区域"""
+        rects = self.map.draw(self.surface)
+        for widget in self.widgets:
+            if widget.dirty_rect is not None:
+                self.surface.fill(BACKGROUND_COLOR, widget.dirty_rect)
+                widget.draw(self.surface)
+                rects.append(widget.dirty_rect)
+                widget.dirty_rect = None
+        return rects
+
+    def _update_widgets(self):
+        """与 GameManager.update 一样更新表情和剩余地雷数"""
+        board = self.map.board
+        if board.game_state == GameState.GAME_OVER:
+            self.emoji_button.setstatus(status_code=1)
+        elif board.is_won:
+            self.emoji_button.setstatus(status_code=2)
+        self.mines_text.update(str(max(board.num_mines - board.flags_count, 0)).zfill(3))
+
+    def frames(self) -> Iterator[Tuple[int, List[pygame.Rect]]]:
+        """按时间顺序产生有变化的时刻 (毫秒) 和变化的区域, 产生时 surface 即为该时刻的画面
+        计时器从第一次操作开始每秒跳一次, 与游戏中的显示一致"""
+        minesweeper_map = self.map
+        board = minesweeper_map.board
+        yield 0, self.draw()
+        start_ms = None
+        elapsed = 0
+        for event in self.replay.iter_events():
+            if start_ms is not None and board.is_playing:
+                # 上一个事件之后到这个事件之间的计时器跳秒
+                while start_ms + (elapsed + 1) * 1000 <= event.time_ms and elapsed < 999:
+                    elapsed += 1
+                    self.time_text.update(str(elapsed).zfill(3))
+                    yield start_ms + elapsed * 1000, self.draw()
+            if event.type == EVENT_DOWN:
+                minesweeper_map.update(mouse_pressed=mask_to_buttons(event.buttons),
+                                       mouse_pos=minesweeper_map.cell_center(event.cell), type_='down')
+            else:
+                minesweeper_map.update(type_='up')
+            if start_ms is None and board.is_playing:
+                start_ms = event.time_ms
+            self._update_widgets()
+            rects = self.draw()
+            if rects:
+                yield event.time_ms, rects
+
+'''PNG帧序列输出'''
+class PngWriter:
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+        # 压缩PNG是渲染中最慢的一步, 一帧确定不再被替换时才写出
+        self.pending = None
+
+    def _path(self, i: int) -> str:
+        return os.path.join(self.directory, f'frame_{i:05d}.png')
+
+    def _flush(self):
+        if self.pending is not None:
+            pygame.image.save(self.pending, self._path(self.count - 1))
+            self.pending = None
+
+    def add(self, surface: pygame.Surface, rects: List[pygame.Rect], replace: bool):
+        """加入一帧; replace 时替换上一帧"""
+        if not replace:
+            self._flush()
+            self.count += 1
+        self.pending = surface.copy()
+
+    def close(self, durations: List[int]):
+        """写出最后一帧和 ffmpeg concat 格式的帧列表; 最后一帧重复一次, 否则 ffmpeg 会忽略它的时长"""
+        self._flush()
+        with open(os.path.join(self.directory, 'frames.txt'), 'w', encoding='utf-8') as f:
+            for i, duration in enumerate(durations):
+                f.write(f"file '{os.path.basename(self._path(i))}'\nduration {duration / 1000:.3f}\n")
+            f.write(f"file '{os.path.basename(self._path(len(durations) - 1))}'\n")
+
+'''GIF动画输出'''
+class GifWriter:
+    """维护一张调色板图像, 每帧只把变化的区域量化后贴进去, 不对整帧重新量化"""
+
+    def __init__(self, path: str, palette_sources: List[pygame.Surface]):
+        from PIL import Image
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 固定的全局调色板, 由贴图图集和控件合成, 各帧颜色一致, 不会闪烁
+        width = max(source.get_width() for source in palette_sources)
+        sample = Image.new('RGB', (width, sum(source.get_height() for source in palette_sources)))
+        top = 0
+        for source in palette_sources:
+            sample.paste(_to_image(source), (0, top))
+            top += source.get_height()
+        self.palette = sample.quantize(GIF_COLORS)
+        self.indexed = None
+        self.frames = []
+
+    def _quantize(self, image):
+        from PIL import Image
+        return image.quantize(palette=self.palette, dither=Image.Dither.NONE)
+
+    def add(self, surface: pygame.Surface, rects: List[pygame.Rect], replace: bool):
+        """加入一帧; replace 时替换上一帧"""
+        if self.indexed is None:
+            self.indexed = self._quantize(_to_image(surface))
+        else:
+            bounds = surface.get_rect()
+            for rect in rects:
+                rect = rect.clip(bounds)
+                if rect:
+                    self.indexed.paste(self._quantize(_to_image(surface.subsurface(rect))), rect.topleft)
+        frame = self.indexed.copy()
+        if replace:
+            self.frames[-1] = frame
+        else:
+            self.frames.append(frame)
+
+    def close(self, durations: List[int]):
+        self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:], duration=durations, loop=0,
+                            optimize=False)
+
+
+def _to_image(surface: pygame.Surface):
+    """pygame 表面转 PIL 的 RGB 图像"""
+    from PIL import Image
+    return Image.frombytes('RGB', surface.get_size(), pygame.image.tobytes(surface, 'RGB'))
+
+
+def require_pillow():
+    """GIF输出需要 Pillow"""
+    try:
+        import PIL
+    except ImportError:
+        raise RuntimeError('GIF 输出需要安装 Pillow: pip install pillow')
+
+
+_worker = None
+
+
+def _init_worker():
+    """在每个进程中创建一次虚拟显示、贴图图集和字体; 归档按路径缓存, 不必每局重新建立索引"""
+    global _worker
+    if _worker is None:
+        pygame.init()
+        pygame.display.set_mode((1, 1))
+        faces, tiles = GameManager._load_images()
+        _worker = {'faces': faces, 'tiles': tiles, 'font': pygame.font.Font(FONT_PATH, FONT_SIZE), 'archives': {}}
+    return _worker
+
+
+def render_replay(replay: Replay, output: str, output_format: str = FORMAT_GIF, zoom: float = 1.0, speed: float = 1.0,
+                  min_frame_ms: int = MIN_FRAME_MS) -> Tuple[int, int]:
+    """渲染一局录像, 返回 (帧数, 渲染后的时长毫秒)"""
+    state = _init_worker()
+    renderer = ReplayRenderer(replay, state['tiles'], state['faces'], state['font'], zoom)
+    if output_format == FORMAT_GIF:
+        sources = [renderer.surface, state['tiles'].surface] + list(renderer.emoji_button.surfaces.values())
+        renderer.draw()
+        writer = GifWriter(output, sources)
+        # 初始画面已经画好, 从头再产生一次完整的第一帧
+        renderer.map.full_redraw = True
+    else:
+        writer = PngWriter(output)
+    times = []
+    for time_ms, rects in renderer.frames():
+        # 间隔太近的变化合并到上一帧
+        replace = bool(times) and time_ms - times[-1] < min_frame_ms * speed
+        writer.add(renderer.surface, rects, replace)
+        if not replace:
+            times.append(time_ms)
+    durations = [max(round((end - start) / speed), 1) for start, end in zip(times, times[1:])] + [HOLD_MS]
+    writer.close(durations)
+    return len(times), sum(durations)
+
+
+def _run_task(task: RenderTask) -> RenderResult:
+    """进程池任务: 渲染归档中的一局"""
+    started = time.perf_counter()
+    archives: Dict[str, ReplayArchive] = _init_worker()['archives']
+    archive = archives.get(task.archive)
+    if archive is None:
+        archive = archives[task.archive] = ReplayArchive(task.archive)
+    frames, duration = render_replay(archive[task.index], task.output, task.output_format, task.zoom, task.speed,
+                                     task.min_frame_ms)
+    return RenderResult(task.index, task.output, frames, duration, time.perf_counter() - started)
+
+
+def render(tasks: List[RenderTask], workers: Optional[int] = None) -> Iterator[RenderResult]:
+    """渲染多局录像, 结果按完成顺序流式返回"""
+    if workers == 1:
+        for task in tasks:
+            yield _run_task(task)
+        return
+    with Pool(workers, initializer=_init_worker) as pool:
+        yield from pool.imap_unordered(_run_task, tasks)
+
+
+def _parse_range(spec: str) -> Tuple[int, int]:
+    """解析 START:STOP 形式的录像序号范围"""
+    try:
+        start, stop = (int(v) for v in spec.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"录像范围格式应为 START:STOP: {spec}")
+    return start, stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把录像渲染为PNG帧序列或GIF动画')
+    parser.add_argument('archive', help='录像归档文件 (.msr)')
+    parser.add_argument('--output', default='renders', help='输出目录')
+    parser.add_argument('--format', default=FORMAT_GIF, choices=[FORMAT_GIF, FORMAT_PNG], help='输出格式')
+    parser.add_argument('--games', type=_parse_range, help='录像序号范围 START:STOP, 默认全部')
+    parser.add_argument('--zoom', type=float, default=1.0, choices=ZOOM_LEVELS, help='格子缩放比例')
+    parser.add_argument('--speed', type=float, default=1.0, help='播放速度倍数')
+    parser.add_argument('--min-frame-ms', type=int, default=MIN_FRAME_MS, help='相邻两帧的最小间隔 (毫秒)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='进程数')
+    args = parser.parse_args(argv)
+
+    if args.speed <= 0:
+        parser.error('播放速度必须大于0')
+    if args.format == FORMAT_GIF:
+        try:
+            require_pillow()
+        except RuntimeError as e:
+            parser.error(str(e))
+    try:
+        with ReplayArchive(args.archive) as archive:
+            count = len(archive)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    start, stop = args.games or (0, count)
+    stem = os.path.splitext(os.path.basename(args.archive))[0]
+    suffix = '.gif' if args.format == FORMAT_GIF else ''
+    tasks = [RenderTask(args.archive, i, os.path.join(args.output, f'{stem}_{i:05d}{suffix}'), args.format,
+                        args.zoom, args.speed, args.min_frame_ms) for i in range(max(start, 0), min(stop, count))]
+
+    started = time.perf_counter()
+    frames = 0
+    for result in render(tasks, args.workers):
+        frames += result.frames
+        print(f'{result.output}: {result.frames} 帧, {result.duration_ms / 1000:.1f} 秒, '
+              f'渲染 {result.seconds:.2f} 秒')
+    print(f'共 {len(tasks)} 局 {frames} 帧, 用时 {time.perf_counter() - started:.1f} 秒', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+对局录像
+紧凑的二进制格式: 文件头 + 种子 + 按位压缩的地雷布局 + 定长输入事件流
+多局录像可以依次追加到同一个归档文件中, 读取时用内存映射按需解析
+
+文件头 (小端):
+    magic 4s | version B | flags B | first_click B | 保留 x |
+    width I | height I | num_mines I | event_count I | seed_len H
+之后依次为 seed_len 字节的种子、(flags 含 HAS_MASK 时) 地雷布局、event_count 个事件
+事件: 时间(毫秒) I | 类型 B (0按下/1释放) | 按键掩码 B (左1/中2/右4) | 格子下标 I
+"""
+
+import mmap
+import os
+import struct
+import time
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from board import Board, FIRST_CLICK_AREA, FIRST_CLICK_CELL, FIRST_CLICK_UNSAFE
+
+MAGIC = b'MSRP'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBxIIIIH')
+EVENT = struct.Struct('<IBBI')
+
+# flags
+HAS_MASK = 1
+
+# 事件类型
+EVENT_DOWN = 0
+EVENT_UP = 1
+
+# 按键掩码
+BUTTON_LEFT = 1
+BUTTON_MIDDLE = 2
+BUTTON_RIGHT = 4
+
+# 点击不在雷区内时的格子下标
+NO_CELL = 0xFFFFFFFF
+
+FIRST_CLICK_CODES = {FIRST_CLICK_UNSAFE: 0, FIRST_CLICK_CELL: 1, FIRST_CLICK_AREA: 2}
+FIRST_CLICK_MODES = {code: mode for mode, code in FIRST_CLICK_CODES.items()}
+
+
+def buttons_to_mask(pressed) -> int:
+    """pygame.mouse.get_pressed() 的三元组转按键掩码"""
+    left, middle, right = pressed[:3]
+    return (BUTTON_LEFT if left else 0) | (BUTTON_MIDDLE if middle else 0) | (BUTTON_RIGHT if right else 0)
+
+
+def mask_to_buttons(mask: int) -> Tuple[bool, bool, bool]:
+    """按键掩码转 (左, 中, 右)"""
+    return bool(mask & BUTTON_LEFT), bool(mask & BUTTON_MIDDLE), bool(mask & BUTTON_RIGHT)
+
+
+def _encode_seed(seed) -> bytes:
+    if seed is None:
+        return b''
+    return int(seed).to_bytes((int(seed).bit_length() + 7) // 8 or 1, 'little')
+
+'''输入事件'''
+class ReplayEvent(NamedTuple):
+    time_ms: int
+    type: int
+    buttons: int
+    cell: int
+
+'''单局录像'''
+class Replay:
+    def __init__(self, width: int, height: int, num_mines: int, first_click: str = FIRST_CLICK_CELL,
+                 seed: Optional[int] = None, mines: Optional[bytes] = None, events=b''):
+        self.width = width
+        self.height = height
+        self.num_mines = num_mines
+        self.first_click = first_click
+        self.seed = seed
+        # 地雷布局, 每格一个字节 (0/1); 为None时由种子和首次点击重新生成
+        self.mines = mines
+        # 事件原始字节 (bytes 或指向归档的 memoryview)
+        self.events = events
+
+    @property
+    def event_count(self) -> int:
+        return len(self.events) // EVENT.size
+
+    def iter_events(self) -> Iterator[ReplayEvent]:
+        """逐个解析事件"""
+        for fields in EVENT.iter_unpack(self.events):
+            yield ReplayEvent(*fields)
+
+    @property
+    def duration_ms(self) -> int:
+        """录像时长"""
+        if not self.events:
+            return 0
+        return EVENT.unpack_from(self.events, len(self.events) - EVENT.size)[0]
+
+    def new_board(self) -> Board:
+        """生成未开始的棋盘, 有地雷布局时直接使用, 否则按种子在首次点击时放置"""
+        if self.mines is not None:
+            return Board(self.width, self.height, self.num_mines, seed=self.seed, mines=self.mines)
+        return Board(self.width, self.height, self.num_mines, seed=self.seed, first_click=self.first_click)
+
+    def to_bytes(self) -> bytes:
+        """序列化为一条归档记录"""
+        seed = _encode_seed(self.seed)
+        flags = HAS_MASK if self.mines is not None else 0
+        parts = [HEADER.pack(MAGIC, VERSION, flags, FIRST_CLICK_CODES[self.first_click],
+                             self.width, self.height, self.num_mines, self.event_count, len(seed)), seed]
+        if self.mines is not None:
+            parts.append(np.packbits(np.frombuffer(self.mines, dtype=np.uint8)).tobytes())
+        parts.append(bytes(self.events))
+        return b''.join(parts)
+
+    @classmethod
+    def from_buffer(cls, buffer, offset: int = 0) -> Tuple['Replay', int]:
+        """从缓冲区解析一条记录, 返回录像和下一条记录的偏移; 事件不拷贝"""
+        magic, version, flags, first_click, width, height, num_mines, event_count, seed_len = \
+            HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC:
+            raise ValueError(f"不是录像文件 (偏移 {offset})")
+        if version != VERSION:
+            raise ValueError(f"不支持的录像版本: {version}")
+        offset += HEADER.size
+        seed = int.from_bytes(buffer[offset:offset + seed_len], 'little') if seed_len else None
+        offset += seed_len
+        mines = None
+        if flags & HAS_MASK:
+            mask_len = (width * height + 7) // 8
+            packed = np.frombuffer(buffer, dtype=np.uint8, count=mask_len, offset=offset)
+            mines = np.unpackbits(packed, count=width * height).tobytes()
+            offset += mask_len
+        end = offset + event_count * EVENT.size
+        events = memoryview(buffer)[offset:end]
+        replay = cls(width, height, num_mines, FIRST_CLICK_MODES[first_click], seed, mines, events)
+        return replay, end
+
+'''录像记录器'''
+class ReplayRecorder:
+    def __init__(self, board: Board):
+        self.board = board
+        self.events = bytearray()
+        self._start = None
+
+    def record(self, type_: int, buttons: int, cell: Optional[int]):
+        """追加一个事件, 时间从第一个事件开始计"""
+        now = time.perf_counter()
+        if self._start is None:
+            self._start = now
+        self.events += EVENT.pack(int((now - self._start) * 1000), type_, buttons,
+                                  NO_CELL if cell is None else cell)
+
+    def to_replay(self) -> Replay:
+        """生成录像; 地雷已放置时保存布局, 否则只保存种子"""
+        board = self.board
+        mines = bytes(board.mines) if board.mines_placed else None
+        return Replay(board.width, board.height, board.num_mines, board.first_click,
+                      board.seed, mines, bytes(self.events))
+
+    def save(self, path: str):
+        """把录像追加到归档文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'ab') as f:
+            f.write(self.to_replay().to_bytes())
+
+'''录像归档'''
+class ReplayArchive:
+    """用内存映射读取由多条录像拼接成的归档文件, 录像按需解析, 事件不拷贝"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._offsets: Optional[List[int]] = None
+
+    def __iter__(self) -> Iterator[Replay]:
+        offset = 0
+        while offset < len(self._mmap):
+            replay, offset = Replay.from_buffer(self._mmap, offset)
+            yield replay
+
+    def _index(self) -> List[int]:
+        """扫描文件头, 建立每条录像的偏移索引"""
+        if self._offsets is None:
+            offsets = []
+            offset = 0
+            while offset < len(self._mmap):
+                offsets.append(offset)
+                _, _, flags, _, width, height, _, event_count, seed_len = HEADER.unpack_from(self._mmap, offset)
+                offset += HEADER.size + seed_len + event_count * EVENT.size
+                if flags & HAS_MASK:
+                    offset += (width * height + 7) // 8
+            self._offsets = offsets
+        return self._offsets
+
+    def __len__(self) -> int:
+        return len(self._index())
+
+    def __getitem__(self, i: int) -> Replay:
+        return Replay.from_buffer(self._mmap, self._index()[i])[0]
+
+    def close(self):
+        """关闭归档; 仍有录像引用事件缓冲区时, 映射在它们释放后才真正关闭"""
+        if isinstance(self._mmap, mmap.mmap):
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def replay_map(replay: Replay, until_event: Optional[int] = None, until_ms: Optional[int] = None):
+    """把事件依次送入 MinesweeperMap.update, 重建到指定事件或时间点的对局 (无需显示)"""
+    from main import MinesweeperMap
+
+    minesweeper_map = MinesweeperMap(None, board=replay.new_board())
+    for i, event in enumerate(replay.iter_events()):
+        if until_event is not None and i >= until_event:
+            break
+        if until_ms is not None and event.time_ms > until_ms:
+            break
+        if event.type == EVENT_DOWN:
+            minesweeper_map.update(mouse_pressed=mask_to_buttons(event.buttons),
+                                   mouse_pos=minesweeper_map.cell_center(event.cell), type_='down')
+        else:
+            minesweeper_map.update(type_='up')
+    return minesweeper_map
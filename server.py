@@ -0,0 +1,361 @@
+"""
+多棋盘对局服务器
+在一个进程中用asyncio托管大量无界面对局, 供比赛和机器人天梯使用
+协议为每行一个JSON对象的请求/响应, 可通过TCP或WebSocket (需安装 websockets) 连接
+每次操作只返回状态变化的格子; 长时间没有操作的对局会被回收
+
+请求示例:
+    {"id": 1, "cmd": "new", "difficulty": "hard"}
+    {"id": 2, "cmd": "open", "session": "3f2a...", "x": 15, "y": 8}
+响应示例:
+    {"id": 2, "ok": true, "state": "playing", "flags": 0, "cells": [[15, 8, "0"], [16, 8, "1"]]}
+
+用法示例:
+    python server.py --port 8765 --websocket-port 8766 --idle-timeout 600
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from board import Board, FIRST_CLICK_AREA, FIRST_CLICK_CELL, FIRST_CLICK_UNSAFE, OPENED
+from config import DIFFICULTY_SETTINGS, Difficulty, GameState, MineStatus
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# 超过该秒数没有操作的对局被回收
+IDLE_TIMEOUT = 600
+# 检查空闲对局的间隔 (秒)
+SWEEP_INTERVAL = 30
+# 所有对局合计的格子数上限, 超过时回收最久没有操作的对局
+MAX_TOTAL_CELLS = 50 * 1000 * 1000
+# 每局至少按这么多格子计入上限, 小棋盘的对局对象本身也占内存
+SESSION_COST = 1024
+# 单个棋盘的最大格子数; 邻接表和洪水填充都在事件循环中计算, 棋盘太大会阻塞其他客户端
+MAX_CELLS = 512 * 512
+# 单行请求的最大字节数
+MAX_LINE = 64 * 1024
+
+'''未打开格子的代码, 与界面的贴图名一致; 已打开的格子为周围地雷数 (0~8) 或 mine'''
+CELL_CODES = {
+    MineStatus.HIDDEN.value: 'blank',
+    MineStatus.FLAGGED.value: 'flag',
+    MineStatus.QUESTIONED.value: 'ask',
+    MineStatus.MINE_EXPLODED.value: 'blood',
+    MineStatus.WRONG_FLAG.value: 'error'
+}
+
+'''游戏状态对应的名称'''
+STATE_NAMES = {
+    GameState.NOT_STARTED: 'not_started',
+    GameState.PLAYING: 'playing',
+    GameState.GAME_OVER: 'lost',
+    GameState.GAME_WON: 'won'
+}
+
+'''请求错误, 作为错误响应返回给客户端'''
+class RequestError(Exception):
+    pass
+
+'''一局对局'''
+class Session:
+    def __init__(self, session_id: str, board: Board):
+        self.id = session_id
+        self.board = board
+        self.last_active = time.monotonic()
+        # 计入 MAX_TOTAL_CELLS 的格子数
+        self.cost = max(board.size, SESSION_COST)
+
+    def cell(self, idx: int) -> list:
+        """格子的 [x, y, 代码], 未打开的地雷不会泄露"""
+        board = self.board
+        status = board.status[idx]
+        if status == OPENED:
+            code = 'mine' if board.mines[idx] else str(board.counts[idx])
+        else:
+            code = CELL_CODES[status]
+        return [*board.coords(idx), code]
+
+    def diff(self) -> List[list]:
+        """取出自上次响应以来变化的格子"""
+        return [self.cell(idx) for idx in dict.fromkeys(self.board.pop_changes())]
+
+    def snapshot(self) -> List[list]:
+        """所有格子的当前状态, 用于断线重连"""
+        self.board.pop_changes()
+        return [self.cell(idx) for idx in range(self.board.size)]
+
+'''对局服务器'''
+class GameServer:
+    def __init__(self, idle_timeout: float = IDLE_TIMEOUT, max_total_cells: int = MAX_TOTAL_CELLS):
+        self.idle_timeout = idle_timeout
+        self.max_total_cells = max_total_cells
+        # 按最近操作时间排序的对局, 最久没有操作的在最前面
+        self.sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        # 现有对局合计的格子数
+        self.total_cells = 0
+        # 回收空闲对局的任务 (保留引用, 防止被垃圾回收)
+        self._sweeper = None
+        self.commands = {
+            'new': self._cmd_new,
+            'open': self._cmd_open,
+            'flag': self._cmd_flag,
+            'chord': self._cmd_chord,
+            'state': self._cmd_state,
+            'close': self._cmd_close
+        }
+
+    def handle(self, request: dict) -> dict:
+        """处理一个请求, 返回响应; 不涉及网络, 可直接调用"""
+        response = {'id': request.get('id')} if isinstance(request, dict) else {'id': None}
+        try:
+            if not isinstance(request, dict):
+                raise RequestError('请求必须是JSON对象')
+            cmd = request.get('cmd')
+            if not isinstance(cmd, str) or cmd not in self.commands:
+                raise RequestError(f'未知命令: {cmd}')
+            response.update(self.commands[cmd](request))
+            response['ok'] = True
+        except RequestError as e:
+            response.update(ok=False, error=str(e))
+        except Exception as e:
+            # 其他异常也只作为错误响应返回, 不断开连接
+            response.update(ok=False, error=f'内部错误: {type(e).__name__}')
+        return response
+
+    def handle_line(self, line: bytes) -> bytes:
+        """处理一行JSON请求, 返回一行JSON响应"""
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = {'id': None, 'ok': False, 'error': '无法解析JSON'}
+        else:
+            response = self.handle(request)
+        return json.dumps(response, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+    def _session(self, request: dict) -> Session:
+        """取出请求指定的对局并刷新活动时间"""
+        session_id = request.get('session')
+        if not isinstance(session_id, str):
+            raise RequestError('session 必须是字符串')
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise RequestError('对局不存在或已过期')
+        session.last_active = time.monotonic()
+        self.sessions.move_to_end(session.id)
+        return session
+
+    @staticmethod
+    def _int(request: dict, key: str, default: Optional[int] = None) -> int:
+        value = request.get(key, default)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise RequestError(f'{key} 必须是整数')
+        return value
+
+    def _cell(self, session: Session, request: dict):
+        x, y = self._int(request, 'x'), self._int(request, 'y')
+        if not session.board.in_bounds(x, y):
+            raise RequestError(f'坐标超出棋盘: ({x}, {y})')
+        return x, y
+
+    @staticmethod
+    def _finished(board: Board) -> dict:
+        """对局结束后才公开种子, 对局中由种子和首次点击可以还原整个地雷布局"""
+        return {'seed': board.seed} if board.is_finished else {}
+
+    def _result(self, session: Session) -> dict:
+        board = session.board
+        return {'state': STATE_NAMES[board.game_state], 'flags': board.flags_count, 'cells': session.diff(),
+                **self._finished(board)}
+
+    def _add_session(self, session: Session):
+        """加入对局, 格子总数超过上限时先回收最久没有操作的对局"""
+        while self.sessions and self.total_cells + session.cost > self.max_total_cells:
+            self._remove_session(next(iter(self.sessions)))
+        self.sessions[session.id] = session
+        self.total_cells += session.cost
+
+    def _remove_session(self, session_id: str):
+        self.total_cells -= self.sessions.pop(session_id).cost
+
+    def _cmd_new(self, request: dict) -> dict:
+        """新建对局: 按难度预设或 width/height/mines 指定尺寸"""
+        if 'difficulty' in request:
+            try:
+                settings = DIFFICULTY_SETTINGS[Difficulty(request['difficulty'])]
+            except ValueError:
+                raise RequestError(f"未知难度: {request['difficulty']}")
+            width, height = settings['grid_size']
+            num_mines = settings['num_mines']
+        else:
+            width, height = self._int(request, 'width'), self._int(request, 'height')
+            num_mines = self._int(request, 'mines')
+        if width * height > MAX_CELLS:
+            raise RequestError(f'棋盘过大: {width}x{height}')
+        first_click = request.get('first_click', FIRST_CLICK_CELL)
+        if first_click not in (FIRST_CLICK_UNSAFE, FIRST_CLICK_CELL, FIRST_CLICK_AREA):
+            raise RequestError(f'未知的首次点击保护方式: {first_click}')
+        seed = request.get('seed')
+        if seed is not None:
+            seed = self._int(request, 'seed')
+        try:
+            board = Board(width, height, num_mines, seed=seed, first_click=first_click)
+        except ValueError as e:
+            raise RequestError(str(e))
+        session = Session(secrets.token_hex(8), board)
+        self._add_session(session)
+        return {'session': session.id, 'width': width, 'height': height, 'mines': num_mines,
+                'state': STATE_NAMES[board.game_state]}
+
+    def _cmd_open(self, request: dict) -> dict:
+        session = self._session(request)
+        session.board.open(*self._cell(session, request))
+        return self._result(session)
+
+    def _cmd_flag(self, request: dict) -> dict:
+        """右键标记: 隐藏 -> 旗子 -> 问号 -> 隐藏"""
+        session = self._session(request)
+        session.board.cycle_mark(*self._cell(session, request))
+        return self._result(session)
+
+    def _cmd_chord(self, request: dict) -> dict:
+        session = self._session(request)
+        session.board.chord(*self._cell(session, request))
+        return self._result(session)
+
+    def _cmd_state(self, request: dict) -> dict:
+        """返回整个棋盘, 客户端重连后用来同步"""
+        session = self._session(request)
+        board = session.board
+        return {'width': board.width, 'height': board.height, 'mines': board.num_mines,
+                'state': STATE_NAMES[board.game_state], 'flags': board.flags_count, 'cells': session.snapshot(),
+                **self._finished(board)}
+
+    def _cmd_close(self, request: dict) -> dict:
+        session = self._session(request)
+        self._remove_session(session.id)
+        return {}
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """回收空闲超时的对局, 返回回收的数量"""
+        deadline = (time.monotonic() if now is None else now) - self.idle_timeout
+        evicted = 0
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if session.last_active > deadline:
+                break
+            self._remove_session(session.id)
+            evicted += 1
+        return evicted
+
+    async def _sweep(self, interval: float):
+        """定期回收空闲对局"""
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    async def _handle_tcp(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """TCP连接: 逐行读取请求并按顺序写回响应"""
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # 超过 MAX_LINE 的请求无法恢复行边界, 直接断开
+                    writer.write(b'{"id":null,"ok":false,"error":"request too long"}\n')
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    writer.write(self.handle_line(line))
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_websocket(self, websocket, path=None):
+        """WebSocket连接: 每条消息为一个或多个JSON行"""
+        async for message in websocket:
+            if isinstance(message, str):
+                message = message.encode()
+            for line in message.splitlines():
+                if line.strip():
+                    await websocket.send(self.handle_line(line).decode())
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    websocket_port: Optional[int] = None, sweep_interval: float = SWEEP_INTERVAL) -> list:
+        """开始监听并定期回收空闲对局, 返回启动的服务器; port 为0时由系统分配端口"""
+        servers = [await asyncio.start_server(self._handle_tcp, host, port, limit=MAX_LINE)]
+        if websocket_port is not None:
+            try:
+                import websockets
+            except ImportError:
+                raise RuntimeError('WebSocket 模式需要安装 websockets: pip install websockets')
+            servers.append(await websockets.serve(self._handle_websocket, host, websocket_port,
+                                                  max_size=MAX_LINE))
+        self._sweeper = asyncio.ensure_future(self._sweep(sweep_interval))
+        return servers
+
+    async def serve_forever(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                            websocket_port: Optional[int] = None):
+        """启动并一直运行"""
+        servers = await self.start(host, port, websocket_port)
+        for server in servers:
+            for sock in server.sockets:
+                print(f'监听 {sock.getsockname()}')
+        await asyncio.Future()
+
+'''本地客户端, 用于机器人和测试'''
+class GameClient:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self._next_id = 0
+
+    @classmethod
+    async def connect(cls, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> 'GameClient':
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        return cls(reader, writer)
+
+    async def request(self, cmd: str, **kwargs) -> dict:
+        """发送一个命令并等待响应, 出错时抛出 RequestError"""
+        self._next_id += 1
+        request = {'id': self._next_id, 'cmd': cmd, **kwargs}
+        self.writer.write(json.dumps(request, separators=(',', ':')).encode() + b'\n')
+        await self.writer.drain()
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError('服务器已断开')
+        response = json.loads(line)
+        if not response.get('ok'):
+            raise RequestError(response.get('error'))
+        return response
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多棋盘扫雷对局服务器')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='监听地址')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='TCP端口')
+    parser.add_argument('--websocket-port', type=int, help='WebSocket端口 (需安装 websockets)')
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT, help='空闲对局的回收时间 (秒)')
+    parser.add_argument('--max-total-cells', type=int, default=MAX_TOTAL_CELLS, help='所有对局合计的格子数上限')
+    args = parser.parse_args(argv)
+
+    server = GameServer(args.idle_timeout, args.max_total_cells)
+    try:
+        asyncio.run(server.serve_forever(args.host, args.port, args.websocket_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+批量模拟对局
+在进程池中用可替换的策略进行大量无界面对局, 统计胜率、首次点击安全率和3BV分布
+每局的种子只由基础种子和对局序号决定, 结果与进程数无关
+
+用法示例:
+    python simulate.py --difficulty hard --games 100000 --csv games.csv --json summary.json
+    python simulate.py --custom 30x16:60 --custom 30x16:99 --policy mypkg.bots:policy
+    python simulate.py --difficulty hard --games 1000000 --stats stats/stats.db
+"""
+
+import argparse
+import csv
+import importlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from board import Board, FIRST_CLICK_AREA, FIRST_CLICK_CELL, FIRST_CLICK_UNSAFE, HIDDEN, OPENED
+from config import DIFFICULTY_SETTINGS, Difficulty, GameState
+from solver import Solver, best_guess
+from stats import BATCH_SIZE, GameRecord, StatsStore
+
+# 策略动作
+OPEN = 'open'
+FLAG = 'flag'
+CHORD = 'chord'
+
+# 单局最多动作数, 防止策略陷入死循环
+MAX_MOVES = 100000
+
+'''模拟配置'''
+class SimConfig(NamedTuple):
+    name: str
+    width: int
+    height: int
+    num_mines: int
+
+    @property
+    def density(self) -> float:
+        """地雷密度"""
+        return self.num_mines / (self.width * self.height)
+
+'''单局结果'''
+class GameResult(NamedTuple):
+    config: str
+    width: int
+    height: int
+    num_mines: int
+    game: int
+    seed: int
+    won: bool
+    first_click_safe: bool
+    moves: int
+    opened: int
+    bbbv: int
+
+
+def config_from_difficulty(difficulty: Difficulty) -> SimConfig:
+    """由难度预设生成模拟配置"""
+    settings = DIFFICULTY_SETTINGS[difficulty]
+    width, height = settings['grid_size']
+    return SimConfig(difficulty.value, width, height, settings['num_mines'])
+
+
+def parse_custom(spec: str) -> SimConfig:
+    """解析 WxH:M 形式的自定义配置"""
+    try:
+        size, mines = spec.split(':')
+        width, height = (int(v) for v in size.lower().split('x'))
+        return SimConfig(spec, width, height, int(mines))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"自定义配置格式应为 WxH:M, 实际为 {spec!r}")
+
+
+def game_seed(base_seed: int, game: int) -> int:
+    """由基础种子和对局序号派生单局种子"""
+    return int(np.random.SeedSequence([base_seed, game]).generate_state(1, np.uint64)[0])
+
+
+def random_policy(board: Board, rng: np.random.Generator) -> Tuple[str, int, int]:
+    """随机打开一个未打开且未标记的格子"""
+    hidden = np.flatnonzero(np.frombuffer(board.status, dtype=np.uint8) == HIDDEN)
+    x, y = board.coords(int(hidden[rng.integers(hidden.size)]))
+    return OPEN, x, y
+
+
+'''求解器策略: 先打开必然安全的格子, 没有时猜测是雷概率最小的格子'''
+class SolverPolicy:
+    def __init__(self):
+        self.solver = Solver()
+        self._board = None
+        self._pending: List[int] = []
+
+    def __call__(self, board: Board, rng: np.random.Generator) -> Tuple[str, int, int]:
+        if board is not self._board:
+            self._board = board
+            self._pending = []
+            self.solver.clear_cache()
+        while self._pending:
+            idx = self._pending.pop()
+            if board.status[idx] == HIDDEN:
+                return (OPEN, *board.coords(idx))
+        result = self.solver.solve(board)
+        self._pending = [idx for idx in result.safe if board.status[idx] == HIDDEN]
+        if self._pending:
+            return (OPEN, *board.coords(self._pending.pop()))
+        return (OPEN, *board.coords(best_guess(result, board, rng)))
+
+
+'''内置策略'''
+POLICIES: Dict[str, Callable] = {
+    'random': random_policy,
+    'solver': SolverPolicy,
+}
+
+
+def resolve_policy(name: str) -> Callable:
+    """按名称查找内置策略, 或按 module:function 导入自定义策略"""
+    if name in POLICIES:
+        policy = POLICIES[name]
+        # 有状态的策略类按进程实例化
+        return policy() if isinstance(policy, type) else policy
+    if ':' not in name:
+        raise ValueError(f"未知策略: {name}")
+    module_name, func_name = name.split(':', 1)
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def three_bv(board: Board) -> int:
+    """计算3BV: 空白区域数 + 不与空白区域相邻的数字格数"""
+    mines, counts = board.mines, board.counts
+    covered = bytearray(board.size)
+    bbbv = 0
+    for idx in range(board.size):
+        if covered[idx] or mines[idx] or counts[idx]:
+            continue
+        bbbv += 1
+        covered[idx] = 1
+        stack = [idx]
+        while stack:
+            for n in board.neighbors(stack.pop()):
+                if not covered[n]:
+                    covered[n] = 1
+                    if not counts[n]:
+                        stack.append(n)
+    return bbbv + sum(1 for idx in range(board.size) if not covered[idx] and not mines[idx])
+
+
+def play_game(config: SimConfig, policy: Callable, base_seed: int, game: int,
+              first_click: str = FIRST_CLICK_CELL) -> GameResult:
+    """用给定策略完成一局无界面对局"""
+    seed = game_seed(base_seed, game)
+    board = Board(config.width, config.height, config.num_mines, seed=seed, first_click=first_click)
+    rng = np.random.default_rng([base_seed, game, 1])
+    first_click_safe = None
+    moves = 0
+    while not board.is_finished and moves < MAX_MOVES:
+        action, x, y = policy(board, rng)
+        if action == OPEN:
+            board.open(x, y)
+            if first_click_safe is None:
+                first_click_safe = board.game_state != GameState.GAME_OVER
+        elif action == FLAG:
+            if board.status[board.index(x, y)] == HIDDEN:
+                board.cycle_mark(x, y)
+        elif action == CHORD:
+            board.chord(x, y)
+        else:
+            raise ValueError(f"未知动作: {action}")
+        moves += 1
+    # 首次点击保护时地雷在第一次打开后才放置, 3BV在对局结束后计算
+    bbbv = three_bv(board) if board.mines_placed else 0
+    status = np.frombuffer(board.status, dtype=np.uint8)
+    opened = int(np.count_nonzero((status == OPENED) & ~np.frombuffer(board.mines, dtype=bool)))
+    return GameResult(config.name, config.width, config.height, config.num_mines, game, seed,
+                      board.game_state == GameState.GAME_WON, bool(first_click_safe), moves, opened, bbbv)
+
+
+def _run_chunk(args) -> List[GameResult]:
+    """进程池任务: 连续完成一段序号的对局"""
+    config, policy_name, base_seed, start, stop, first_click = args
+    policy = resolve_policy(policy_name)
+    return [play_game(config, policy, base_seed, game, first_click) for game in range(start, stop)]
+
+
+def simulate(configs: List[SimConfig], games: int, policy: str = 'random', seed: int = 0,
+             workers: Optional[int] = None, chunk_size: int = 256,
+             first_click: str = FIRST_CLICK_CELL) -> Iterator[GameResult]:
+    """按配置批量模拟, 结果按任务完成顺序流式返回"""
+    resolve_policy(policy)
+    tasks = [(config, policy, seed, start, min(start + chunk_size, games), first_click)
+             for config in configs for start in range(0, games, chunk_size)]
+    if workers == 1:
+        for task in tasks:
+            yield from _run_chunk(task)
+        return
+    with Pool(workers) as pool:
+        for results in pool.imap_unordered(_run_chunk, tasks):
+            yield from results
+
+'''统计汇总'''
+class Summary:
+    def __init__(self):
+        self.stats = {}
+
+    def add(self, result: GameResult):
+        """加入一局结果"""
+        stats = self.stats.get(result.config)
+        if stats is None:
+            stats = self.stats[result.config] = {
+                'width': result.width,
+                'height': result.height,
+                'num_mines': result.num_mines,
+                'density': result.num_mines / (result.width * result.height),
+                'games': 0,
+                'wins': 0,
+                'first_click_safe': 0,
+                'moves': 0,
+                'bbbv': Counter()
+            }
+        stats['games'] += 1
+        stats['wins'] += result.won
+        stats['first_click_safe'] += result.first_click_safe
+        stats['moves'] += result.moves
+        stats['bbbv'][result.bbbv] += 1
+
+    def to_dict(self) -> dict:
+        """转换为可写入JSON的汇总"""
+        summary = {}
+        for name, stats in self.stats.items():
+            games = stats['games']
+            histogram = stats['bbbv']
+            summary[name] = {
+                'width': stats['width'],
+                'height': stats['height'],
+                'num_mines': stats['num_mines'],
+                'density': stats['density'],
+                'games': games,
+                'wins': stats['wins'],
+                'win_rate': stats['wins'] / games,
+                'first_click_safe_rate': stats['first_click_safe'] / games,
+                'mean_moves': stats['moves'] / games,
+                'mean_3bv': sum(k * v for k, v in histogram.items()) / games,
+                '3bv_histogram': {str(k): histogram[k] for k in sorted(histogram)}
+            }
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量模拟扫雷对局')
+    parser.add_argument('--difficulty', action='append', choices=[d.value for d in Difficulty],
+                        help='难度预设, 可重复')
+    parser.add_argument('--custom', action='append', type=parse_custom, default=[],
+                        help='自定义配置 WxH:M, 可重复')
+    parser.add_argument('--games', type=int, default=1000, help='每个配置的对局数')
+    parser.add_argument('--policy', default='random', help='内置策略名或 module:function')
+    parser.add_argument('--first-click', default=FIRST_CLICK_CELL,
+                        choices=[FIRST_CLICK_UNSAFE, FIRST_CLICK_CELL, FIRST_CLICK_AREA],
+                        help='首次点击保护方式')
+    parser.add_argument('--seed', type=int, default=0, help='基础种子')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='进程数')
+    parser.add_argument('--chunk-size', type=int, default=256, help='每个任务的对局数')
+    parser.add_argument('--csv', help='逐局结果输出的CSV文件')
+    parser.add_argument('--json', help='汇总结果输出的JSON文件')
+    parser.add_argument('--stats', help='逐局结果写入的战绩数据库')
+    parser.add_argument('--player', help='写入战绩时的玩家名, 默认为 simulate:策略名')
+    args = parser.parse_args(argv)
+
+    configs = [config_from_difficulty(Difficulty(d)) for d in args.difficulty or []] + args.custom
+    if not configs:
+        configs = [config_from_difficulty(Difficulty.MEDIUM)]
+
+    summary = Summary()
+    csv_file = open(args.csv, 'w', newline='') if args.csv else None
+    store = StatsStore(args.stats) if args.stats else None
+    player = args.player or f'simulate:{args.policy}'
+    pending = []
+    try:
+        writer = csv.writer(csv_file) if csv_file else None
+        if writer:
+            writer.writerow(GameResult._fields)
+        for result in simulate(configs, args.games, args.policy, args.seed, args.workers, args.chunk_size,
+                               args.first_click):
+            summary.add(result)
+            if writer:
+                writer.writerow(result)
+            if store:
+                # 模拟对局没有用时
+                pending.append(GameRecord(player, result.config, result.width, result.height, result.num_mines,
+                                          result.won, None, result.bbbv, result.opened, time.time(), 'simulate'))
+                if len(pending) >= BATCH_SIZE:
+                    store.add_many(pending)
+                    pending.clear()
+        if store:
+            store.add_many(pending)
+    finally:
+        if csv_file:
+            csv_file.close()
+        if store:
+            store.close()
+
+    result = summary.to_dict()
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
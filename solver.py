@@ -0,0 +1,385 @@
+"""
+扫雷求解器
+根据棋盘上可见的信息(已打开的数字)推断必然安全的格子、必然是雷的格子以及每个格子是雷的概率
+1. 单格规则和子集/两两约束推理
+2. 前沿按约束连通分量拆分, 各分量独立精确枚举
+3. 结合剩余地雷总数, 用组合数加权合并各分量和未受约束的内部格子
+分量的枚举结果按约束内容缓存, 对局中只有上一步揭开影响到的分量需要重新枚举
+"""
+
+from collections import OrderedDict
+from math import comb
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from board import Board, FLAGGED, HIDDEN, OPENED, QUESTIONED, count_neighbors
+
+# 单个分量精确枚举的最大格子数, 超过后按约束密度近似
+MAX_COMPONENT_CELLS = 64
+# 单个分量枚举的最大搜索节点数
+MAX_ENUM_NODES = 2000000
+
+Constraint = Tuple[FrozenSet[int], int]
+
+'''求解结果'''
+class SolverResult(NamedTuple):
+    safe: List[int]
+    mines: List[int]
+    # 每个格子是雷的概率, 已打开的格子为0
+    probabilities: np.ndarray
+
+'''分量枚举结果'''
+class ComponentSolution(NamedTuple):
+    cells: Tuple[int, ...]
+    # totals[k]: 分量内恰有k个雷的解的数量
+    totals: List[int]
+    # cell_counts[k][i]: 恰有k个雷的解中 cells[i] 是雷的数量
+    cell_counts: List[List[int]]
+    exact: bool
+
+
+class _EnumerationLimit(Exception):
+    """枚举节点数超出上限"""
+
+
+def _convolve(a: List[int], b: List[int]) -> List[int]:
+    """多项式乘法, 系数为按地雷数分布的解数"""
+    result = [0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                if y:
+                    result[i + j] += x * y
+    return result
+
+
+def _comb(n: int, k: int) -> int:
+    return comb(n, k) if 0 <= k <= n else 0
+
+
+'''求解器类'''
+class Solver:
+    def __init__(self, trust_flags: bool = False, cache_size: int = 4096,
+                 max_component_cells: int = MAX_COMPONENT_CELLS):
+        # 是否把玩家插的旗子当作确定的雷
+        self.trust_flags = trust_flags
+        self.cache_size = cache_size
+        self.max_component_cells = max_component_cells
+        self._cache: "OrderedDict[FrozenSet[Constraint], ComponentSolution]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def solve(self, board: Board) -> SolverResult:
+        """求解当前可见局面"""
+        status = np.frombuffer(board.status, dtype=np.uint8)
+
+        flagged = status == FLAGGED
+        unknown = (status == HIDDEN) | (status == QUESTIONED)
+        flag_mines: Set[int] = set()
+        if self.trust_flags:
+            flag_mines.update(np.flatnonzero(flagged).tolist())
+        else:
+            unknown |= flagged
+        known_mines = set(flag_mines)
+        known_safe: Set[int] = set()
+
+        constraints = self._build_constraints(board, status, unknown, known_mines)
+        constraints = self._propagate(constraints, known_safe, known_mines)
+
+        # 剩余约束按共享格子连通, 拆分为独立分量
+        components = self._components(constraints)
+        solutions = [self._solve_component(component) for component in components]
+
+        constrained = set()
+        for solution in solutions:
+            constrained.update(solution.cells)
+        unknown_cells = np.flatnonzero(unknown)
+        interior = [idx for idx in unknown_cells.tolist()
+                    if idx not in constrained and idx not in known_safe and idx not in known_mines]
+
+        probabilities = np.zeros(board.size, dtype=np.float64)
+        probabilities[list(known_mines)] = 1.0
+        remaining = board.num_mines - len(known_mines)
+        safe, mines = self._combine(solutions, interior, remaining, probabilities)
+        safe.extend(known_safe)
+        mines.extend(known_mines - flag_mines)
+        for idx in safe:
+            probabilities[idx] = 0.0
+        return SolverResult(sorted(set(safe)), sorted(set(mines)), probabilities)
+
+    def _build_constraints(self, board: Board, status: np.ndarray, unknown: np.ndarray,
+                           known_mines: Set[int]) -> Set[Constraint]:
+        """为每个与未知格相邻的数字格建立约束: 周围未知格中的雷数"""
+        shape = (board.height, board.width)
+        near_unknown = count_neighbors(unknown.reshape(shape)).reshape(-1) > 0
+        frontier = np.flatnonzero((status == OPENED) & near_unknown)
+        constraints = set()
+        for idx in frontier.tolist():
+            cells = []
+            value = board.counts[idx]
+            for n in board.neighbors(idx):
+                if n in known_mines:
+                    value -= 1
+                elif unknown[n]:
+                    cells.append(n)
+            constraints.add((frozenset(cells), value))
+        return constraints
+
+    def _propagate(self, constraints: Set[Constraint], known_safe: Set[int],
+                   known_mines: Set[int]) -> Set[Constraint]:
+        """单格规则与子集/两两约束推理, 直到不再产生新结论"""
+        changed = True
+        while changed:
+            changed = False
+            reduced = set()
+            for cells, value in constraints:
+                if cells & known_mines:
+                    value -= len(cells & known_mines)
+                    cells = cells - known_mines
+                cells = cells - known_safe
+                if not cells:
+                    continue
+                if value == 0:
+                    known_safe.update(cells)
+                    changed = True
+                elif value == len(cells):
+                    known_mines.update(cells)
+                    changed = True
+                else:
+                    reduced.add((cells, value))
+            constraints = reduced
+            if changed:
+                continue
+
+            # 两两比较共享格子的约束
+            by_cell: Dict[int, List[Constraint]] = {}
+            for constraint in constraints:
+                for cell in constraint[0]:
+                    by_cell.setdefault(cell, []).append(constraint)
+            derived = set()
+            for a_cells, a_value in constraints:
+                others = set()
+                for cell in a_cells:
+                    others.update(by_cell[cell])
+                for b_cells, b_value in others:
+                    if b_cells == a_cells:
+                        continue
+                    only_b = b_cells - a_cells
+                    if not only_b:
+                        continue
+                    if a_cells <= b_cells:
+                        derived.add((only_b, b_value - a_value))
+                        continue
+                    # B比A多出的雷数等于 B\A 的格子数时, B\A 全是雷且 A\B 全安全
+                    only_a = a_cells - b_cells
+                    if b_value - a_value == len(only_b):
+                        known_mines.update(only_b)
+                        known_safe.update(only_a)
+                        changed = True
+            new = derived - constraints
+            if new:
+                constraints |= new
+                changed = True
+        return constraints
+
+    def _components(self, constraints: Set[Constraint]) -> List[FrozenSet[Constraint]]:
+        """按共享格子把约束划分为连通分量"""
+        parent: Dict[int, int] = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for cells, _ in constraints:
+            cells = iter(cells)
+            first = next(cells)
+            parent.setdefault(first, first)
+            root = find(first)
+            for cell in cells:
+                parent.setdefault(cell, cell)
+                other = find(cell)
+                if other != root:
+                    parent[other] = root
+        groups: Dict[int, List[Constraint]] = {}
+        for constraint in constraints:
+            groups.setdefault(find(next(iter(constraint[0]))), []).append(constraint)
+        return [frozenset(group) for group in groups.values()]
+
+    def _solve_component(self, component: FrozenSet[Constraint]) -> ComponentSolution:
+        """枚举单个分量的所有解, 结果按约束内容缓存"""
+        solution = self._cache.get(component)
+        if solution is not None:
+            self._cache.move_to_end(component)
+            self.cache_hits += 1
+            return solution
+        self.cache_misses += 1
+        solution = self._enumerate(component)
+        self._cache[component] = solution
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return solution
+
+    def _enumerate(self, component: FrozenSet[Constraint]) -> ComponentSolution:
+        """回溯枚举分量内所有满足约束的雷分布"""
+        constraints = list(component)
+        # 按约束相邻的顺序排列变量, 让约束尽早被填满从而尽早剪枝
+        order: List[int] = []
+        seen = set()
+        for cells, _ in sorted(constraints, key=lambda c: len(c[0])):
+            for cell in sorted(cells):
+                if cell not in seen:
+                    seen.add(cell)
+                    order.append(cell)
+        if len(order) > self.max_component_cells:
+            return self._approximate(order, constraints)
+
+        position = {cell: i for i, cell in enumerate(order)}
+        var_constraints: List[List[int]] = [[] for _ in order]
+        remaining_value = []
+        remaining_cells = []
+        for ci, (cells, value) in enumerate(constraints):
+            remaining_value.append(value)
+            remaining_cells.append(len(cells))
+            for cell in cells:
+                var_constraints[position[cell]].append(ci)
+
+        num_vars = len(order)
+        totals = [0] * (num_vars + 1)
+        cell_counts = [[0] * num_vars for _ in range(num_vars + 1)]
+        assignment = [0] * num_vars
+        nodes = 0
+
+        def search(i: int, mines: int):
+            nonlocal nodes
+            nodes += 1
+            if nodes > MAX_ENUM_NODES:
+                raise _EnumerationLimit()
+            if i == num_vars:
+                totals[mines] += 1
+                row = cell_counts[mines]
+                for j in range(num_vars):
+                    if assignment[j]:
+                        row[j] += 1
+                return
+            related = var_constraints[i]
+            for value in (0, 1):
+                feasible = True
+                for ci in related:
+                    remaining_value[ci] -= value
+                    remaining_cells[ci] -= 1
+                    if not 0 <= remaining_value[ci] <= remaining_cells[ci]:
+                        feasible = False
+                if feasible:
+                    assignment[i] = value
+                    search(i + 1, mines + value)
+                for ci in related:
+                    remaining_value[ci] += value
+                    remaining_cells[ci] += 1
+            assignment[i] = 0
+
+        try:
+            search(0, 0)
+        except _EnumerationLimit:
+            return self._approximate(order, constraints)
+        return ComponentSolution(tuple(order), totals, cell_counts, True)
+
+    def _approximate(self, order: List[int], constraints: List[Constraint]) -> ComponentSolution:
+        """分量过大时按约束的平均雷密度近似, 不参与全局加权"""
+        density: Dict[int, List[float]] = {cell: [] for cell in order}
+        for cells, value in constraints:
+            for cell in cells:
+                density[cell].append(value / len(cells))
+        approx = [sum(density[cell]) / len(density[cell]) for cell in order]
+        return ComponentSolution(tuple(order), [], [approx], False)
+
+    def _combine(self, solutions: List[ComponentSolution], interior: List[int], remaining: int,
+                 probabilities: np.ndarray) -> Tuple[List[int], List[int]]:
+        """结合剩余地雷数加权合并各分量, 写入概率并返回必然安全/必然是雷的格子"""
+        exact = [s for s in solutions if s.exact]
+        for solution in solutions:
+            if not solution.exact:
+                probabilities[list(solution.cells)] = solution.cell_counts[0]
+                remaining -= round(sum(solution.cell_counts[0]))
+        remaining = max(remaining, 0)
+        num_interior = len(interior)
+
+        # prefix[i]/suffix[i]: 前i个/第i个之后所有分量的雷数分布
+        prefix = [[1]]
+        for solution in exact:
+            prefix.append(_convolve(prefix[-1], solution.totals))
+        suffix = [[1]]
+        for solution in reversed(exact):
+            suffix.append(_convolve(suffix[-1], solution.totals))
+        suffix.reverse()
+
+        total = prefix[-1]
+        # interior_ways[t]: 分量共有t个雷时, 剩余地雷放入内部格子的方式数
+        interior_ways = [_comb(num_interior, remaining - t) for t in range(len(total))]
+        weight_all = sum(count * interior_ways[s] for s, count in enumerate(total))
+        if weight_all == 0:
+            # 局面与地雷总数矛盾 (例如信任了错误的旗子), 只按各分量自身的解数估计
+            return self._combine_local(exact, interior, remaining, probabilities)
+
+        safe: List[int] = []
+        mines: List[int] = []
+        for i, solution in enumerate(exact):
+            others = _convolve(prefix[i], suffix[i + 1])
+            # weights[k]: 本分量恰有k个雷时, 其余分量与内部格子的组合数
+            weights = [sum(count * interior_ways[k + s] for s, count in enumerate(others) if count)
+                       if solution.totals[k] else 0
+                       for k in range(len(solution.totals))]
+            rows = [(row, weight) for row, weight in zip(solution.cell_counts, weights) if weight]
+            for j, cell in enumerate(solution.cells):
+                numerator = sum(row[j] * weight for row, weight in rows)
+                probabilities[cell] = numerator / weight_all
+                if numerator == 0:
+                    safe.append(cell)
+                elif numerator == weight_all:
+                    mines.append(cell)
+
+        if num_interior:
+            numerator = sum(count * _comb(num_interior - 1, remaining - s - 1) for s, count in enumerate(total))
+            probabilities[interior] = numerator / weight_all
+            if numerator == 0:
+                safe.extend(interior)
+            elif numerator == weight_all:
+                mines.extend(interior)
+        return safe, mines
+
+    def _combine_local(self, solutions: List[ComponentSolution], interior: List[int], remaining: int,
+                       probabilities: np.ndarray) -> Tuple[List[int], List[int]]:
+        """不考虑地雷总数, 只按分量自身的解数计算概率"""
+        safe: List[int] = []
+        mines: List[int] = []
+        for solution in solutions:
+            total = sum(solution.totals)
+            if not total:
+                continue
+            for j, cell in enumerate(solution.cells):
+                numerator = sum(row[j] for row in solution.cell_counts)
+                probabilities[cell] = numerator / total
+                if numerator == 0:
+                    safe.append(cell)
+                elif numerator == total:
+                    mines.append(cell)
+        if interior:
+            probabilities[interior] = min(1.0, remaining / len(interior))
+        return safe, mines
+
+    def clear_cache(self):
+        """清空分量缓存"""
+        self._cache.clear()
+
+
+def best_guess(result: SolverResult, board: Board, rng: Optional[np.random.Generator] = None) -> int:
+    """在未打开的格子中选出是雷概率最小的一个, 概率相同时随机选择"""
+    status = np.frombuffer(board.status, dtype=np.uint8)
+    candidates = np.flatnonzero((status == HIDDEN) | (status == QUESTIONED))
+    candidate_probs = result.probabilities[candidates]
+    best = candidates[candidate_probs <= candidate_probs.min() + 1e-12]
+    if rng is None:
+        return int(best[0])
+    return int(best[rng.integers(best.size)])
@@ -0,0 +1,343 @@
+"""
+战绩统计
+每局结果写入嵌入式SQLite数据库, 同时维护按玩家和配置汇总的预聚合表, 排行榜和胜率趋势只查聚合表, 不随对局数变慢
+游戏中由后台线程成批写入, 一批结果一个事务, 不阻塞界面; 多个进程可以同时写同一个数据库 (WAL模式)
+
+表:
+    games         每局一行: 玩家、配置、胜负、用时、3BV、结束时间和来源 (game/simulate)
+    player_stats  每个 (玩家, 配置) 一行: 局数、胜局数、有用时的胜局数、获胜总用时、最佳用时
+    daily_stats   每个 (玩家, 配置, 日期) 一行: 局数、胜局数
+
+用法示例:
+    python stats.py leaderboard --difficulty hard
+    python stats.py history --player alice --limit 50
+    python stats.py trend --difficulty hard --days 30
+"""
+
+import argparse
+import getpass
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from config import PLAYER_NAME, STATS_DB, Difficulty
+
+# 后台线程每个事务最多写入的结果数
+BATCH_SIZE = 1000
+# 等待其他进程释放写锁的秒数
+BUSY_TIMEOUT = 30
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    player TEXT NOT NULL,
+    config TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    num_mines INTEGER NOT NULL,
+    won INTEGER NOT NULL,
+    duration REAL,
+    bbbv INTEGER,
+    opened INTEGER,
+    finished_at REAL NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_player_time ON games (player, finished_at);
+CREATE INDEX IF NOT EXISTS games_config_time ON games (config, finished_at);
+
+CREATE TABLE IF NOT EXISTS player_stats (
+    player TEXT NOT NULL,
+    config TEXT NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    timed_wins INTEGER NOT NULL,
+    win_duration REAL NOT NULL,
+    best_duration REAL,
+    PRIMARY KEY (player, config)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_stats_best ON player_stats (config, best_duration);
+
+CREATE TABLE IF NOT EXISTS daily_stats (
+    player TEXT NOT NULL,
+    config TEXT NOT NULL,
+    day TEXT NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    PRIMARY KEY (player, config, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_stats_config_day ON daily_stats (config, day);
+'''
+
+# 聚合表的增量更新; SQLite 的 min() 遇到 NULL 返回 NULL, 所以最佳用时要用 coalesce 兜底
+UPSERT_PLAYER = '''
+INSERT INTO player_stats (player, config, games, wins, timed_wins, win_duration, best_duration)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (player, config) DO UPDATE SET
+    games = games + excluded.games,
+    wins = wins + excluded.wins,
+    timed_wins = timed_wins + excluded.timed_wins,
+    win_duration = win_duration + excluded.win_duration,
+    best_duration = coalesce(min(best_duration, excluded.best_duration), best_duration, excluded.best_duration)
+'''
+UPSERT_DAILY = '''
+INSERT INTO daily_stats (player, config, day, games, wins) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (player, config, day) DO UPDATE SET games = games + excluded.games, wins = wins + excluded.wins
+'''
+
+'''单局战绩; duration 为用时 (秒), 模拟对局或没有开始计时的对局为None'''
+class GameRecord(NamedTuple):
+    player: str
+    config: str
+    width: int
+    height: int
+    num_mines: int
+    won: bool
+    duration: Optional[float]
+    bbbv: Optional[int]
+    opened: int
+    finished_at: float
+    source: str = 'game'
+
+
+def default_player() -> str:
+    """玩家名: 配置中的 PLAYER_NAME, 未设置时为系统用户名"""
+    if PLAYER_NAME:
+        return PLAYER_NAME
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        return 'player'
+
+
+def default_path() -> str:
+    """默认数据库路径 (相对于游戏目录)"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), STATS_DB or 'stats/stats.db')
+
+
+def _day(timestamp: float) -> str:
+    """结束时间所在的本地日期, 与 SQLite 的 date(..., 'unixepoch', 'localtime') 一致"""
+    return time.strftime('%Y-%m-%d', time.localtime(timestamp))
+
+'''战绩数据库, 同一个连接只能在创建它的线程中使用'''
+class StatsStore:
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_many(self, records: Iterable[GameRecord]) -> int:
+        """在一个事务中写入一批战绩并更新聚合表, 返回写入的局数"""
+        records = list(records)
+        if not records:
+            return 0
+        # 先在内存中按键合并, 每个键只更新一次聚合表
+        players: Dict[Tuple[str, str], List] = defaultdict(lambda: [0, 0, 0, 0.0, None])
+        days: Dict[Tuple[str, str, str], List[int]] = defaultdict(lambda: [0, 0])
+        for record in records:
+            player = players[record.player, record.config]
+            player[0] += 1
+            daily = days[record.player, record.config, _day(record.finished_at)]
+            daily[0] += 1
+            if record.won:
+                player[1] += 1
+                daily[1] += 1
+                if record.duration is not None:
+                    player[2] += 1
+                    player[3] += record.duration
+                    if player[4] is None or record.duration < player[4]:
+                        player[4] = record.duration
+        with self.conn:
+            self.conn.executemany(
+                'INSERT INTO games (player, config, width, height, num_mines, won, duration, bbbv, opened, '
+                'finished_at, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', records)
+            self.conn.executemany(UPSERT_PLAYER, [(*key, *value) for key, value in players.items()])
+            self.conn.executemany(UPSERT_DAILY, [(*key, *value) for key, value in days.items()])
+        return len(records)
+
+    def rebuild_aggregates(self):
+        """由 games 表重新计算聚合表, 用于手动修改过 games 表之后"""
+        with self.conn:
+            self.conn.execute('DELETE FROM player_stats')
+            self.conn.execute('DELETE FROM daily_stats')
+            self.conn.execute(
+                'INSERT INTO player_stats (player, config, games, wins, timed_wins, win_duration, best_duration) '
+                'SELECT player, config, count(*), sum(won), count(CASE WHEN won THEN duration END), '
+                'total(CASE WHEN won THEN duration END), '
+                'min(CASE WHEN won THEN duration END) FROM games GROUP BY player, config')
+            self.conn.execute(
+                "INSERT INTO daily_stats (player, config, day, games, wins) "
+                "SELECT player, config, date(finished_at, 'unixepoch', 'localtime') AS d, count(*), sum(won) "
+                "FROM games GROUP BY player, config, d")
+
+    def leaderboard(self, config: str, limit: int = 10) -> List[dict]:
+        """按最佳用时排列的排行榜, 只包含有计时胜局的玩家"""
+        rows = self.conn.execute(
+            'SELECT player, best_duration, wins, games FROM player_stats '
+            'WHERE config = ? AND best_duration IS NOT NULL ORDER BY best_duration LIMIT ?', (config, limit))
+        return [{'rank': rank, 'player': player, 'best_duration': best, 'wins': wins, 'games': games}
+                for rank, (player, best, wins, games) in enumerate(rows, 1)]
+
+    def player_summary(self, player: str) -> List[dict]:
+        """玩家在各配置下的局数、胜率、平均和最佳用时"""
+        rows = self.conn.execute(
+            'SELECT config, games, wins, timed_wins, win_duration, best_duration FROM player_stats '
+            'WHERE player = ? ORDER BY config', (player,))
+        # 平均用时只统计有用时的胜局
+        return [{'config': config, 'games': games, 'wins': wins, 'win_rate': wins / games,
+                 'mean_win_duration': total / timed if timed else None, 'best_duration': best}
+                for config, games, wins, timed, total, best in rows]
+
+    def history(self, player: str, config: Optional[str] = None, limit: int = 20) -> List[dict]:
+        """玩家最近的对局, 新的在前"""
+        sql = 'SELECT * FROM games WHERE player = ?'
+        params = [player]
+        if config is not None:
+            sql += ' AND config = ?'
+            params.append(config)
+        cursor = self.conn.execute(sql + ' ORDER BY finished_at DESC LIMIT ?', (*params, limit))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def win_rate_trend(self, config: str, player: Optional[str] = None, days: int = 30) -> List[dict]:
+        """最近 days 天每天的局数和胜率, 不指定玩家时合计所有玩家"""
+        since = _day(time.time() - (days - 1) * 86400)
+        if player is None:
+            rows = self.conn.execute(
+                'SELECT day, sum(games), sum(wins) FROM daily_stats WHERE config = ? AND day >= ? '
+                'GROUP BY day ORDER BY day', (config, since))
+        else:
+            rows = self.conn.execute(
+                'SELECT day, games, wins FROM daily_stats WHERE player = ? AND config = ? AND day >= ? '
+                'ORDER BY day', (player, config, since))
+        return [{'day': day, 'games': games, 'wins': wins, 'win_rate': wins / games} for day, games, wins in rows]
+
+'''后台写入线程: 界面线程只把结果放进队列, 数据库连接和事务都在后台线程中'''
+class StatsWriter:
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='stats-writer', daemon=True)
+        self.thread.start()
+
+    def record(self, record: GameRecord):
+        """提交一局结果, 立即返回"""
+        self.queue.put(record)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已提交的结果写入完成"""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """写完剩余结果后结束后台线程"""
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        try:
+            store = StatsStore(self.path)
+        except (OSError, sqlite3.Error) as e:
+            print(f"无法打开战绩数据库: {e}")
+            store = None
+        running = True
+        while running:
+            # 阻塞等到第一项, 再取出队列中已有的其余项, 积压越多每个事务写得越多
+            items = [self.queue.get()]
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [item for item in items if isinstance(item, GameRecord)]
+            if records and store is not None:
+                try:
+                    store.add_many(records)
+                except sqlite3.Error as e:
+                    print(f"无法保存战绩: {e}")
+            for item in items:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    item.set()
+        if store is not None:
+            store.close()
+
+
+def _print_rows(rows: List[dict]):
+    """按列对齐打印查询结果"""
+    if not rows:
+        print('(无记录)')
+        return
+    columns = list(rows[0])
+    cells = [[_format(row[column]) for column in columns] for row in rows]
+    widths = [max(len(column), *(len(line[i]) for line in cells)) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print('  '.join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def _format(value) -> str:
+    if value is None:
+        return '-'
+    if isinstance(value, float):
+        return f'{value:.3f}'
+    return str(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询扫雷战绩')
+    parser.add_argument('--db', default=default_path(), help='战绩数据库文件')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('leaderboard', '最佳用时排行榜'), ('trend', '每日胜率趋势')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--difficulty', choices=[d.value for d in Difficulty], help='难度预设')
+        command.add_argument('--config', help='配置名 (难度预设名或 WxH:M)')
+    commands.choices['leaderboard'].add_argument('--limit', type=int, default=10, help='显示的名次数')
+    commands.choices['trend'].add_argument('--player', help='玩家名, 不指定时合计所有玩家')
+    commands.choices['trend'].add_argument('--days', type=int, default=30, help='天数')
+    history = commands.add_parser('history', help='玩家最近的对局')
+    history.add_argument('--player', default=default_player(), help='玩家名')
+    history.add_argument('--config', help='只显示该配置的对局')
+    history.add_argument('--limit', type=int, default=20, help='显示的局数')
+    summary = commands.add_parser('summary', help='玩家在各配置下的汇总')
+    summary.add_argument('--player', default=default_player(), help='玩家名')
+    commands.add_parser('rebuild', help='由对局表重新计算聚合表')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"战绩数据库不存在: {args.db}")
+    config = getattr(args, 'config', None) or getattr(args, 'difficulty', None) or Difficulty.MEDIUM.value
+    with StatsStore(args.db) as store:
+        if args.command == 'leaderboard':
+            _print_rows(store.leaderboard(config, args.limit))
+        elif args.command == 'trend':
+            _print_rows(store.win_rate_trend(config, args.player, args.days))
+        elif args.command == 'history':
+            _print_rows(store.history(args.player, args.config, args.limit))
+        elif args.command == 'summary':
+            _print_rows(store.player_summary(args.player))
+        else:
+            store.rebuild_aggregates()
+
+
+if __name__ == '__main__':
+    main()
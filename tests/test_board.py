@@ -0,0 +1,217 @@
+"""棋盘引擎的测试: 首次点击保护、打开、标记、快速打开、胜负判定、快照与 fork"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+import board as board_module
+from board import Board, FIRST_CLICK_AREA, FIRST_CLICK_CELL, FIRST_CLICK_UNSAFE, HIDDEN, OPENED
+from config import GameState, MineStatus
+
+
+def layout(width: int, height: int, *cells) -> bytes:
+    """按坐标列表生成地雷布局"""
+    mines = bytearray(width * height)
+    for x, y in cells:
+        mines[y * width + x] = 1
+    return bytes(mines)
+
+
+def test_first_click_unsafe_places_mines_immediately():
+    board = Board(9, 9, 10, seed=1, first_click=FIRST_CLICK_UNSAFE)
+    assert board.mines_placed
+    assert board.mines.count(1) == 10
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_first_click_cell_is_safe(seed):
+    board = Board(9, 9, 70, seed=seed, first_click=FIRST_CLICK_CELL)
+    assert not board.mines_placed
+    board.open(seed % 9, seed // 9 % 9)
+    assert board.mines.count(1) == 70
+    assert board.game_state == GameState.PLAYING
+    assert board.status_at(seed % 9, seed // 9 % 9) == MineStatus.OPENED
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_first_click_area_is_blank(seed):
+    board = Board(9, 9, 30, seed=seed, first_click=FIRST_CLICK_AREA)
+    x, y = seed % 9, seed // 9 % 9
+    idx = board.index(x, y)
+    board.open(x, y)
+    assert not any(board.mines[n] for n in (idx, *board.neighbors(idx)))
+    assert board.count_at(x, y) == 0
+    assert board.opened_count > 1
+
+
+def test_first_click_area_falls_back_to_cell_when_crowded():
+    # 81 - 9 < 75, 周围一圈放不下, 只保护点击的格子
+    board = Board(9, 9, 75, seed=3, first_click=FIRST_CLICK_AREA)
+    board.open(4, 4)
+    assert board.mines.count(1) == 75
+    assert not board.is_mine(4, 4)
+    assert board.game_state == GameState.PLAYING
+
+
+def test_open_mine_loses_and_reveals_mines():
+    mines = [(0, 0), (2, 0), (4, 4)]
+    board = Board(5, 5, 3, mines=layout(5, 5, *mines))
+    board.cycle_mark(0, 0)
+    board.cycle_mark(1, 1)
+    assert board.flags_count == 2
+    board.open(2, 0)
+    assert board.game_state == GameState.GAME_OVER
+    assert board.status_at(2, 0) == MineStatus.MINE_EXPLODED
+    # 已插旗的地雷保留旗子, 其余地雷全部显示, 插错的旗子标为错误
+    assert board.status_at(0, 0) == MineStatus.FLAGGED
+    assert board.status_at(4, 4) == MineStatus.OPENED
+    assert board.status_at(1, 1) == MineStatus.WRONG_FLAG
+    assert board.flags_count == 1
+    # 结束后不再响应操作
+    assert board.open(3, 3) == []
+    assert board.cycle_mark(3, 3) == MineStatus.HIDDEN
+
+
+def test_win_flags_remaining_mines():
+    board = Board(4, 4, 2, mines=layout(4, 4, (0, 0), (3, 3)))
+    board.cycle_mark(3, 3)
+    board.cycle_mark(3, 3)
+    assert board.status_at(3, 3) == MineStatus.QUESTIONED
+    board.open(3, 0)
+    assert board.game_state == GameState.GAME_WON
+    assert board.opened_count == 14
+    assert board.status_at(0, 0) == MineStatus.FLAGGED
+    assert board.status_at(3, 3) == MineStatus.FLAGGED
+    assert board.flags_count == 2
+
+
+def test_win_needs_every_safe_cell():
+    board = Board(3, 1, 1, mines=layout(3, 1, (1, 0)))
+    board.open(0, 0)
+    assert board.game_state == GameState.PLAYING
+    board.open(2, 0)
+    assert board.game_state == GameState.GAME_WON
+
+
+def test_mark_cycle_updates_flags_count():
+    board = Board(3, 3, 1, mines=layout(3, 3, (0, 0)))
+    assert board.cycle_mark(1, 1) == MineStatus.FLAGGED
+    assert board.flags_count == 1
+    # 插旗和问号的格子不能打开
+    assert board.open(1, 1) == []
+    assert board.cycle_mark(1, 1) == MineStatus.QUESTIONED
+    assert board.flags_count == 0
+    assert board.open(1, 1) == []
+    assert board.cycle_mark(1, 1) == MineStatus.HIDDEN
+    assert board.flags_count == 0
+    board.open(1, 1)
+    # 已打开的格子不能标记
+    assert board.cycle_mark(1, 1) == MineStatus.OPENED
+    assert board.flags_count == 0
+
+
+def test_chord_requires_matching_flags():
+    board = Board(3, 3, 1, mines=layout(3, 3, (0, 0)))
+    board.open(1, 1)
+    assert board.count_at(1, 1) == 1
+    # 没有旗子
+    assert board.chord(1, 1) == []
+    board.cycle_mark(0, 0)
+    board.cycle_mark(2, 2)
+    # 旗子比数字多
+    assert board.chord(1, 1) == []
+    board.cycle_mark(2, 2)
+    board.cycle_mark(2, 2)
+    assert board.flags_count == 1
+    opened = board.chord(1, 1)
+    assert len(opened) == 7
+    assert board.game_state == GameState.GAME_WON
+
+
+def test_chord_with_wrong_flag_explodes():
+    board = Board(3, 3, 1, mines=layout(3, 3, (0, 0)))
+    board.open(1, 1)
+    board.cycle_mark(2, 2)
+    board.chord(1, 1)
+    assert board.game_state == GameState.GAME_OVER
+    assert board.status_at(0, 0) == MineStatus.MINE_EXPLODED
+    assert board.status_at(2, 2) == MineStatus.WRONG_FLAG
+    assert board.flags_count == 0
+
+
+def reference_fill(board: Board, idx: int) -> set:
+    """广度优先的参照实现: 从 idx 出发经过未标记的空白格, 打开它们周围所有隐藏的格子"""
+    status = bytearray(board.status)
+    if board.counts[idx]:
+        return {idx}
+    opened = {idx}
+    queue = [idx]
+    status[idx] = OPENED
+    while queue:
+        cell = queue.pop()
+        for n in board.neighbors(cell):
+            if status[n] == HIDDEN:
+                status[n] = OPENED
+                opened.add(n)
+                if not board.counts[n]:
+                    queue.append(n)
+    return opened
+
+
+@pytest.mark.parametrize('vector_runs', [board_module.FLOOD_FILL_VECTOR_RUNS, 2, 0])
+@pytest.mark.parametrize('seed', range(40))
+def test_flood_fill_matches_reference(seed, vector_runs, monkeypatch):
+    """扫描线填充和整盘向量化填充都与参照实现一致, 旗子和问号挡住填充"""
+    monkeypatch.setattr(board_module, 'FLOOD_FILL_VECTOR_RUNS', vector_runs)
+    rng = np.random.default_rng(seed)
+    width, height = rng.integers(1, 40, size=2)
+    num_mines = int(rng.integers(0, width * height // 6 + 1))
+    board = Board(int(width), int(height), num_mines, seed=seed, first_click=FIRST_CLICK_UNSAFE)
+    safe = [idx for idx in range(board.size) if not board.mines[idx]]
+    for idx in rng.choice(board.size, size=board.size // 8, replace=False):
+        board.status[idx] = int(rng.choice([MineStatus.FLAGGED.value, MineStatus.QUESTIONED.value]))
+    for idx in rng.permutation(safe)[:5].tolist():
+        if board.status[idx] != HIDDEN or board.is_finished:
+            continue
+        expected = reference_fill(board, idx)
+        before = bytes(board.status)
+        opened = board.open(*board.coords(idx))
+        assert len(opened) == len(set(opened))
+        assert set(opened) == expected
+        changed = {i for i in range(board.size) if before[i] != board.status[i]}
+        assert changed == expected or board.game_state == GameState.GAME_WON
+
+
+def test_restore_before_placement_keeps_forks():
+    """父棋盘恢复到布雷前的快照后, 已 fork 的棋盘的地雷布局不变"""
+    board = Board(9, 9, 10, seed=1, first_click=FIRST_CLICK_CELL)
+    snapshot = board.snapshot()
+    board.open(4, 4)
+    fork = board.fork()
+    mines, counts, status = bytes(fork.mines), bytes(fork.counts), bytes(fork.status)
+
+    board.restore(snapshot)
+
+    assert not board.mines_placed
+    assert board.mines.count(1) == 0
+    assert fork.mines_placed
+    assert fork.mines.count(1) == 10
+    assert bytes(fork.mines) == mines
+    assert bytes(fork.counts) == counts
+    assert bytes(fork.status) == status
+
+
+def test_restore_replaces_mines_identically():
+    """恢复后再次打开同一格, 按相同的随机状态放置出相同的布局"""
+    board = Board(9, 9, 10, seed=2, first_click=FIRST_CLICK_CELL)
+    snapshot = board.snapshot()
+    board.open(0, 0)
+    fork = board.fork()
+    board.restore(snapshot)
+    board.open(0, 0)
+    assert bytes(board.mines) == bytes(fork.mines)
+    assert bytes(board.status) == bytes(fork.status)
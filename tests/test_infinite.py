@@ -0,0 +1,44 @@
+"""无限棋盘的测试"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GameState, MineStatus
+from infinite import CHUNK_SIZE, InfiniteBoard
+
+
+def find_cell(board: InfiniteBoard, cx: int, mine: bool):
+    """区块 (cx, 0) 中第一个是 (或不是) 地雷的格子"""
+    for i in range(CHUNK_SIZE * CHUNK_SIZE):
+        x, y = cx * CHUNK_SIZE + i % CHUNK_SIZE, i // CHUNK_SIZE
+        if board.is_mine(x, y) == mine:
+            return x, y
+
+
+def test_loss_reveals_evicted_chunks(tmp_path):
+    """触雷时已换出到磁盘的区块也显示地雷、标出错旗, 旗子计数与所有区块一致"""
+    board = InfiniteBoard(seed=5, directory=str(tmp_path), capacity=2)
+    board.open(0, 0)
+    far_mine = find_cell(board, 10, True)
+    far_safe = find_cell(board, 10, False)
+    board.cycle_mark(*far_mine)
+    board.cycle_mark(*far_safe)
+    assert board.flags_count == 2
+    # 载入更远的区块, 把插旗的区块换出到磁盘
+    for cx in (20, 21, 22):
+        board.status_at(cx * CHUNK_SIZE, 0)
+    assert (10, 0) in board.store.evicted()
+
+    board.open(*find_cell(board, 22, True))
+    assert board.game_state == GameState.GAME_OVER
+    assert board.flags_count == 1
+    assert board.status_at(*far_mine) == MineStatus.FLAGGED
+    assert board.status_at(*far_safe) == MineStatus.WRONG_FLAG
+    # 换出的区块中其余地雷也已显示
+    chunk = board.store.get(10, 0)
+    hidden_mines = sum(1 for i in range(CHUNK_SIZE * CHUNK_SIZE)
+                       if chunk.mines[i] and chunk.status[i] == MineStatus.HIDDEN.value)
+    assert hidden_mines == 0
+    board.close()
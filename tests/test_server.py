@@ -0,0 +1,167 @@
+"""对局服务器的测试: 在本地端口启动服务器, 通过 GameClient 收发请求"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from board import HIDDEN, OPENED
+from server import GameClient, GameServer, RequestError
+
+
+def run(test, **options):
+    """在新的事件循环中启动服务器 (端口由系统分配), 连接客户端后执行 test(server, client)"""
+    async def main():
+        server = GameServer(**options)
+        listeners = await server.start(port=0, sweep_interval=options.get('idle_timeout', 30) / 4)
+        port = listeners[0].sockets[0].getsockname()[1]
+        client = await GameClient.connect(port=port)
+        try:
+            await test(server, client)
+        finally:
+            await client.close()
+            server._sweeper.cancel()
+            for listener in listeners:
+                listener.close()
+                await listener.wait_closed()
+    asyncio.run(main())
+
+
+async def new_game(client: GameClient, **kwargs) -> str:
+    response = await client.request('new', width=9, height=9, mines=10, seed=7, **kwargs)
+    assert response['state'] == 'not_started'
+    assert 'seed' not in response
+    return response['session']
+
+
+def test_open_flag_state_close():
+    async def test(server, client):
+        session = await new_game(client)
+        response = await client.request('open', session=session, x=4, y=4)
+        assert response['state'] == 'playing'
+        assert 'seed' not in response
+        board = server.sessions[session].board
+        # 响应只包含本次打开的格子, 且与棋盘一致
+        cells = {(x, y): code for x, y, code in response['cells']}
+        assert len(cells) == board.opened_count
+        for (x, y), code in cells.items():
+            assert board.status_at(x, y).value == OPENED
+            assert code == str(board.count_at(x, y))
+
+        x, y = board.coords(board.status.index(HIDDEN))
+        response = await client.request('flag', session=session, x=x, y=y)
+        assert response['cells'] == [[x, y, 'flag']]
+        assert response['flags'] == 1
+        response = await client.request('flag', session=session, x=x, y=y)
+        assert response['cells'] == [[x, y, 'ask']]
+        assert response['flags'] == 0
+
+        # state 返回整个棋盘, 之后的操作只返回新的变化
+        response = await client.request('state', session=session)
+        assert len(response['cells']) == 81
+        assert response['flags'] == 0
+        assert (await client.request('flag', session=session, x=x, y=y))['cells'] == [[x, y, 'blank']]
+
+        await client.request('close', session=session)
+        assert server.total_cells == 0
+        with pytest.raises(RequestError):
+            await client.request('state', session=session)
+    run(test)
+
+
+def test_chord():
+    async def test(server, client):
+        session = await new_game(client)
+        await client.request('open', session=session, x=4, y=4)
+        board = server.sessions[session].board
+        # 找一个周围还有未打开的安全格的数字格
+        target = next(idx for idx in range(board.size)
+                      if board.status[idx] == OPENED and board.counts[idx]
+                      and any(board.status[n] == HIDDEN and not board.mines[n] for n in board.neighbors(idx)))
+        x, y = board.coords(target)
+        mines = [n for n in board.neighbors(target) if board.mines[n]]
+
+        # 旗子数量不符时不打开任何格子
+        response = await client.request('chord', session=session, x=x, y=y)
+        assert response['cells'] == []
+        for n in mines:
+            await client.request('flag', session=session, x=n % 9, y=n // 9)
+        response = await client.request('chord', session=session, x=x, y=y)
+        opened = {(cx, cy) for cx, cy, _ in response['cells']}
+        assert opened
+        for n in board.neighbors(target):
+            if not board.mines[n]:
+                assert board.status[n] == OPENED
+        assert response['state'] in ('playing', 'won')
+    run(test)
+
+
+def test_loss_reveals_seed():
+    async def test(server, client):
+        session = await new_game(client)
+        await client.request('open', session=session, x=0, y=0)
+        board = server.sessions[session].board
+        mine = board.mines.index(1)
+        response = await client.request('open', session=session, x=mine % 9, y=mine // 9)
+        assert response['state'] == 'lost'
+        assert response['seed'] == 7
+        codes = {(x, y): code for x, y, code in response['cells']}
+        assert codes[(mine % 9, mine // 9)] == 'blood'
+        assert list(codes.values()).count('mine') == 9
+    run(test)
+
+
+def test_errors():
+    async def test(server, client):
+        # 无法解析的行不会断开连接
+        client.writer.write(b'{"cmd": "new", \n')
+        await client.writer.drain()
+        assert b'"ok":false' in await client.reader.readline()
+
+        with pytest.raises(RequestError, match='对局不存在'):
+            await client.request('open', session='0123456789abcdef', x=0, y=0)
+        with pytest.raises(RequestError, match='session'):
+            await client.request('state', session=123)
+        with pytest.raises(RequestError, match='未知命令'):
+            await client.request('undo')
+        with pytest.raises(RequestError, match='未知难度'):
+            await client.request('new', difficulty='impossible')
+        with pytest.raises(RequestError, match='棋盘过大'):
+            await client.request('new', width=10000, height=10000, mines=1)
+        session = await new_game(client)
+        with pytest.raises(RequestError, match='坐标超出棋盘'):
+            await client.request('open', session=session, x=9, y=0)
+        with pytest.raises(RequestError, match='整数'):
+            await client.request('open', session=session, x='1', y=0)
+        # 出错之后连接仍然可用
+        assert (await client.request('state', session=session))['state'] == 'not_started'
+    run(test)
+
+
+def test_idle_sessions_evicted():
+    async def test(server, client):
+        idle = await new_game(client)
+        await asyncio.sleep(0.4)
+        active = await new_game(client)
+        await asyncio.sleep(0.4)
+        # idle 已超过 0.5 秒没有操作, 由后台任务回收; active 还没有超时
+        assert idle not in server.sessions
+        with pytest.raises(RequestError, match='对局不存在'):
+            await client.request('state', session=idle)
+        assert (await client.request('state', session=active))['state'] == 'not_started'
+    run(test, idle_timeout=0.5)
+
+
+def test_total_cells_evicts_oldest():
+    async def test(server, client):
+        first = await new_game(client)
+        second = await new_game(client)
+        await client.request('state', session=first)
+        third = await new_game(client)
+        # 上限只够两局, 回收最久没有操作的 second
+        assert list(server.sessions) == [first, third]
+        assert server.total_cells == 2 * 1024
+    run(test, max_total_cells=2 * 1024)
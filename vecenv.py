@@ -0,0 +1,202 @@
+"""
+批量环境
+把N个同尺寸的棋盘存放在堆叠的NumPy数组中, 一次调用对所有棋盘各执行一个动作, 供强化学习训练使用
+布雷、展开和判定都按整批向量化计算, 耗时随批大小而不是Python调用次数增长; 结束的棋盘原地重置
+
+用法示例:
+    env = VectorEnv(1024, Difficulty.HARD, seed=0)
+    obs = env.reset()
+    obs, rewards, dones, info = env.step(actions)    # actions[i] < size 为打开, 否则为插旗/取消插旗
+"""
+
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from board import Board, FIRST_CLICK_AREA, FIRST_CLICK_CELL, FIRST_CLICK_UNSAFE, FLAGGED, HIDDEN, \
+    MINE_EXPLODED, OPENED, count_neighbors
+from config import DEFAULT_DIFFICULTY, Difficulty, GameState
+from simulate import SimConfig, config_from_difficulty
+
+# 观测中未打开格子的取值, 已打开的格子为周围地雷数 (0~8)
+OBS_HIDDEN = -1
+OBS_FLAG = -2
+OBS_MINE = -3
+
+# 奖励: 打开安全格按新打开格子占全部安全格的比例给分, 另加胜负奖励
+REWARD_WIN = 1.0
+REWARD_LOSE = -1.0
+# 打开已打开或插旗的格子、对已打开的格子插旗
+REWARD_INVALID = -0.01
+
+'''批量环境'''
+class VectorEnv:
+    def __init__(self, num_envs: int, config: Union[Difficulty, SimConfig] = DEFAULT_DIFFICULTY,
+                 first_click: str = FIRST_CLICK_CELL, seed: Optional[int] = None, auto_reset: bool = True):
+        if isinstance(config, Difficulty):
+            config = config_from_difficulty(config)
+        if not 0 <= config.num_mines < config.width * config.height:
+            raise ValueError(f"地雷数量无效: {config.num_mines}")
+        self.num_envs = num_envs
+        self.config = config
+        self.width = config.width
+        self.height = config.height
+        self.size = config.width * config.height
+        self.num_mines = config.num_mines
+        self.first_click = first_click
+        self.auto_reset = auto_reset
+        # 区域保护需要至少 9 个无雷格子, 格子不够时与 Board 一样退化为只保护点击的格子
+        self._protect_area = first_click == FIRST_CLICK_AREA and self.size - 9 >= self.num_mines
+        self.rng = np.random.default_rng(seed)
+        n, size = num_envs, self.size
+        self.mines = np.zeros((n, size), dtype=bool)
+        self.counts = np.zeros((n, size), dtype=np.uint8)
+        self.status = np.zeros((n, size), dtype=np.uint8)
+        # 地雷是否已放置; 首次点击保护时推迟到第一次打开
+        self.placed = np.zeros(n, dtype=bool)
+        self.opened_count = np.zeros(n, dtype=np.int64)
+        # 已结束的棋盘 (不自动重置时保持结束状态, 直到调用 reset)
+        self.done = np.zeros(n, dtype=bool)
+        self.steps = np.zeros(n, dtype=np.int64)
+        self.reset()
+
+    def reset(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """重置 mask 选中的棋盘 (默认全部), 返回观测"""
+        rows = np.arange(self.num_envs) if mask is None else np.flatnonzero(mask)
+        self.status[rows] = HIDDEN
+        self.mines[rows] = False
+        self.counts[rows] = 0
+        self.placed[rows] = False
+        self.opened_count[rows] = 0
+        self.done[rows] = False
+        self.steps[rows] = 0
+        if self.first_click == FIRST_CLICK_UNSAFE and rows.size:
+            self._place(rows, None)
+        return self.observation()
+
+    def _place(self, rows: np.ndarray, safe: Optional[np.ndarray]):
+        """为一批棋盘随机布雷: 每格取随机键, 键最小的 num_mines 格为地雷, 受保护的格子不参与"""
+        keys = self.rng.random((rows.size, self.size))
+        if safe is not None:
+            protected = np.zeros((rows.size, self.size), dtype=bool)
+            protected[np.arange(rows.size), safe] = True
+            if self._protect_area:
+                shape = (rows.size, self.height, self.width)
+                protected |= count_neighbors(protected.reshape(shape)).reshape(rows.size, -1) > 0
+            keys[protected] = 2.0
+        mines = np.zeros((rows.size, self.size), dtype=bool)
+        if self.num_mines:
+            chosen = np.argpartition(keys, self.num_mines - 1, axis=1)[:, :self.num_mines]
+            np.put_along_axis(mines, chosen, True, axis=1)
+        self.mines[rows] = mines
+        counts = count_neighbors(mines.reshape(rows.size, self.height, self.width))
+        self.counts[rows] = counts.reshape(rows.size, -1)
+        self.placed[rows] = True
+
+    def _flood(self, rows: np.ndarray, cells: np.ndarray) -> np.ndarray:
+        """从空白格同时向外展开一批棋盘, 返回每个棋盘新打开的格子掩码
+        每一轮把已展开区域中空白格的邻居加入区域, 插旗的格子不打开"""
+        shape = (rows.size, self.height, self.width)
+        status = self.status[rows]
+        zero = ~self.mines[rows] & (self.counts[rows] == 0)
+        openable = status == HIDDEN
+        region = np.zeros((rows.size, self.size), dtype=bool)
+        region[np.arange(rows.size), cells] = True
+        frontier = region & zero
+        while frontier.any():
+            grown = (count_neighbors(frontier.reshape(shape)).reshape(rows.size, -1) > 0) & openable & ~region
+            region |= grown
+            frontier = grown & zero
+        return region
+
+    def step(self, actions: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        """对每个棋盘执行一个动作: actions[i] < size 打开格子, 否则对 actions[i] - size 插旗或取消插旗
+        返回 (观测, 奖励, 结束掩码, 信息); 信息中 won 为获胜掩码, 自动重置时 final_observation 为结束时的观测"""
+        actions = np.asarray(actions, dtype=np.int64)
+        if actions.shape != (self.num_envs,) or actions.min() < 0 or actions.max() >= 2 * self.size:
+            raise ValueError(f"动作应为 {self.num_envs} 个 [0, {2 * self.size}) 内的整数")
+        n, size = self.num_envs, self.size
+        all_rows = np.arange(n)
+        flag = actions >= size
+        cells = np.where(flag, actions - size, actions)
+        current = self.status[all_rows, cells]
+        rewards = np.zeros(n, dtype=np.float32)
+        won = np.zeros(n, dtype=bool)
+        lost = np.zeros(n, dtype=bool)
+        live = ~self.done
+        self.steps[live] += 1
+
+        # 插旗: 隐藏 <-> 旗子
+        toggle = live & flag & ((current == HIDDEN) | (current == FLAGGED))
+        self.status[all_rows[toggle], cells[toggle]] = np.where(current[toggle] == HIDDEN, FLAGGED, HIDDEN)
+
+        opening = live & ~flag & (current == HIDDEN)
+        rewards[live & ~toggle & ~opening] = REWARD_INVALID
+        # 首次打开时布雷
+        place = opening & ~self.placed
+        if place.any():
+            self._place(all_rows[place], cells[place])
+
+        hit = opening & self.mines[all_rows, cells]
+        self.status[all_rows[hit], cells[hit]] = MINE_EXPLODED
+        lost |= hit
+        rewards[hit] = REWARD_LOSE
+
+        safe = opening & ~hit
+        rows, safe_cells = all_rows[safe], cells[safe]
+        if rows.size:
+            blank = self.counts[rows, safe_cells] == 0
+            newly = np.zeros(rows.size, dtype=np.int64)
+            # 数字格只打开自身
+            self.status[rows[~blank], safe_cells[~blank]] = OPENED
+            newly[~blank] = 1
+            if blank.any():
+                flood_rows = rows[blank]
+                region = self._flood(flood_rows, safe_cells[blank])
+                status = self.status[flood_rows]
+                status[region] = OPENED
+                self.status[flood_rows] = status
+                newly[blank] = region.sum(axis=1)
+            self.opened_count[rows] += newly
+            rewards[rows] = newly / (size - self.num_mines)
+            won[rows] = self.opened_count[rows] == size - self.num_mines
+            rewards[won] += REWARD_WIN
+
+        self.done |= won | lost
+        dones = self.done.copy()
+        info = {'won': won}
+        if self.auto_reset and dones.any():
+            info['final_observation'] = self.observation()
+            self.reset(dones)
+        return self.observation(), rewards, dones, info
+
+    def observation(self) -> np.ndarray:
+        """(N, 高, 宽) 的 int8 观测, 已打开的格子为周围地雷数"""
+        status = self.status
+        obs = np.where(status == OPENED, self.counts.astype(np.int8), np.int8(OBS_HIDDEN))
+        obs[status == FLAGGED] = OBS_FLAG
+        obs[status == MINE_EXPLODED] = OBS_MINE
+        return obs.reshape(self.num_envs, self.height, self.width)
+
+    def action_mask(self) -> np.ndarray:
+        """(N, 2 * size) 的有效动作掩码: 可打开的隐藏格和可插旗/取消插旗的格子"""
+        hidden = self.status == HIDDEN
+        return np.concatenate([hidden, hidden | (self.status == FLAGGED)], axis=1)
+
+    def to_board(self, i: int) -> Board:
+        """把第 i 个棋盘转换为 Board, 以便使用求解器或界面; 尚未布雷时返回新的棋盘 (结束时不补全地雷的显示)"""
+        config = self.config
+        if not self.placed[i]:
+            return Board(config.width, config.height, config.num_mines, first_click=self.first_click)
+        board = Board(config.width, config.height, config.num_mines,
+                      mines=self.mines[i].astype(np.uint8).tobytes())
+        board.status[:] = self.status[i].tobytes()
+        board.opened_count = int(self.opened_count[i])
+        board.flags_count = int(np.count_nonzero(self.status[i] == FLAGGED))
+        if np.any(self.status[i] == MINE_EXPLODED):
+            board.game_state = GameState.GAME_OVER
+        elif self.opened_count[i] == self.size - self.num_mines:
+            board.game_state = GameState.GAME_WON
+        else:
+            board.game_state = GameState.PLAYING
+        return board